@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""Annotates running hanzi text with Middle Chinese and predicted Mandarin.
+
+python -m baxter.annotate -i corpus.txt -o /tmp/annotated.jsonl
+
+Or, to annotate text from stdin:
+
+cat corpus.txt | python -m baxter.annotate --known_only
+
+Each character (other than whitespace) becomes one line of JSON:
+
+  {"offset": 0, "char": "東", "readings": [{"baxter": "tuwng",
+   "expected_pinyin": "dong1", "pinyin": "dong1"}]}
+
+offset counts characters from the start of the text (after any byte-order
+mark, which is dropped as utf-8-sig would). A polyphonic character
+gets every reading in Baxter's data; a character that isn't in it gets none.
+The text is decoded in fixed-size blocks, and the readings of each distinct
+character are looked up and serialized once (in a bounded cache), so memory
+use doesn't grow with the text.
+"""
+
+import argparse
+import codecs
+import json
+import os.path
+import re
+import sys
+
+from . import index
+from . import memo
+from . import steps
+
+_BLOCK_SIZE = 1 << 16
+
+# Narrow builds store astral characters (e.g., 𠍀) as surrogate pairs.
+if sys.maxunicode == 0xFFFF:
+  _CHAR_REGEX = re.compile(u'[\ud800-\udbff][\udc00-\udfff]|.', re.DOTALL)
+else:
+  _CHAR_REGEX = None
+
+def chars(f, block_size=_BLOCK_SIZE):
+  """Yield the characters of utf-8 text read from f, a block at a time.
+
+  A leading byte-order mark is dropped. Raises ValueError (with the byte offset
+  of the first bad byte) if the text isn't valid utf-8.
+  """
+  decoder = codecs.getincrementaldecoder('utf-8')()
+  position = 0  # Bytes read before this block.
+  first = True
+  while True:
+    block = f.read(block_size)
+    pending = decoder.getstate()[0]
+    try:
+      text = decoder.decode(block, final=not block)
+      error = None
+    except UnicodeDecodeError as e:
+      # Still yield the characters before the bad byte.
+      start = int(e.start)
+      text = (pending + block)[:start].decode('utf-8')
+      error = ValueError('Invalid utf-8 at byte %d: %s' % (
+          position - len(pending) + start, e.reason))
+    position += len(block)
+    # (utf-8-sig's decoder would do this too, but it misreports the positions
+    # of errors in the block after the mark.)
+    if first and text:
+      first = False
+      if text[0] == u'\ufeff':
+        text = text[1:]
+    if _CHAR_REGEX is not None:
+      text = _CHAR_REGEX.findall(text)
+    for char in text:
+      yield char
+    if error is not None:
+      raise error  # pylint: disable=raising-bad-type
+    if not block:
+      return
+
+def _expected_pinyin(syl):
+  """Get the expected Pinyin for a syllable, or None if it's rejected."""
+  try:
+    return steps.expected_pinyin(syl)
+  except (ValueError, IndexError):
+    return None
+
+class Annotator(object):
+  """Annotates characters with their readings from a BaxterIndex."""
+
+  def __init__(self, baxter_index, cache_size=1 << 16):
+    """Look up characters in baxter_index.
+
+    The serialized readings of up to cache_size distinct characters are kept.
+    """
+    self._index = baxter_index
+    self._cache = memo.Cache(cache_size)
+
+  @property
+  def hits(self):
+    """The number of characters whose readings were cached."""
+    return self._cache.hits
+
+  @property
+  def misses(self):
+    """The number of characters looked up (and serialized)."""
+    return self._cache.misses
+
+  @classmethod
+  def load(cls, fname=None, **kwargs):
+    """Build the annotator from Baxter's CSV (by default, data/mc1.csv)."""
+    return cls(index.BaxterIndex.load(fname), **kwargs)
+
+  def readings(self, char):
+    """Get the readings of a (unicode) character, as dicts."""
+    return [{'baxter': r['baxter'].baxter, 'pinyin': r['pinyin'],
+             'expected_pinyin': _expected_pinyin(r['baxter'])}
+            for r in self._index.by_hanzi(char.encode('utf-8'))]
+
+  def _fields(self, char):
+    """Get the serialized char and readings fields of a character's token.
+
+    Returns: (fields, whether the character has any readings)
+    """
+    try:
+      result = self._cache.results[char]
+    except KeyError:
+      pass
+    else:
+      self._cache.hits += 1
+      return result
+    self._cache.misses += 1
+    readings = self.readings(char)
+    fields = '"char": %s, "readings": %s' % (
+        json.dumps(char, ensure_ascii=False).encode('utf-8'),
+        json.dumps(readings, sort_keys=True))
+    result = fields, bool(readings)
+    self._cache.put(char, result)
+    return result
+
+  def annotate(self, f, output, known_only=False, block_size=_BLOCK_SIZE):
+    """Annotate the utf-8 text read from f, writing JSON Lines to output.
+
+    With known_only, characters without readings are left out.
+
+    Returns: (the number of tokens written, the number of characters read)
+    Raises: ValueError if the text isn't valid utf-8, after writing the tokens
+      before the bad byte.
+    """
+    tokens = 0
+    batch = []
+    offset = -1
+    cache, results = self._cache, self._cache.results
+    try:
+      for offset, char in enumerate(chars(f, block_size)):
+        if char.isspace():
+          continue
+        # Looked up inline, since most characters are hits.
+        result = results.get(char)
+        if result is None:
+          result = self._fields(char)
+        else:
+          cache.hits += 1
+        fields, known = result
+        if known_only and not known:
+          continue
+        batch.append('{"offset": %d, %s}\n' % (offset, fields))
+        if len(batch) >= 1000:
+          output.writelines(batch)
+          tokens += len(batch)
+          batch = []
+    finally:
+      output.writelines(batch)
+    tokens += len(batch)
+    return tokens, offset + 1
+
+def main():
+  """Annotate text from the command line."""
+  dirname = os.path.dirname(__file__)
+  parser = argparse.ArgumentParser(
+      description=('Annotates hanzi text with Middle Chinese readings and '
+                   'their predicted Pinyin, as JSON Lines.'))
+  parser.add_argument('-i', '--input_file', dest='input_file', type=str,
+                      default='-', help='UTF-8 text to annotate (\'-\' for stdin).')
+  parser.add_argument('-o', '--output_file', dest='output_file', type=str,
+                      default='-', help='JSON Lines to write (\'-\' for stdout).')
+  parser.add_argument('--records_file', dest='records_file', type=str,
+                      default=os.path.join(dirname, 'data/mc1.csv'),
+                      help='Baxter\'s CSV to look characters up in.')
+  parser.add_argument('--known_only', dest='known_only', action='store_true',
+                      help='Leave out characters that have no readings.')
+  args = parser.parse_args()
+  annotator = Annotator.load(args.records_file)
+  f = sys.stdin if args.input_file == '-' else open(args.input_file, 'rb')
+  output = (sys.stdout if args.output_file == '-'
+            else open(args.output_file, 'wb'))
+  try:
+    tokens, read = annotator.annotate(f, output, args.known_only)
+  except ValueError as e:
+    sys.stderr.write('%s: %s\n' % (args.input_file, e))
+    sys.exit(1)
+  finally:
+    if f is not sys.stdin:
+      f.close()
+    if output is not sys.stdout:
+      output.close()
+  print >>sys.stderr, (
+      'Annotated %d tokens of %d characters (%d distinct looked up).' % (
+          tokens, read, annotator.misses))
+
+if __name__ == '__main__':
+  main()
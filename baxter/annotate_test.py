@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Tests for annotate module."""
+
+import io
+import json
+import unittest
+
+from . import annotate
+from . import index
+from . import test_util
+
+class AnnotatorTest(unittest.TestCase):
+  """Tests annotating text against mc1.csv."""
+
+  @classmethod
+  def setUpClass(cls):
+    with test_util.Quiet():
+      cls._index = index.BaxterIndex.load()
+
+  def annotate(self, text, **kwargs):
+    """Annotate text, returning the tokens (and the characters read)."""
+    output = io.BytesIO()
+    annotator = annotate.Annotator(self._index)
+    tokens, read = annotator.annotate(io.BytesIO(text), output, **kwargs)
+    lines = output.getvalue().splitlines()
+    self.assertEqual(tokens, len(lines))
+    return [json.loads(line) for line in lines], read
+
+  def test_annotate(self):
+    """Every reading of each character is emitted, with its prediction."""
+    tokens, read = self.annotate('東行\n。')
+    self.assertEqual(4, read)
+    self.assertEqual([0, 1, 3], [t['offset'] for t in tokens])
+    self.assertEqual([u'東', u'行', u'。'], [t['char'] for t in tokens])
+    self.assertEqual(
+        [{'baxter': 'tuwng', 'pinyin': 'dong1', 'expected_pinyin': 'dong1'}],
+        tokens[0]['readings'])
+    self.assertEqual(
+        ['hang', 'hangH', 'haeng', 'haengH'],
+        [r['baxter'] for r in tokens[1]['readings']])
+    self.assertEqual(
+        ['xing2', 'xing4'],
+        [r['expected_pinyin'] for r in tokens[1]['readings'][2:]])
+    self.assertEqual([], tokens[2]['readings'])
+
+  def test_known_only(self):
+    """Characters without readings can be left out."""
+    tokens, _ = self.annotate('東，行', known_only=True)
+    self.assertEqual([0, 2], [t['offset'] for t in tokens])
+
+  def test_blocks(self):
+    """Characters split across blocks (including astral ones) are intact."""
+    text = '𠍀東行。' * 50
+    tokens, read = self.annotate(text, block_size=3)
+    self.assertEqual(200, read)
+    self.assertEqual(text.decode('utf-8'), u''.join(t['char'] for t in tokens))
+
+  def test_byte_order_mark(self):
+    """A leading byte-order mark isn't a token (or counted in offsets)."""
+    tokens, read = self.annotate('\xef\xbb\xbf東行', block_size=2)
+    self.assertEqual(2, read)
+    self.assertEqual([(0, u'東'), (1, u'行')],
+                     [(t['offset'], t['char']) for t in tokens])
+
+  def test_invalid(self):
+    """Invalid utf-8 is reported by byte offset, after the earlier tokens."""
+    text = '東行' * 600 + '\xff' + '東'
+    output = io.BytesIO()
+    annotator = annotate.Annotator(self._index)
+    with self.assertRaisesRegexp(ValueError, 'byte 3600'):
+      annotator.annotate(io.BytesIO(text), output, block_size=7)
+    self.assertEqual(1200, len(output.getvalue().splitlines()))
+    with self.assertRaisesRegexp(ValueError, 'byte 3'):
+      annotator.annotate(io.BytesIO('東\xe8\xa1'), io.BytesIO())
+
+  def test_memoized(self):
+    """Each distinct character is only looked up once."""
+    annotator = annotate.Annotator(self._index, cache_size=2)
+    annotator.annotate(io.BytesIO('東東行東'), io.BytesIO())
+    self.assertEqual((2, 2), (annotator.hits, annotator.misses))
+    # With a full cache, a new character evicts one of the others (which one
+    # depends on hash order).
+    misses = annotator.misses
+    annotator.annotate(io.BytesIO('中'), io.BytesIO())
+    self.assertEqual(misses + 1, annotator.misses)
+    annotator.annotate(io.BytesIO('東行'), io.BytesIO())
+    self.assertEqual(2, len(annotator._cache))  # pylint: disable=protected-access
+    self.assertEqual(7, annotator.hits + annotator.misses)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Columnar conversion of Baxter's notation to Pinyin, using NumPy.
+
+Syllables are encoded as integer codes for the initial, final, and tone, and
+converted with array lookups instead of one MiddleChineseSyllable at a time.
+"""
+
+import numpy as np
+
+from . import mc
+from . import steps
+from . import trace
+
+_INITIALS = mc.initials()
+_FINALS = mc.finals()
+_TONES = ['ping', 'shang', 'qu', 'ru']
+_INITIAL_CODES = dict((init, i) for i, init in enumerate(_INITIALS))
+_FINAL_CODES = dict((final, i) for i, final in enumerate(_FINALS))
+_TONE_CODES = dict((tone, i) for i, tone in enumerate(_TONES))
+_PING, _SHANG, _QU, _RU = range(len(_TONES))
+
+# Code used for finals that aren't in the inventory.
+UNKNOWN_FINAL = -1
+
+_VOICED = np.array(list(map(mc.is_voiced, _INITIALS)))
+_SONORANT = np.array(list(map(mc.is_sonorant, _INITIALS)))
+_MSM_TONES = np.array(['1', '2', '3', '4', '?'])
+
+def vocabularies():
+  """Get the initials, finals, and tones that the codes stand for.
+
+  Returns: A dict of lists, indexed by code.
+  """
+  return {'initials': list(_INITIALS), 'finals': list(_FINALS),
+          'tones': list(_TONES)}
+
+def _pinyin_table():
+  """Lay out steps.compiled_msm_syllables as an initial x final x tone array.
+
+  Syllables rejected by the steps are None.
+  """
+  table = np.empty((len(_INITIALS), len(_FINALS), len(_TONES)), dtype=object)
+  for (init, final, tone), msm in steps.compiled_msm_syllables().items():
+    table[_INITIAL_CODES[init], _FINAL_CODES[final], _TONE_CODES[tone]] = msm
+  return table
+
+_PINYIN_TABLE = _pinyin_table()
+
+def encode(baxter_strings):
+  """Encode syllables in Baxter's notation as integer codes.
+
+  Each distinct spelling is only parsed once. Raises ValueError if any of the
+  syllables can't be parsed.
+
+  Returns: (initials, finals, tones) arrays of codes, one entry per syllable.
+    Finals that aren't in the inventory are coded as UNKNOWN_FINAL.
+  """
+  spellings, inverse = np.unique(
+      np.asarray(baxter_strings), return_inverse=True)
+  n = len(spellings)
+  initials = np.empty(n, dtype=np.int8)
+  finals = np.empty(n, dtype=np.int16)
+  tones = np.empty(n, dtype=np.int8)
+  for i, (init, final, tone) in enumerate(mc.split_many(spellings.tolist())):
+    initials[i] = _INITIAL_CODES[init]
+    finals[i] = _FINAL_CODES.get(final, UNKNOWN_FINAL)
+    tones[i] = _TONE_CODES[tone]
+  return initials[inverse], finals[inverse], tones[inverse]
+
+def msm_tones(initials, tones):
+  """Vectorized version of steps.expected_msm_tone on encoded syllables.
+
+  Returns: An array of tones ('1' to '4', or '?').
+  """
+  voiced, sonorant = _VOICED[initials], _SONORANT[initials]
+  codes = np.select(
+      [(tones == _PING) & ~voiced,
+       (tones == _PING) & voiced,
+       (tones == _SHANG) & ~(voiced & ~sonorant),
+       (tones == _SHANG) & voiced & ~sonorant,
+       tones == _QU,
+       (tones == _RU) & voiced & ~sonorant,
+       (tones == _RU) & sonorant],
+      [0, 1, 2, 3, 3, 1, 3],
+      default=4)
+  return _MSM_TONES[codes]
+
+def msm_syllables(initials, finals, tones):
+  """Look up the MSM syllables for encoded syllables.
+
+  Returns: An object array of Pinyin, with None where the syllable isn't in
+    the precomputed table (e.g., its final is UNKNOWN_FINAL, or the table has
+    no entry for its initial, final, and tone).
+  """
+  known = finals != UNKNOWN_FINAL
+  pinyin = np.empty(len(initials), dtype=object)
+  pinyin[known] = _PINYIN_TABLE[initials[known], finals[known], tones[known]]
+  return pinyin
+
+def _expected_pinyin_or_none(baxter):
+  """steps.expected_pinyin for one syllable, or None if it's rejected."""
+  try:
+    return steps.expected_pinyin(mc.MiddleChineseSyllable.of(baxter))
+  except (ValueError, IndexError):
+    # The steps raise IndexError for an empty final.
+    return None
+
+def convert_batch(baxter_strings):
+  """Convert many syllables in Baxter's notation to Pinyin at once.
+
+  Syllables missing from the precomputed table (whether or not their final is
+  known) are converted one spelling at a time by steps.expected_pinyin, as are
+  syllables selected by an active trace.Tracer. Syllables that the steps reject
+  get None for their Pinyin.
+
+  Returns: (pinyin, tones) arrays, where pinyin matches steps.expected_pinyin
+    and tones match steps.expected_msm_tone.
+  """
+  baxter_strings = np.asarray(baxter_strings)
+  initials, finals, tones = encode(baxter_strings)
+  pinyin = msm_syllables(initials, finals, tones)
+  fallback = {}
+  # (An elementwise comparison, so "is None" won't do.)
+  slow = pinyin == None  # pylint: disable=singleton-comparison
+  if trace.ACTIVE is not None:
+    slow |= np.array([trace.traced(bax) for bax in baxter_strings], dtype=bool)
+  for i in np.flatnonzero(slow):
+    bax = baxter_strings[i]
+    if bax not in fallback:
+      fallback[bax] = _expected_pinyin_or_none(bax)
+    pinyin[i] = fallback[bax]
+  return pinyin, msm_tones(initials, tones)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Tests for batch module."""
+
+import os.path
+import unittest
+
+from . import batch
+from . import mc
+from . import steps
+
+class ConvertBatchTest(unittest.TestCase):
+  """Tests that batch conversion agrees with one-at-a-time conversion."""
+
+  def assert_agrees(self, baxters):
+    """Assert convert_batch matches expected_pinyin and expected_msm_tone."""
+    pinyin, tones = batch.convert_batch(baxters)
+    self.assertEqual(len(baxters), len(pinyin))
+    for bax, py, tone in zip(baxters, pinyin, tones):
+      syl = mc.MiddleChineseSyllable(bax)
+      try:
+        expected = steps.expected_pinyin(syl)
+      except (ValueError, IndexError):
+        expected = None
+      self.assertEqual((expected, steps.expected_msm_tone(syl)), (py, tone),
+                       'Mismatch for %r' % bax)
+
+  def test_examples(self):
+    """Some hand-picked syllables, including an unknown final."""
+    self.assert_agrees(['trhik', 'khjuX', 'nyo', 'baeH', 'trhik', 'trhiwk'])
+
+  def test_missing_from_table(self):
+    """A known final without a table entry for its tone still converts."""
+    self.assertEqual(['bang3'], list(batch.convert_batch(['pakX'])[0]))
+    self.assert_agrees(['pakX', 'pak'])
+
+  def test_mc1(self):
+    """Every syllable in mc1.csv."""
+    fname = os.path.join(os.path.dirname(__file__), 'data/mc1.csv')
+    with open(fname) as f:
+      baxters = [line.split(',')[2].strip() for line in f.readlines()[1:]]
+    self.assert_agrees([bax for bax in baxters if bax])
+
+  def test_invalid(self):
+    """Unparseable syllables are rejected."""
+    with self.assertRaises(ValueError):
+      batch.convert_batch(['qa'])
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""A registry of converters from Middle Chinese to its modern reflexes.
+
+python -m baxter.converters -t pinyin,msm_tone -o /tmp/converted.csv
+
+Every converter shares the same parsed syllables (MiddleChineseSyllable.of)
+and the same Features, computed once per distinct syllable, so converting a
+corpus to several targets reads and parses it only once.
+
+To add a target, subclass Converter and register an instance:
+
+  class Jyutping(converters.Converter):
+    name = 'jyutping'
+    def convert(self, syl, features):
+      ...
+  converters.register(Jyutping())
+"""
+
+import argparse
+import collections
+import csv
+import os.path
+import sys
+
+from . import batch
+from . import mc
+from . import mc2pinyin
+from . import memo
+from . import steps
+
+class Features(collections.namedtuple(
+    'Features', ['initial', 'final', 'tone', 'division', 'open', 'voiced',
+                 'sonorant'])):
+  """Features of a syllable that converters commonly need.
+
+  division is None if the steps can't determine it (e.g., the final is empty).
+  """
+  __slots__ = ()
+
+@memo.memoized()
+def features(syl):
+  """Get the Features of a syllable (computed once per distinct syllable)."""
+  try:
+    division = steps.syllable_division(syl)
+  except IndexError:
+    division = None
+  return Features(syl.baxter_initial, syl.baxter_final, syl.tone, division,
+                  syl.open, syl.voiced, syl.sonorant)
+
+class Converter(object):
+  """Converts Middle Chinese syllables to one target (e.g., Pinyin)."""
+
+  # The name the converter is registered under.
+  name = None
+
+  def convert(self, syl, feats):
+    """Convert a syllable, given its Features.
+
+    Raises ValueError (or IndexError) if the syllable can't be converted.
+    """
+    raise NotImplementedError
+
+  def convert_many(self, syllables, feats):
+    """Convert distinct syllables, given their Features.
+
+    Converters can override this with a faster batch conversion.
+
+    Returns: A list with the conversion of each syllable, or None for those
+      that can't be converted.
+    """
+    results = []
+    for syl, f in zip(syllables, feats):
+      try:
+        results.append(self.convert(syl, f))
+      except (ValueError, IndexError):
+        results.append(None)
+    return results
+
+class PinyinConverter(Converter):
+  """Mandarin in Pinyin with tone numbers, by Brian Lawrence's steps."""
+
+  name = 'pinyin'
+
+  def convert(self, syl, feats):
+    return steps.expected_pinyin(syl)
+
+  def convert_many(self, syllables, feats):
+    pinyin, _ = batch.convert_batch([syl.baxter for syl in syllables])
+    return list(pinyin)
+
+class MsmToneConverter(Converter):
+  """The Mandarin tone number alone ('?' if it can't be predicted)."""
+
+  name = 'msm_tone'
+
+  def convert(self, syl, feats):
+    return steps.expected_msm_tone(syl)
+
+_REGISTRY = collections.OrderedDict()
+
+def register(converter):
+  """Register a converter under its name, replacing any with the same name."""
+  if not converter.name:
+    raise ValueError('Converter %r has no name' % converter)
+  _REGISTRY[converter.name] = converter
+  return converter
+
+def unregister(name):
+  """Remove a converter from the registry."""
+  del _REGISTRY[name]
+
+def get(name):
+  """Get a registered converter by name."""
+  try:
+    return _REGISTRY[name]
+  except KeyError:
+    raise ValueError('Unknown converter %r; expected one of %s' % (
+        name, ', '.join(_REGISTRY)))
+
+def names():
+  """Get the names of the registered converters, in registration order."""
+  return list(_REGISTRY)
+
+register(PinyinConverter())
+register(MsmToneConverter())
+
+def convert_all(baxters, targets=None):
+  """Convert syllables in Baxter's notation to several targets at once.
+
+  Each distinct spelling is parsed, and its Features computed, only once for
+  all of the targets. targets are converter names (by default, all of them).
+
+  Returns: A dict from target to a list with the conversion of each syllable
+    (None where the syllable can't be converted).
+  """
+  converters = [get(t) for t in (targets or names())]
+  baxters = list(baxters)
+  positions = collections.OrderedDict()
+  for bax in baxters:
+    positions.setdefault(bax, len(positions))
+  syllables = [mc.MiddleChineseSyllable.of(bax) for bax in positions]
+  feats = [features(syl) for syl in syllables]
+  results = {}
+  for converter in converters:
+    distinct = converter.convert_many(syllables, feats)
+    results[converter.name] = [distinct[positions[bax]] for bax in baxters]
+  return results
+
+def convert_records(records, targets=None, batch_size=1000):
+  """Convert records (as read by read_records) to several targets.
+
+  Records are converted in batches of batch_size, so that memory use doesn't
+  grow with the input.
+
+  Yields: (record, dict from target to its conversion) pairs, in order.
+  """
+  chunk = []
+  for r in records:
+    chunk.append(r)
+    if len(chunk) >= batch_size:
+      for pair in _convert_chunk(chunk, targets):
+        yield pair
+      chunk = []
+  for pair in _convert_chunk(chunk, targets):
+    yield pair
+
+def _convert_chunk(records, targets):
+  """Convert a list of records (see convert_records)."""
+  if not records:
+    return []
+  results = convert_all([r['baxter'].baxter for r in records], targets)
+  return [(r, dict((t, conversions[i]) for t, conversions in results.items()))
+          for i, r in enumerate(records)]
+
+def main():
+  """Convert Baxter's data to several targets in one pass."""
+  dirname = os.path.dirname(__file__)
+  parser = argparse.ArgumentParser(
+      description='Converts Baxter\'s MC data to several targets at once.')
+  parser.add_argument('-i', '--input_file', dest='input_file', type=str,
+                      default=os.path.join(dirname, 'data/mc1.csv'),
+                      help='Baxter\'s CSV to read (\'-\' for stdin).')
+  parser.add_argument('-o', '--output_file', dest='output_file', type=str,
+                      help='CSV to write (defaults to stdout).')
+  parser.add_argument('-t', '--targets', dest='targets', type=str,
+                      default=','.join(names()),
+                      help=('Comma-separated converters to run (of %s).' %
+                            ', '.join(names())))
+  args = parser.parse_args()
+  targets = args.targets.split(',')
+  for t in targets:
+    if t not in names():
+      parser.error('Unknown converter %r; expected one of %s' % (
+          t, ', '.join(names())))
+  output = open(args.output_file, 'wb') if args.output_file else sys.stdout
+  try:
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(['hanzi', 'baxter'] + targets)
+    records = mc2pinyin.read_records(args.input_file)
+    for r, results in convert_records(records, targets):
+      writer.writerow([r['hanzi'], r['baxter'].baxter] +
+                      ['' if results[t] is None else results[t]
+                       for t in targets])
+  finally:
+    if output is not sys.stdout:
+      output.close()
+
+if __name__ == '__main__':
+  main()
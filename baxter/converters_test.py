@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Tests for converters module."""
+
+import os.path
+import unittest
+
+from . import converters
+from . import mc
+from . import mc2pinyin
+from . import steps
+from . import test_util
+
+_MC1 = os.path.join(os.path.dirname(__file__), 'data/mc1.csv')
+
+class _InitialConverter(converters.Converter):
+  """Converts a syllable to its initial and division, counting calls."""
+
+  name = 'initial_division'
+
+  def __init__(self):
+    self.calls = 0
+
+  def convert(self, syl, feats):
+    self.calls += 1
+    if feats.division is None:
+      raise ValueError('No division for %s' % syl.baxter)
+    return '%s%d' % (feats.initial, feats.division)
+
+class ConvertersTest(unittest.TestCase):
+  """Tests for the converter registry."""
+
+  def setUp(self):
+    self._converter = converters.register(_InitialConverter())
+
+  def tearDown(self):
+    converters.unregister('initial_division')
+
+  def test_registry(self):
+    """Converters are found by name."""
+    self.assertEqual(['pinyin', 'msm_tone', 'initial_division'],
+                     converters.names())
+    self.assertIs(self._converter, converters.get('initial_division'))
+    self.assertRaises(ValueError, converters.get, 'nonexistent')
+
+  def test_convert_all(self):
+    """Every target is converted, with each distinct spelling done once."""
+    results = converters.convert_all(['tha', 'haeng', 'tha', 'trhiwk'])
+    self.assertEqual(['tuo1', 'xing2', 'tuo1', None], results['pinyin'])
+    self.assertEqual(['1', '2', '1', '?'], results['msm_tone'])
+    self.assertEqual(['th1', 'h2', 'th1', 'trh3'],
+                     results['initial_division'])
+    self.assertEqual(3, self._converter.calls)
+
+  def test_matches_steps(self):
+    """Converting records in one pass agrees with the steps."""
+    with test_util.Quiet():
+      records = list(mc2pinyin.read_records(_MC1))
+    pairs = list(converters.convert_records(
+        records, ['pinyin', 'msm_tone'], batch_size=1000))
+    self.assertEqual(len(records), len(pairs))
+    for r, results in pairs:
+      syl = r['baxter']
+      try:
+        pinyin = steps.expected_pinyin(syl)
+      except (ValueError, IndexError):
+        pinyin = None
+      self.assertEqual(pinyin, results['pinyin'])
+      self.assertEqual(steps.expected_msm_tone(syl), results['msm_tone'])
+
+  def test_features(self):
+    """Features are computed from the syllable."""
+    f = converters.features(mc.MiddleChineseSyllable.of('kwaeng'))
+    self.assertEqual(('k', 'waeng', 'ping', 2, False, False, False), f)
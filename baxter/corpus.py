@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""Compact binary corpora of Baxter's records and the ytenx records.
+
+Compiling reads the CSV (or the ytenx snapshot) once; loading the result only
+maps the file with numpy.memmap, so the cost of parsing isn't paid again by
+every process that needs the records.
+
+python -m baxter.corpus -o /tmp/mc1.corpus
+python -m baxter.corpus --ytenx -o /tmp/ytenx.corpus
+
+The file starts with _MAGIC, then the length of a json header (as a
+little-endian uint32), then the header itself. The header gives the kind of
+records (BAXTER or YTENX), the number of rows, the vocabularies that the
+initial/final/tone codes index into, and the offset, dtype, and length of
+each array that follows. Strings are stored once each, in a table of utf-8
+bytes plus offsets; string columns hold indexes into that table. A list
+column (e.g., the characters of a ytenx record) holds the values of every
+row end to end, and <name>_index holds where each row's values start.
+
+Baxter's reference fields are also stored as integer columns: gsr_series (the
+GSR number, e.g. 938 for 0938c), hydzd_number (e.g., 31888050 for 31888.050),
+and the list column guangyun_refs (e.g., 27135 for 271.35). Values that don't
+have the usual form are -1.
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os.path
+import re
+import struct
+
+import numpy as np
+
+from . import mc
+
+_MAGIC = 'MCCORPUS'
+_VERSION = 2
+_ALIGNMENT = 8
+
+# The kinds of records a corpus can hold.
+BAXTER, YTENX = 'baxter', 'ytenx'
+
+# Columns holding indexes into the string table, by kind.
+_STRING_COLUMNS = {
+    BAXTER: ['hanzi', 'pinyin', 'baxter', 'gsr', 'hydzd', 'guangyun'],
+    YTENX: ['hanzi', 'fanqie', 'tone', 'grade', 'initial', 'final',
+            'final_full', 'section', 'she', 'row']}
+_DTYPES = {
+    'initial': '<i1', 'final': '<i2', 'tone': '<i1', 'division': '<i1',
+    'open': '<i1', 'voiced': '<i1', 'sonorant': '<i1',
+    'string_offsets': '<u4', 'string_data': '<u1'}
+
+_GSR_REGEX = re.compile(r'(\d+)')
+_HYDZD_REGEX = re.compile(r'(\d{5})\.(\d{3})$')
+_GUANGYUN_REGEX = re.compile(r'(\d+)\.(\d{2})$')
+
+def _division_or_zero(syl):
+  """Get the division of a syllable, or 0 if the steps can't determine it."""
+  # Imported here, since compiling the steps is the slowest part of importing
+  # them, and loading a corpus doesn't need them.
+  from . import steps
+  try:
+    return steps.syllable_division(syl)
+  except IndexError:
+    return 0
+
+def _gsr_series(gsr):
+  """Get the GSR number of a reference (e.g., 938 for 0938c), or -1."""
+  m = _GSR_REGEX.match(gsr)
+  return int(m.group(1)) if m else -1
+
+def _hydzd_number(hydzd):
+  """Get a 漢語大字典 reference as a number (e.g., 31888050), or -1."""
+  m = _HYDZD_REGEX.match(hydzd)
+  return int(m.group(1) + m.group(2)) if m else -1
+
+def _guangyun_ref(ref):
+  """Get a 廣韻 reference as a number (e.g., 27135 for 271.35), or -1."""
+  m = _GUANGYUN_REGEX.match(ref)
+  return int(m.group(1)) * 100 + int(m.group(2)) if m else -1
+
+class _Columns(object):
+  """The arrays of a corpus being compiled, with its string table."""
+
+  def __init__(self, kind, records):
+    self.kind = kind
+    self.records = list(records)
+    self.arrays = {}
+    self._strings = {}
+
+  def add_strings(self, name, values):
+    """Add a string column (of byte strings)."""
+    ids = self._strings
+    self.arrays[name] = np.array(
+        [ids.setdefault(s, len(ids)) for s in values], dtype='<i4')
+
+  def add_list(self, name, lists, dtype='<i4'):
+    """Add a list column, and its <name>_index."""
+    lengths = np.array([len(values) for values in lists], dtype=np.int64)
+    self.arrays[name + '_index'] = np.concatenate([[0], np.cumsum(lengths)])
+    self.arrays[name] = np.array(
+        [v for values in lists for v in values], dtype=dtype)
+
+  def add_string_lists(self, name, lists):
+    """Add a list column of (byte) strings."""
+    ids = self._strings
+    self.add_list(name, [[ids.setdefault(s, len(ids)) for s in values]
+                         for values in lists])
+
+  def finish(self):
+    """Add the string table, in sorted order (renumbering the ids)."""
+    strings = sorted(self._strings)
+    renumber = np.empty(len(strings), dtype='<i4')
+    for i, s in enumerate(strings):
+      renumber[self._strings[s]] = i
+    for name in _STRING_COLUMNS[self.kind]:
+      self.arrays[name] = renumber[self.arrays[name]]
+    if self.kind == YTENX:
+      self.arrays['chars'] = renumber[self.arrays['chars']]
+    lengths = np.array([len(s) for s in strings], dtype=np.int64)
+    self.arrays['string_offsets'] = np.concatenate([[0], np.cumsum(lengths)])
+    self.arrays['string_data'] = np.frombuffer(''.join(strings), dtype=np.uint8)
+    return len(self.records), self.arrays
+
+def _columns(records):
+  """Build the arrays of Baxter's corpus from records (from read_records)."""
+  from . import batch
+  columns = _Columns(BAXTER, records)
+  records = columns.records
+  syllables = [r['baxter'] for r in records]
+  for col in _STRING_COLUMNS[BAXTER]:
+    if col == 'baxter':
+      columns.add_strings(col, [syl.baxter for syl in syllables])
+    else:
+      columns.add_strings(col, [r[col] for r in records])
+  arrays = columns.arrays
+  arrays['initial'], arrays['final'], arrays['tone'] = batch.encode(
+      [syl.baxter for syl in syllables])
+  features = {}
+  for syl in set(syllables):
+    features[syl] = (_division_or_zero(syl), syl.open, syl.voiced,
+                     syl.sonorant)
+  for i, col in enumerate(['division', 'open', 'voiced', 'sonorant']):
+    arrays[col] = np.array([features[syl][i] for syl in syllables])
+  arrays['gsr_series'] = np.array([_gsr_series(r['gsr']) for r in records])
+  arrays['hydzd_number'] = np.array(
+      [_hydzd_number(r['hydzd']) for r in records])
+  columns.add_list('guangyun_refs', [
+      [_guangyun_ref(ref) for ref in r['guangyun'].split()] for r in records])
+  return columns.finish()
+
+def _ytenx_columns(records):
+  """Build the arrays of a ytenx corpus from records (from extract_records)."""
+  columns = _Columns(YTENX, records)
+  records = columns.records
+  for col in _STRING_COLUMNS[YTENX]:
+    columns.add_strings(col, [r[col].encode('utf-8') for r in records])
+  columns.add_string_lists(
+      'chars', [[c.encode('utf-8') for c in r['chars']] for r in records])
+  arrays = columns.arrays
+  arrays['id'] = np.array([r['id'] for r in records])
+  arrays['number'] = np.array([r['number'] for r in records])
+  arrays['open'] = np.array(
+      [-1 if r['open'] is None else r['open'] for r in records])
+  return columns.finish()
+
+def _aligned(offset):
+  """Round offset up to a multiple of _ALIGNMENT."""
+  return offset + (-offset % _ALIGNMENT)
+
+def _write(kind, num_rows, columns, output_file, vocabularies=None):
+  """Write the arrays of a corpus to a file."""
+  header = {'version': _VERSION, 'kind': kind, 'rows': num_rows,
+            'vocabularies': vocabularies or {}, 'columns': {}}
+  arrays, offset = [], 0
+  for name in sorted(columns):
+    # (ytenx's tone, initial, and final are strings, not codes.)
+    dtype = ('<i4' if name in _STRING_COLUMNS[kind]
+             else _DTYPES.get(name, '<i4'))
+    array = np.ascontiguousarray(columns[name], dtype=dtype)
+    offset = _aligned(offset)
+    # Offsets are relative to the (aligned) end of the header.
+    header['columns'][name] = {'dtype': array.dtype.str, 'length': len(array),
+                               'offset': offset}
+    arrays.append((offset, array))
+    offset += array.nbytes
+  encoded = json.dumps(header)
+  with open(output_file, 'wb') as f:
+    f.write(_MAGIC + struct.pack('<I', len(encoded)) + encoded)
+    base = _aligned(f.tell())
+    for offset, array in arrays:
+      f.write('\0' * (base + offset - f.tell()))
+      f.write(array.tobytes())
+
+def compile_corpus(records, output_file):
+  """Write records (as read by read_records) to a binary corpus file."""
+  from . import batch
+  num_rows, columns = _columns(records)
+  _write(BAXTER, num_rows, columns, output_file, batch.vocabularies())
+
+def compile_ytenx_corpus(records, output_file):
+  """Write ytenx records (from extract_records) to a binary corpus file."""
+  num_rows, columns = _ytenx_columns(records)
+  _write(YTENX, num_rows, columns, output_file)
+
+class Corpus(object):
+  """A binary corpus file, mapped into memory."""
+
+  def __init__(self, path):
+    """Map the corpus at path (without reading the rows)."""
+    self._data = np.memmap(path, dtype=np.uint8, mode='r')
+    prefix = self._data[:len(_MAGIC) + 4].tobytes()
+    if prefix[:len(_MAGIC)] != _MAGIC:
+      raise ValueError('Not a corpus file: %s' % path)
+    header_len, = struct.unpack('<I', prefix[len(_MAGIC):])
+    start = len(_MAGIC) + 4
+    header = json.loads(self._data[start:start + header_len].tobytes())
+    if header['version'] != _VERSION:
+      raise ValueError('Unsupported corpus version %r in %s' % (
+          header['version'], path))
+    self.kind = header['kind']
+    self._rows = header['rows']
+    self._vocabularies = header['vocabularies']
+    base = _aligned(start + header_len)
+    self._columns = {}
+    for name, col in header['columns'].items():
+      dtype = np.dtype(str(col['dtype']))
+      begin = base + col['offset']
+      end = begin + col['length'] * dtype.itemsize
+      self._columns[name] = self._data[begin:end].view(dtype)
+    self._offsets = self._columns.pop('string_offsets')
+    self._string_data = self._columns.pop('string_data')
+
+  def __len__(self):
+    return self._rows
+
+  def column(self, name):
+    """Get a column (e.g., 'tone' or 'hanzi') as a (read-only) array.
+
+    String columns hold string ids; see Corpus.string. The values of row i of
+    a list column are column(name)[index[i]:index[i + 1]], where index is
+    column(name + '_index').
+    """
+    return self._columns[name]
+
+  def vocabulary(self, name):
+    """Get the values that the codes of a column stand for.
+
+    name is 'initials', 'finals', or 'tones' (for Baxter's records).
+    """
+    return self._vocabularies[name]
+
+  def string(self, string_id):
+    """Get a string from the string table."""
+    start, end = self._offsets[string_id], self._offsets[string_id + 1]
+    s = self._string_data[start:end].tobytes()
+    return s.decode('utf-8') if self.kind == YTENX else s
+
+  def _strings(self):
+    """Get the whole string table (as an object array), in one pass."""
+    data = self._string_data.tobytes()
+    offsets = self._offsets.tolist()
+    strings = [data[start:end]
+               for start, end in itertools.izip(offsets, offsets[1:])]
+    if self.kind == YTENX:
+      strings = [s.decode('utf-8') for s in strings]
+    table = np.empty(len(strings), dtype=object)
+    table[:] = strings
+    return table
+
+  def _list(self, name, i):
+    """Get the values of row i of a list column."""
+    index = self._columns[name + '_index']
+    return self._columns[name][index[i]:index[i + 1]]
+
+  def record(self, i):
+    """Get row i as a record, like read_records (or extract_records) yields."""
+    record = dict((col, self.string(self._columns[col][i]))
+                  for col in _STRING_COLUMNS[self.kind])
+    if self.kind == YTENX:
+      record['chars'] = [self.string(c) for c in self._list('chars', i)]
+      record.update(self._ytenx_fields(i))
+    else:
+      record['baxter'] = mc.MiddleChineseSyllable.of(record['baxter'])
+    return record
+
+  def _ytenx_fields(self, i):
+    """Get the numeric fields of row i of a ytenx corpus."""
+    is_open = int(self._columns['open'][i])
+    return {'id': int(self._columns['id'][i]),
+            'number': int(self._columns['number'][i]),
+            'open': None if is_open < 0 else bool(is_open)}
+
+  def records(self):
+    """Generate all of the records, in their original order."""
+    # The string columns are decoded all at once, rather than slicing each
+    # string out of the map.
+    table = self._strings()
+    names = _STRING_COLUMNS[self.kind]
+    columns = [table[self._columns[col]].tolist() for col in names]
+    if self.kind == BAXTER:
+      of = mc.MiddleChineseSyllable.of
+      for hanzi, pinyin, baxter, gsr, hydzd, guangyun in itertools.izip(
+          *columns):
+        yield {'hanzi': hanzi, 'pinyin': pinyin, 'baxter': of(baxter),
+               'gsr': gsr, 'hydzd': hydzd, 'guangyun': guangyun}
+      return
+    chars = table[self._columns['chars']].tolist()
+    index = self._columns['chars_index'].tolist()
+    ids = self._columns['id'].tolist()
+    numbers = self._columns['number'].tolist()
+    opens = self._columns['open'].tolist()
+    for i, values in enumerate(itertools.izip(*columns)):
+      record = dict(itertools.izip(names, values))
+      record['chars'] = chars[index[i]:index[i + 1]]
+      record['id'], record['number'] = ids[i], numbers[i]
+      record['open'] = None if opens[i] < 0 else bool(opens[i])
+      yield record
+
+def main():
+  """Compile Baxter's CSV (or the ytenx records) into a corpus file."""
+  dirname = os.path.dirname(__file__)
+  parser = argparse.ArgumentParser(
+      description=('Compiles Baxter\'s MC data (or the ytenx records) into a '
+                   'binary corpus.'))
+  parser.add_argument('-i', '--input_file', dest='input_file', type=str,
+                      help=('Baxter\'s CSV to read (by default, data/mc1.csv), '
+                            'or with --ytenx, records written by '
+                            'ytenx.extract_records (by default, they\'re '
+                            'extracted from the snapshot).'))
+  parser.add_argument('--ytenx', dest='ytenx', action='store_true',
+                      help='Compile the ytenx records.')
+  parser.add_argument('--jsonl', dest='jsonl', action='store_true',
+                      help='The ytenx records file is JSON Lines.')
+  parser.add_argument('--gzip', dest='gzip', action='store_true',
+                      help='The ytenx records file is gzipped.')
+  parser.add_argument('-o', '--output_file', dest='output_file', type=str,
+                      required=True, help='File to write the corpus to.')
+  args = parser.parse_args()
+  if args.ytenx:
+    from ytenx import extract_records
+    if args.input_file:
+      records = extract_records.load_records(
+          args.input_file, args.jsonl, args.gzip)
+    else:
+      records = extract_records.iter_records(
+          os.path.join(os.path.dirname(dirname), 'ytenx/data_20170503'),
+          workers=multiprocessing.cpu_count())
+    compile_ytenx_corpus(records, args.output_file)
+  else:
+    from . import mc2pinyin
+    compile_corpus(
+        mc2pinyin.read_records(
+            args.input_file or os.path.join(dirname, 'data/mc1.csv')),
+        args.output_file)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Tests for corpus module."""
+
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from ytenx import extract_records
+
+from . import corpus
+from . import mc2pinyin
+from . import steps
+from . import test_util
+
+_MC1 = os.path.join(os.path.dirname(__file__), 'data/mc1.csv')
+_YTENX_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'ytenx/data_20170503')
+
+class CorpusTest(unittest.TestCase):
+  """Tests compiling mc1.csv and loading it back."""
+
+  @classmethod
+  def setUpClass(cls):
+    cls._tmpdir = tempfile.mkdtemp()
+    with test_util.Quiet():
+      cls._records = list(mc2pinyin.read_records(_MC1))
+    cls._path = os.path.join(cls._tmpdir, 'mc1.corpus')
+    corpus.compile_corpus(cls._records, cls._path)
+
+  @classmethod
+  def tearDownClass(cls):
+    shutil.rmtree(cls._tmpdir)
+
+  def test_records_round_trip(self):
+    """The corpus holds the same records, in the same order."""
+    loaded = corpus.Corpus(self._path)
+    self.assertEqual(len(self._records), len(loaded))
+    self.assertEqual(self._records, list(loaded.records()))
+
+  def test_columns(self):
+    """The coded columns agree with the syllables."""
+    loaded = corpus.Corpus(self._path)
+    tones, finals = loaded.vocabulary('tones'), loaded.vocabulary('finals')
+    for i in (0, 100, 5000):
+      syl = self._records[i]['baxter']
+      self.assertEqual(syl.tone, tones[loaded.column('tone')[i]])
+      self.assertEqual(syl.baxter_final, finals[loaded.column('final')[i]])
+      self.assertEqual(syl.open, bool(loaded.column('open')[i]))
+      self.assertEqual(steps.syllable_division(syl),
+                       loaded.column('division')[i])
+
+  def test_references(self):
+    """The reference fields are also stored as integers."""
+    loaded = corpus.Corpus(self._path)
+    # 挨,ai1,'eajX,0938c,31888.050,271.35 274.44,13
+    i = [r['hanzi'] for r in self._records].index('挨')
+    self.assertEqual(938, loaded.column('gsr_series')[i])
+    self.assertEqual(31888050, loaded.column('hydzd_number')[i])
+    index = loaded.column('guangyun_refs_index')
+    self.assertEqual([27135, 27444], list(
+        loaded.column('guangyun_refs')[index[i]:index[i + 1]]))
+    self.assertEqual(len(self._records), len(index) - 1)
+
+  def test_record(self):
+    """Single records can be read without reading the rest."""
+    loaded = corpus.Corpus(self._path)
+    self.assertEqual(self._records[1234], loaded.record(1234))
+
+  def test_ytenx_round_trip(self):
+    """ytenx records round trip too."""
+    records = [extract_records.extract_record(
+        os.path.join(_YTENX_DIR, '%d.html' % i)) for i in (1, 2, 3, 2000)]
+    path = os.path.join(self._tmpdir, 'ytenx.corpus')
+    corpus.compile_ytenx_corpus(records, path)
+    loaded = corpus.Corpus(path)
+    self.assertEqual(corpus.YTENX, loaded.kind)
+    self.assertEqual(records, list(loaded.records()))
+    self.assertEqual(records[3], loaded.record(3))
+    self.assertEqual([1, 2, 3, 2000], list(loaded.column('id')))
+
+  def test_not_a_corpus(self):
+    """Other files are rejected."""
+    with self.assertRaises(ValueError):
+      corpus.Corpus(_MC1)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Evaluates variants of the steps' rules side by side, in one pass.
+
+python -m baxter.experiment --variants my_variants
+
+where my_variants is an importable module defining VARIANTS, a list of
+Variants:
+
+  from baxter import experiment
+  from baxter import steps
+
+  def tone_r2(tone_r1, init_r1):
+    ...
+
+  VARIANTS = [
+      experiment.Variant('new tone_r2', tone_r2=tone_r2),
+      experiment.Variant('no -ong', simplify_final_r1=experiment.simplifier(
+          steps.ROUND_1_SIMPLIFICATIONS[1:]))]
+
+The corpus is read and parsed once, and each variant only converts the
+distinct syllables. The step functions a variant doesn't replace are the
+memoized ones shared by every variant (and the baseline), so their results
+are reused rather than recomputed; sweeping many variants costs little more
+than the baseline alone.
+"""
+
+import argparse
+import collections
+import importlib
+import os.path
+import sys
+
+from . import mc2pinyin
+from . import steps
+from . import trace
+
+class Variant(object):
+  """A named set of replacements for the steps' rules."""
+
+  def __init__(self, name, **replacements):
+    """Replace the step functions named by steps.Rules' fields.
+
+    Raises ValueError for names that aren't fields of steps.Rules.
+    """
+    unknown = sorted(set(replacements) - set(steps.Rules._fields))
+    if unknown:
+      raise ValueError('Unknown rules %s; expected some of %s' % (
+          ', '.join(unknown), ', '.join(steps.Rules._fields)))
+    self.name = name
+    self.rules = steps.RULES._replace(**replacements)
+
+  def __repr__(self):
+    return 'Variant(%r)' % self.name
+
+# The variant every other one is compared with.
+BASELINE = Variant('baseline')
+
+def simplifier(table):
+  """Make a simplify_final_r1 rule from a table of simplifications.
+
+  The table is like steps.ROUND_1_SIMPLIFICATIONS. Finals are looked up in a
+  dict built once from it (the first entry listing a final wins).
+  """
+  outputs = {}
+  for possibilities, output in table:
+    for final in possibilities:
+      outputs.setdefault(final, output)
+  def simplify_final_r1(final_r1, bax):
+    """Simplify the round 1 finals, by the table."""
+    try:
+      output = outputs[final_r1]
+    except KeyError:
+      raise ValueError('Unexpected final: %s (from %s)' % (final_r1, bax))
+    trace.hit('simplify_final_r1: to %s', output)
+    return output
+  return simplify_final_r1
+
+# The errors the steps (and variants of them) reject a syllable with: their
+# own ValueErrors, and the IndexErrors, KeyErrors and failed assertions of
+# the tables and checks they don't expect the syllable to reach.
+_REJECTIONS = (ValueError, IndexError, KeyError, AssertionError)
+
+def _convert(syl, rules):
+  """Convert a syllable by the rules, or get None if they reject it."""
+  try:
+    return steps.expected_msm_syllable(syl, rules)
+  except _REJECTIONS:
+    return None
+
+# A record whose expected Pinyin a variant changed.
+Diff = collections.namedtuple(
+    'Diff', ['hanzi', 'baxter', 'pinyin', 'baseline', 'variant'])
+
+class Evaluation(object):
+  """Match rates of several variants over the same records.
+
+  variants: The Variants, starting with the baseline.
+  total: The number of records.
+  matches: A Counter of the records each variant matches, by name.
+  fixed: A dict from variant name to the Diffs it matches that the baseline
+    doesn't.
+  broken: Likewise, for the Diffs the baseline matches but it doesn't.
+  changed: A Counter of the records each variant converts differently from
+    the baseline, by name.
+  """
+
+  def __init__(self, variants):
+    self.variants = variants
+    self.total = 0
+    self.matches = collections.Counter()
+    self.fixed = dict((v.name, []) for v in variants)
+    self.broken = dict((v.name, []) for v in variants)
+    self.changed = collections.Counter()
+
+  def report(self, out=None, examples=5):
+    """Write the match rates side by side, and some diffs of each variant."""
+    out = out or sys.stdout
+    base = self.variants[0].name
+    print >>out, '%-30s %15s %8s %8s %8s %8s' % (
+        'variant', 'matches', 'rate', 'delta', 'fixed', 'broken')
+    for v in self.variants:
+      rate = 100.0 * self.matches[v.name] / self.total if self.total else 0.0
+      delta = (100.0 * (self.matches[v.name] - self.matches[base]) /
+               self.total if self.total else 0.0)
+      print >>out, '%-30s %15s %7.2f%% %+7.2f%% %8d %8d' % (
+          v.name, '%d/%d' % (self.matches[v.name], self.total), rate, delta,
+          len(self.fixed[v.name]), len(self.broken[v.name]))
+    for v in self.variants[1:]:
+      if not self.changed[v.name]:
+        continue
+      print >>out
+      print >>out, '%s: %d records changed' % (v.name, self.changed[v.name])
+      for label, diffs in (('fixed', self.fixed[v.name]),
+                           ('broken', self.broken[v.name])):
+        for d in diffs[:examples]:
+          print >>out, '  %s %s %s (%s): %s -> %s' % (
+              label, d.hanzi, d.baxter, d.pinyin, d.baseline or '-',
+              d.variant or '-')
+
+def evaluate(records, variants):
+  """Evaluate the baseline and variants over records (as read_records reads).
+
+  Returns: An Evaluation.
+  """
+  variants = [BASELINE] + list(variants)
+  names = [v.name for v in variants]
+  if len(set(names)) != len(names):
+    raise ValueError('Variant names must be distinct: %s' % ', '.join(names))
+  # Parse once: the records, and the distinct syllables among them.
+  rows = []
+  syllables = collections.OrderedDict()
+  for r in records:
+    syl = r['baxter']
+    syllables.setdefault(syl.baxter, syl)
+    rows.append((r['hanzi'], syl.baxter, r['pinyin']))
+  # Convert each distinct syllable once per distinct set of rules.
+  by_rules = {}
+  for v in variants:
+    if v.rules not in by_rules:
+      by_rules[v.rules] = dict((bax, _convert(syl, v.rules))
+                               for bax, syl in syllables.iteritems())
+  expected = dict((v.name, by_rules[v.rules]) for v in variants)
+  evaluation = Evaluation(variants)
+  evaluation.total = len(rows)
+  base = expected[BASELINE.name]
+  for hanzi, bax, pinyin in rows:
+    base_matched = base[bax] == pinyin
+    for v in variants:
+      got = expected[v.name][bax]
+      matched = got == pinyin
+      if matched:
+        evaluation.matches[v.name] += 1
+      if got == base[bax]:
+        continue
+      evaluation.changed[v.name] += 1
+      diff = Diff(hanzi, bax, pinyin, base[bax], got)
+      if matched and not base_matched:
+        evaluation.fixed[v.name].append(diff)
+      elif base_matched and not matched:
+        evaluation.broken[v.name].append(diff)
+  return evaluation
+
+def main():
+  """Evaluate variants of the rules from the command line."""
+  dirname = os.path.dirname(__file__)
+  parser = argparse.ArgumentParser(
+      description=('Compares the match rates of variants of the steps\' '
+                   'rules over Baxter\'s MC data, in one pass.'))
+  parser.add_argument('-i', '--input_file', dest='input_file', type=str,
+                      default=os.path.join(dirname, 'data/mc1.csv'),
+                      help='Baxter\'s CSV to read (\'-\' for stdin).')
+  parser.add_argument('--variants', dest='variants', type=str, required=True,
+                      help='Module defining VARIANTS, a list of Variants.')
+  parser.add_argument('--examples', dest='examples', type=int, default=5,
+                      help='Number of fixed and broken records to list.')
+  args = parser.parse_args()
+  variants = importlib.import_module(args.variants).VARIANTS
+  evaluation = evaluate(mc2pinyin.read_records(args.input_file), variants)
+  evaluation.report(examples=args.examples)
+
+if __name__ == '__main__':
+  main()
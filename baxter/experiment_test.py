@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Tests for experiment module."""
+
+import StringIO
+import unittest
+
+from . import experiment
+from . import steps
+from . import test_util
+
+_RECORDS = [test_util.record('知', 'trje', 'zhi1'),
+            test_util.record('樂', 'lak', 'le4'),
+            test_util.record('十', 'syip', 'shi2'),
+            test_util.record('實', 'zyit', 'shi2')]
+
+def _ru_to_2(tone_r1, init_r1):
+  """A variant of _tone_r2 that puts every ru syllable in tone 2."""
+  if tone_r1 == '4':
+    return '2'
+  return steps.RULES.tone_r2(tone_r1, init_r1)
+
+class ExperimentTest(unittest.TestCase):
+  """Tests for evaluating variants of the rules."""
+
+  def test_evaluate(self):
+    """Variants are compared with the baseline record by record."""
+    without_i = [(finals, output)
+                 for finals, output in steps.ROUND_1_SIMPLIFICATIONS
+                 if output != 'i']
+    evaluation = experiment.evaluate(_RECORDS, [
+        experiment.Variant('ru to 2', tone_r2=_ru_to_2),
+        experiment.Variant('same table', simplify_final_r1=experiment.simplifier(
+            steps.ROUND_1_SIMPLIFICATIONS)),
+        experiment.Variant('no i', simplify_final_r1=experiment.simplifier(
+            without_i))])
+    self.assertEqual(4, evaluation.total)
+    self.assertEqual({'baseline': 2, 'ru to 2': 3, 'same table': 2, 'no i': 1},
+                     dict(evaluation.matches))
+    self.assertEqual([('十', 'syip', 'shi2', 'shi4', 'shi2')],
+                     evaluation.fixed['ru to 2'])
+    self.assertEqual([], evaluation.broken['ru to 2'])
+    self.assertEqual(2, evaluation.changed['ru to 2'])
+    self.assertEqual(0, evaluation.changed['same table'])
+    # Rejected syllables convert to None.
+    self.assertEqual([('知', 'trje', 'zhi1', 'zhi1', None)],
+                     evaluation.broken['no i'])
+
+  def test_lookup_errors_are_rejections(self):
+    """A variant that breaks a later step's lookups just rejects syllables."""
+    def init_r1(bax_init):
+      """Send l to an initial that _init_r2 has no entry for."""
+      return 'Vl' if bax_init == 'l' else steps.RULES.init_r1(bax_init)
+    records = _RECORDS + [test_util.record('來', 'loj', 'lai2')]
+    evaluation = experiment.evaluate(records, [
+        experiment.Variant('Vl', init_r1=init_r1)])
+    self.assertEqual({'baseline': 3, 'Vl': 2}, dict(evaluation.matches))
+    self.assertEqual(2, evaluation.changed['Vl'])
+    self.assertEqual([('來', 'loj', 'lai2', 'lai2', None)],
+                     evaluation.broken['Vl'])
+
+  def test_distinct_syllables_converted_once(self):
+    """Each variant converts each distinct syllable once."""
+    calls = []
+    def tone_r2(tone_r1, init_r1):
+      """Count the calls of _tone_r2."""
+      calls.append(tone_r1)
+      return steps.RULES.tone_r2(tone_r1, init_r1)
+    variant = experiment.Variant('counted', tone_r2=tone_r2)
+    same = experiment.Variant('same rules', tone_r2=tone_r2)
+    evaluation = experiment.evaluate(_RECORDS * 3, [variant, same])
+    self.assertEqual(4, len(calls))
+    self.assertEqual(6, evaluation.matches['same rules'])
+
+  def test_bad_variants(self):
+    """Unknown rules and duplicate names are rejected."""
+    with self.assertRaises(ValueError):
+      experiment.Variant('typo', tone_r3=_ru_to_2)
+    with self.assertRaises(ValueError):
+      experiment.evaluate(_RECORDS, [experiment.Variant('baseline')])
+
+  def test_report(self):
+    """The report lists each variant's rate, then its diffs."""
+    out = StringIO.StringIO()
+    experiment.evaluate(_RECORDS, [
+        experiment.Variant('ru to 2', tone_r2=_ru_to_2)]).report(out)
+    lines = out.getvalue().splitlines()
+    self.assertEqual(['baseline', '2/4', '50.00%', '+0.00%', '0', '0'],
+                     lines[1].split())
+    self.assertEqual(['ru', 'to', '2', '3/4', '75.00%', '+25.00%', '1', '0'],
+                     lines[2].split())
+    self.assertIn('ru to 2: 2 records changed', lines)
+    self.assertIn('  fixed 十 syip (shi2): shi4 -> shi2', lines)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Fuzzy lookup of syllables in Baxter's notation, for suggesting corrections.
+
+python -m baxter.fuzzy tsyhowngX trjwenk
+transcription | python -m baxter.fuzzy -k 1 -
+
+The index covers every syllable in the inventory (see mc.all_syllables) and
+every spelling in Baxter's data. It's a symmetric deletion index: each
+spelling is filed under every string made by deleting up to two of its
+characters, so a query only computes the edit distance to the spellings that
+share one of its own deletion variants, rather than to the whole inventory.
+Suggestions at the same distance are ranked by how often they're attested in
+Baxter's data.
+"""
+
+import argparse
+import collections
+import os.path
+import sys
+
+from . import loader
+from . import mc
+from . import memo
+
+def distance(a, b):
+  """Get the Levenshtein (edit) distance between two strings."""
+  if len(a) < len(b):
+    a, b = b, a
+  previous = range(len(b) + 1)
+  for i, ca in enumerate(a):
+    current = [i + 1]
+    for j, cb in enumerate(b):
+      current.append(min(previous[j + 1] + 1, current[j] + 1,
+                         previous[j] + (ca != cb)))
+    previous = current
+  return previous[-1]
+
+def _deletions(word, k):
+  """Get the strings made by deleting up to k characters of word."""
+  variants = set([word])
+  frontier = variants
+  for _ in xrange(k):
+    frontier = set(w[:i] + w[i + 1:] for w in frontier for i in xrange(len(w)))
+    variants |= frontier
+  return variants
+
+class DeletionIndex(object):
+  """A symmetric deletion index of strings under edit distance.
+
+  Every string within edit distance k of a word shares a deletion variant
+  (with up to k characters deleted) with it, so a search only looks up the
+  variants of the query and checks the distance to the words that share them.
+  """
+
+  def __init__(self, words=(), max_distance=2):
+    """Index words, for searches within max_distance."""
+    self.max_distance = max_distance
+    self._words = set()
+    self._variants = collections.defaultdict(list)
+    for word in words:
+      self.add(word)
+
+  def __len__(self):
+    return len(self._words)
+
+  def __contains__(self, word):
+    return word in self._words
+
+  def add(self, word):
+    """Add a word, unless it's already in the index.
+
+    Returns: Whether the word was added.
+    """
+    if word in self._words:
+      return False
+    self._words.add(word)
+    for variant in _deletions(word, self.max_distance):
+      self._variants[variant].append(word)
+    return True
+
+  def search(self, word, k):
+    """Find the words within edit distance k of word.
+
+    Raises ValueError if k is more than max_distance.
+
+    Returns: A list of (distance, word) pairs, nearest first.
+    """
+    if k > self.max_distance:
+      raise ValueError('Can only search within distance %d; got %d' % (
+          self.max_distance, k))
+    candidates = set()
+    for variant in _deletions(word, k):
+      candidates.update(self._variants.get(variant, ()))
+    results = []
+    for candidate in candidates:
+      if abs(len(candidate) - len(word)) <= k:
+        d = distance(word, candidate)
+        if d <= k:
+          results.append((d, candidate))
+    results.sort()
+    return results
+
+class SpellingIndex(object):
+  """Suggests valid spellings for (possibly misspelled) syllables."""
+
+  def __init__(self, spellings, counts=None, max_distance=2,
+               cache_size=1 << 12):
+    """Index valid spellings, for suggestions up to max_distance away.
+
+    counts (a dict from spelling to how often it's attested) ranks the
+    suggestions at the same distance. Recent queries are cached (up to
+    cache_size), since transcriptions tend to repeat their mistakes.
+    """
+    self._index = DeletionIndex(spellings, max_distance)
+    self._counts = counts or {}
+    self._cache = memo.Cache(cache_size)
+
+  def __len__(self):
+    return len(self._index)
+
+  def nearest(self, spelling, k=2):
+    """Find the valid spellings within edit distance k of a spelling.
+
+    Returns: A (new) list of (distance, spelling) pairs, nearest (and then
+      most attested) first.
+    """
+    key = spelling, k
+    try:
+      results = self._cache.results[key]
+    except KeyError:
+      self._cache.misses += 1
+      results = self._index.search(spelling, k)
+      results.sort(key=lambda (d, s): (d, -self._counts.get(s, 0), s))
+      # Cached as a tuple, so that callers can't change it.
+      results = tuple(results)
+      self._cache.put(key, results)
+    else:
+      self._cache.hits += 1
+    return list(results)
+
+  def suggest(self, spelling, k=2, limit=5):
+    """Suggest up to limit corrections for a spelling (nearest first).
+
+    A valid spelling is its own (only) suggestion.
+    """
+    results = self.nearest(spelling.strip(), k)
+    if results and results[0][0] == 0:
+      return [results[0][1]]
+    return [s for _, s in results[:limit]]
+
+def load_index(fname=None):
+  """Build a SpellingIndex of the inventory, ranked by attestations in fname.
+
+  fname is Baxter's CSV (by default, data/mc1.csv).
+  """
+  if fname is None:
+    fname = os.path.join(os.path.dirname(__file__), 'data/mc1.csv')
+  counts = collections.Counter(row.baxter for row in loader.load(fname))
+  spellings = list(mc.all_syllables())
+  # Include attested spellings outside the inventory (they're valid too).
+  spellings.extend(counts)
+  return SpellingIndex(spellings, counts)
+
+_DEFAULT_INDEX = []
+
+def default_index():
+  """Get the SpellingIndex of data/mc1.csv (built on first use)."""
+  if not _DEFAULT_INDEX:
+    _DEFAULT_INDEX.append(load_index())
+  return _DEFAULT_INDEX[0]
+
+def suggest(spelling, k=2, limit=5):
+  """Suggest corrections for a spelling from the default index."""
+  return default_index().suggest(spelling, k, limit)
+
+def main():
+  """Suggest corrections for syllables from the command line."""
+  parser = argparse.ArgumentParser(
+      description='Suggests corrections for syllables in Baxter\'s notation.')
+  parser.add_argument('syllables', nargs='+',
+                      help='Syllables to look up (\'-\' for one per line of stdin).')
+  parser.add_argument('-k', dest='k', type=int, default=2,
+                      help='Maximum edit distance of the suggestions.')
+  parser.add_argument('--limit', dest='limit', type=int, default=5,
+                      help='Maximum number of suggestions per syllable.')
+  parser.add_argument('-i', '--input_file', dest='input_file', type=str,
+                      help='Baxter\'s CSV to rank suggestions by.')
+  args = parser.parse_args()
+  index = load_index(args.input_file)
+  if args.syllables == ['-']:
+    syllables = (line.strip() for line in iter(sys.stdin.readline, ''))
+  else:
+    syllables = args.syllables
+  for syllable in syllables:
+    print '%s\t%s' % (syllable, ' '.join(
+        index.suggest(syllable, args.k, args.limit)))
+    sys.stdout.flush()
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Tests for fuzzy module."""
+
+import unittest
+
+from . import fuzzy
+from . import mc
+
+class DistanceTest(unittest.TestCase):
+  """Tests for the edit distance."""
+
+  def test_distance(self):
+    """Insertions, deletions, and substitutions each cost one."""
+    self.assertEqual(0, fuzzy.distance('tuwng', 'tuwng'))
+    self.assertEqual(1, fuzzy.distance('tuwng', 'tuwngX'))
+    self.assertEqual(1, fuzzy.distance('tuwngX', 'tuwng'))
+    self.assertEqual(1, fuzzy.distance('tuwng', 'duwng'))
+    self.assertEqual(2, fuzzy.distance('tuwng', 'utwng'))
+    self.assertEqual(5, fuzzy.distance('', 'tuwng'))
+
+class DeletionIndexTest(unittest.TestCase):
+  """Tests for the symmetric deletion index."""
+
+  def test_search_matches_brute_force(self):
+    """Searches find exactly the words within k, for k up to the maximum."""
+    words = list(mc.all_syllables())[:2000]
+    index = fuzzy.DeletionIndex(words)
+    self.assertEqual(2000, len(index))
+    for query in ('tsyhowng', 'tsyhjowngX', 'phjuwngH', 'qqq', 'kjw', ''):
+      for k in (0, 1, 2):
+        expected = sorted((fuzzy.distance(query, w), w) for w in words
+                          if fuzzy.distance(query, w) <= k)
+        self.assertEqual(expected, index.search(query, k))
+
+  def test_max_distance(self):
+    """Searches further than the index was built for are rejected."""
+    index = fuzzy.DeletionIndex(['tuwng'], max_distance=1)
+    self.assertFalse(index.add('tuwng'))
+    self.assertIn('tuwng', index)
+    with self.assertRaises(ValueError):
+      index.search('tuwng', 2)
+
+class SpellingIndexTest(unittest.TestCase):
+  """Tests for suggesting spellings."""
+
+  def test_suggest(self):
+    """Suggestions are ranked by distance, then by attestations."""
+    index = fuzzy.SpellingIndex(['tuwng', 'tuwngX', 'duwng', 'tsyhjowng'],
+                                counts={'duwng': 3, 'tuwng': 1})
+    self.assertEqual(['tuwng'], index.suggest('tuwng'))
+    self.assertEqual(['tuwng', 'tuwngX', 'duwng'], index.suggest('tuwngH'))
+    self.assertEqual(['tuwng'], index.suggest('tuwngH', limit=1))
+    self.assertEqual(['tsyhjowng'], index.suggest('tsyhowng'))
+    self.assertEqual([], index.suggest('qqq'))
+    # Repeated queries come from the cache, which callers can't change.
+    cache = index._cache  # pylint: disable=protected-access
+    hits = cache.hits
+    nearest = index.nearest('tuwngH')
+    nearest.append((0, 'tuwngH'))
+    nearest.sort()
+    self.assertEqual([(1, 'tuwng'), (1, 'tuwngX'), (2, 'duwng')],
+                     index.nearest('tuwngH'))
+    self.assertEqual(hits + 2, cache.hits)
+
+  def test_default_index(self):
+    """The default index covers the inventory."""
+    self.assertEqual(['tsyhjowngX'], fuzzy.suggest('tsyhjowngX'))
+    self.assertIn('tsyhjowngX', fuzzy.suggest('tsyhjowngx'))
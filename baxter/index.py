@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""In-memory indexes over Baxter's records.
+
+python -m baxter.index query --initial dzr --tone shang
+python -m baxter.index query --hanzi 行
+python -m baxter.index reverse zhong1
+"""
+
+import argparse
+import collections
+import os.path
+import sys
+
+from . import mc
+from . import mc2pinyin
+from . import steps
+
+# Fields that can be queried, and how to get them from a record.
+_FIELDS = collections.OrderedDict([
+    ('hanzi', lambda r: r['hanzi']),
+    ('baxter', lambda r: r['baxter'].baxter),
+    ('pinyin', lambda r: r['pinyin']),
+    ('initial', lambda r: r['baxter'].baxter_initial),
+    ('final', lambda r: r['baxter'].baxter_final),
+    ('tone', lambda r: r['baxter'].tone),
+    ('voiced', lambda r: r['baxter'].voiced),
+    ('sonorant', lambda r: r['baxter'].sonorant),
+    ('open', lambda r: r['baxter'].open),
+    ('predicted', lambda r: _predicted_pinyin(r['baxter']))])
+
+def _predicted_pinyin(syl):
+  """Get the expected Pinyin for a syllable, or None if it's rejected."""
+  try:
+    return steps.expected_pinyin(syl)
+  except (ValueError, IndexError):
+    return None
+
+class BaxterIndex(object):
+  """Indexes over Baxter's records, built once and queried many times.
+
+  Every field in _FIELDS has a posting list (a set of row numbers) for each of
+  its values. Queries on several fields intersect the posting lists, starting
+  with the smallest.
+  """
+
+  def __init__(self, records):
+    """Index records (as read by read_records)."""
+    self._records = list(records)
+    postings = dict((field, collections.defaultdict(set)) for field in _FIELDS)
+    for i, r in enumerate(self._records):
+      for field, get in _FIELDS.items():
+        postings[field][get(r)].add(i)
+    self._postings = {}
+    for field, index in postings.items():
+      self._postings[field] = dict(
+          (value, frozenset(rows)) for value, rows in index.items())
+
+  @classmethod
+  def load(cls, fname=None):
+    """Build the index from Baxter's CSV (by default, data/mc1.csv)."""
+    if fname is None:
+      fname = os.path.join(os.path.dirname(__file__), 'data/mc1.csv')
+    return cls(mc2pinyin.read_records(fname))
+
+  def __len__(self):
+    return len(self._records)
+
+  def values(self, field):
+    """Get the distinct values of a field."""
+    return self._postings[field].keys()
+
+  def rows(self, **criteria):
+    """Get the (sorted) row numbers matching all of the criteria.
+
+    e.g., rows(initial='dzr', tone='shang'). With no criteria, every row
+    matches.
+    """
+    for field in criteria:
+      if field not in self._postings:
+        raise ValueError('Unknown field %r; expected one of %s' % (
+            field, ', '.join(_FIELDS)))
+    if not criteria:
+      return range(len(self._records))
+    lists = sorted((self._postings[field].get(value, frozenset())
+                    for field, value in criteria.items()), key=len)
+    return sorted(lists[0].intersection(*lists[1:]))
+
+  def query(self, **criteria):
+    """Get the records matching all of the criteria, in their original order."""
+    return [self._records[i] for i in self.rows(**criteria)]
+
+  def by_hanzi(self, hanzi):
+    """Get all of the records (i.e., readings) for a character."""
+    return self.query(hanzi=hanzi)
+
+  def by_baxter(self, baxter):
+    """Get all of the records for a syllable in Baxter's notation."""
+    return self.query(baxter=baxter)
+
+class Candidate(collections.namedtuple(
+    'Candidate', ['baxter', 'predicted', 'attested', 'exceptions'])):
+  """A Middle Chinese syllable that may underlie a reading.
+
+  baxter: The syllable, in Baxter's notation.
+  predicted: The Pinyin the steps predict for it.
+  attested: Characters read with the syllable that have the queried Pinyin.
+  exceptions: (hanzi, Pinyin) pairs for characters read with the syllable
+    whose Pinyin doesn't match the prediction.
+  """
+  __slots__ = ()
+
+class ReverseIndex(object):
+  """Maps Pinyin back to candidate Middle Chinese syllables.
+
+  Candidates are every syllable in the inventory that the steps map to the
+  Pinyin, plus every syllable that the records attest with that Pinyin (even
+  if the steps predict something else).
+  """
+
+  def __init__(self, records=()):
+    """Index the whole inventory, plus records (as read by read_records)."""
+    predicted = {}
+    for (init, final, tone), msm in steps.compiled_msm_syllables().items():
+      predicted[mc.spell(init, final, tone)] = msm
+    readings = collections.defaultdict(list)
+    for r in records:
+      syl = r['baxter']
+      if syl.baxter not in predicted:
+        predicted[syl.baxter] = _predicted_pinyin(syl)
+      readings[syl.baxter].append((r['hanzi'], r['pinyin']))
+    spellings = collections.defaultdict(set)
+    for bax, msm in predicted.items():
+      spellings[msm].add(bax)
+    for bax, pairs in readings.items():
+      for _, py in pairs:
+        spellings[py].add(bax)
+    self._candidates = {}
+    for py, baxes in spellings.items():
+      if py is None:
+        continue
+      self._candidates[py] = [
+          Candidate(bax, predicted[bax],
+                    [hz for hz, actual in readings[bax] if actual == py],
+                    [(hz, actual) for hz, actual in readings[bax]
+                     if actual != predicted[bax]])
+          for bax in sorted(baxes)]
+
+  @classmethod
+  def load(cls, fname=None):
+    """Build the index from Baxter's CSV (by default, data/mc1.csv)."""
+    if fname is None:
+      fname = os.path.join(os.path.dirname(__file__), 'data/mc1.csv')
+    return cls(mc2pinyin.read_records(fname))
+
+  def lookup(self, pinyin):
+    """Get the Candidates for a reading in Pinyin with a tone number.
+
+    e.g., lookup('zhong1'). 'ü' may be written as 'v'. pinyin may be utf-8 or
+    unicode (e.g., from a decoded query string).
+    """
+    if isinstance(pinyin, unicode):
+      pinyin = pinyin.encode('utf-8')
+    return list(self._candidates.get(pinyin.replace('ü', 'v'), []))
+
+def _parse_bool(value):
+  """Parse a boolean command line argument."""
+  if value.lower() in ('true', 't', 'yes', 'y', '1'):
+    return True
+  if value.lower() in ('false', 'f', 'no', 'n', '0'):
+    return False
+  raise argparse.ArgumentTypeError('Expected a boolean; got %r' % value)
+
+def _query(args):
+  """Run the query subcommand."""
+  index = BaxterIndex.load(args.input_file)
+  criteria = dict((field, getattr(args, field)) for field in _FIELDS
+                  if getattr(args, field) is not None)
+  for r in index.query(**criteria):
+    print '%s,%s,%s' % (r['hanzi'], r['baxter'].baxter, r['pinyin'])
+
+def _reverse(args):
+  """Run the reverse subcommand."""
+  index = ReverseIndex.load(args.input_file)
+  for c in index.lookup(args.pinyin):
+    notes = ' '.join('%s:%s' % pair for pair in c.exceptions)
+    print '%s,%s,%s,%s' % (c.baxter, c.predicted, ''.join(c.attested), notes)
+
+def main():
+  """Answer queries over Baxter's data from the command line."""
+  dirname = os.path.dirname(__file__)
+  parser = argparse.ArgumentParser(
+      description='Queries Baxter\'s MC data through in-memory indexes.')
+  parser.add_argument('-i', '--input_file', dest='input_file', type=str,
+                      default=os.path.join(dirname, 'data/mc1.csv'),
+                      help='Baxter\'s CSV to index.')
+  subparsers = parser.add_subparsers()
+  query = subparsers.add_parser(
+      'query', help='List the records matching all of the given fields.')
+  for field in _FIELDS:
+    if field in ('voiced', 'sonorant', 'open'):
+      query.add_argument('--' + field, dest=field, type=_parse_bool)
+    else:
+      query.add_argument('--' + field, dest=field, type=str)
+  query.set_defaults(func=_query)
+  reverse = subparsers.add_parser(
+      'reverse', help=('List the MC syllables that could underlie a reading '
+                       '(as baxter,predicted,attested hanzi,exceptions).'))
+  reverse.add_argument('pinyin', type=str, help='e.g., zhong1')
+  reverse.set_defaults(func=_reverse)
+  args = parser.parse_args()
+  try:
+    args.func(args)
+  except ValueError as e:
+    sys.stderr.write('%s\n' % e)
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Tests for index module."""
+
+import unittest
+
+from . import index
+from . import test_util
+
+class BaxterIndexTest(unittest.TestCase):
+  """Tests queries against an index of mc1.csv."""
+
+  @classmethod
+  def setUpClass(cls):
+    with test_util.Quiet():
+      cls._index = index.BaxterIndex.load()
+
+  def test_by_hanzi(self):
+    """All readings of a character are found."""
+    self.assertEqual(
+        ['hang', 'hangH', 'haeng', 'haengH'],
+        [r['baxter'].baxter for r in self._index.by_hanzi('行')])
+
+  def test_compound_query(self):
+    """Compound queries match a linear scan."""
+    records = self._index.query()
+    expected = [r for r in records if r['baxter'].baxter_initial == 'dzr' and
+                r['baxter'].tone == 'shang' and r['baxter'].open]
+    self.assertTrue(expected)
+    self.assertEqual(
+        expected, self._index.query(initial='dzr', tone='shang', open=True))
+
+  def test_predicted(self):
+    """Records can be found by their predicted Pinyin."""
+    self.assertIn('行', [r['hanzi'] for r in self._index.query(
+        predicted='hang2')])
+
+  def test_no_matches(self):
+    """Unknown values match nothing, and unknown fields are errors."""
+    self.assertEqual([], self._index.query(initial='q'))
+    with self.assertRaises(ValueError):
+      self._index.query(color='red')
+
+class ReverseIndexTest(unittest.TestCase):
+  """Tests looking up MC syllables by Pinyin."""
+
+  @classmethod
+  def setUpClass(cls):
+    with test_util.Quiet():
+      cls._index = index.ReverseIndex.load()
+
+  def test_predicted_and_attested(self):
+    """Predicted candidates include the attested syllables."""
+    candidates = dict((c.baxter, c) for c in self._index.lookup('zhong1'))
+    self.assertEqual('zhong1', candidates['trjuwng'].predicted)
+    self.assertIn('中', candidates['trjuwng'].attested)
+    self.assertIn('trowng', candidates)
+
+  def test_mismatches(self):
+    """Attested readings the steps don't predict are still candidates."""
+    candidates = dict((c.baxter, c) for c in self._index.lookup('zhong1'))
+    self.assertEqual('zong2', candidates['dzowng'].predicted)
+    self.assertIn(('潨', 'zhong1'), candidates['dzowng'].exceptions)
+
+  def test_umlaut(self):
+    """'ü' may be written as 'v', in utf-8 or unicode."""
+    expected = self._index.lookup('lv4')
+    self.assertTrue(expected)
+    self.assertEqual(expected, self._index.lookup('lü4'))
+    self.assertEqual(expected, self._index.lookup(u'lü4'))
+    self.assertEqual(expected, self._index.lookup(u'lv4'))
+
+  def test_inventory_only(self):
+    """Without records, candidates come from the inventory alone."""
+    candidates = index.ReverseIndex().lookup('zhong1')
+    self.assertIn('trjuwng', [c.baxter for c in candidates])
+    self.assertEqual([], [c for c in candidates if c.attested])
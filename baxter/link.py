@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Links Baxter's records to the ytenx Guangyun small rhymes (小韻).
+
+python -m baxter.link -o /tmp/linked.jsonl
+
+mc1.csv's 廣韻 references are page numbers in a printed edition, which the
+ytenx records don't carry, so rows are joined on what both sides do have:
+the character (listed in the small rhyme) and the tone. Candidates are then
+narrowed to the small rhymes whose initial matches the Baxter initial. Both
+steps are hash lookups, so the join takes one pass over each side.
+
+Rows linked to exactly one small rhyme are cross-validated: the openness
+and division derived from Baxter's notation are compared with the ytenx
+呼 (open) and 等 (grade).
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os.path
+import sys
+
+from ytenx import extract_records
+
+from . import fuzzy
+from . import loader
+from . import steps
+
+# The Guangyun initials (as ytenx names them) for each Baxter initial.
+_GY_INITIALS = {
+    'p': ['幫'], 'ph': ['滂'], 'b': ['並'], 'm': ['明'],
+    't': ['端'], 'th': ['透'], 'd': ['定'], 'n': ['泥'],
+    'tr': ['知'], 'trh': ['徹'], 'dr': ['澄'], 'nr': ['孃'],
+    'ts': ['精'], 'tsh': ['清'], 'dz': ['從'], 's': ['心'], 'z': ['邪'],
+    'tsr': ['莊'], 'tsrh': ['初'], 'dzr': ['崇'], 'sr': ['生'], 'zr': ['俟'],
+    'tsy': ['章'], 'tsyh': ['昌'], 'dzy': ['常'], 'sy': ['書'], 'zy': ['船'],
+    'ny': ['日'], 'l': ['來'],
+    'k': ['見'], 'kh': ['溪'], 'g': ['羣'], 'ng': ['疑'],
+    'x': ['曉'], 'h': ['匣', '云'], "'": ['影'], 'y': ['以']}
+_GY_TONES = {'平聲': 'ping', '上聲': 'shang', '去聲': 'qu', '入聲': 'ru'}
+_GY_GRADES = {'一等': 1, '二等': 2, '三等': 3, '四等': 4}
+
+# How a row was linked.
+UNIQUE, AMBIGUOUS, UNMATCHED = 'unique', 'ambiguous', 'unmatched'
+
+class Link(collections.namedtuple('Link', ['row', 'status', 'rhymes'])):
+  """A Baxter row and the ytenx small rhymes it links to.
+
+  row: The loader.Row.
+  status: UNIQUE, AMBIGUOUS (several small rhymes match), or UNMATCHED.
+  rhymes: The matching ytenx records.
+  """
+  __slots__ = ()
+
+class YtenxIndex(object):
+  """Hash index of the ytenx small rhymes by (character, tone)."""
+
+  def __init__(self, records):
+    """Index records (as extracted by ytenx.extract_records)."""
+    self._rhymes = collections.defaultdict(list)
+    for r in records:
+      tone = _GY_TONES[r['tone'].encode('utf-8')]
+      for char in r['chars']:
+        self._rhymes[char.encode('utf-8'), tone].append(r)
+
+  def candidates(self, hanzi, tone):
+    """Get the small rhymes containing a character (as utf-8), in a tone."""
+    return self._rhymes.get((hanzi, tone), [])
+
+def link_rows(rows, ytenx_index):
+  """Link loader.Rows to the small rhymes in a YtenxIndex.
+
+  Yields: A Link for each row, in order.
+  """
+  for row in rows:
+    syl = row.syllable
+    initials = _GY_INITIALS[syl.baxter_initial]
+    rhymes = [r for r in ytenx_index.candidates(row.hanzi, syl.tone)
+              if r['initial'].encode('utf-8') in initials]
+    if not rhymes:
+      status = UNMATCHED
+    elif len(rhymes) == 1:
+      status = UNIQUE
+    else:
+      status = AMBIGUOUS
+    yield Link(row, status, rhymes)
+
+# A disagreement between Baxter's notation and the small rhyme it's linked to.
+Disagreement = collections.namedtuple(
+    'Disagreement', ['row', 'rhyme', 'field', 'baxter', 'ytenx'])
+
+class CrossValidation(object):
+  """Compares Baxter-derived features with uniquely linked small rhymes."""
+
+  def __init__(self):
+    self.statuses = collections.Counter()
+    self.open = collections.Counter()
+    # (Baxter division, ytenx grade) pairs.
+    self.divisions = collections.Counter()
+    self.disagreements = []
+
+  def add(self, link):
+    """Count a Link, comparing features if it's unique."""
+    self.statuses[link.status] += 1
+    if link.status != UNIQUE:
+      return
+    row, rhyme = link.row, link.rhymes[0]
+    syl = row.syllable
+    self.open[syl.open, rhyme['open']] += 1
+    if syl.open != rhyme['open']:
+      self.disagreements.append(
+          Disagreement(row, rhyme, 'open', syl.open, rhyme['open']))
+    try:
+      division = steps.syllable_division(syl)
+    except IndexError:
+      division = None
+    grade = _GY_GRADES[rhyme['grade'].encode('utf-8')]
+    self.divisions[division, grade] += 1
+    if division != grade:
+      self.disagreements.append(
+          Disagreement(row, rhyme, 'division', division, grade))
+
+  def report(self, out=None, max_disagreements=20):
+    """Write the link counts, agreement rates, and some disagreements."""
+    out = out or sys.stdout
+    total = sum(self.statuses.values())
+    for status in (UNIQUE, AMBIGUOUS, UNMATCHED):
+      print >>out, '%s: %d/%d' % (status, self.statuses[status], total)
+    linked = self.statuses[UNIQUE]
+    if not linked:
+      return
+    agree = sum(n for (b, y), n in self.open.items() if b == y)
+    print >>out, 'open agrees: %.2f%% (%d/%d)' % (
+        100.0 * agree / linked, agree, linked)
+    agree = sum(n for (b, y), n in self.divisions.items() if b == y)
+    print >>out, 'division agrees with grade: %.2f%% (%d/%d)' % (
+        100.0 * agree / linked, agree, linked)
+    print >>out, 'division x grade:'
+    for grade in range(1, 5):
+      print >>out, '  grade %d: %s' % (grade, ' '.join(
+          '%s:%d' % (division, self.divisions[division, grade])
+          for division in (1, 2, 3, 4, None)
+          if self.divisions[division, grade]))
+    for d in self.disagreements[:max_disagreements]:
+      print >>out, '%s %s (line %d) / %s #%d: %s %s vs %s' % (
+          d.row.hanzi, d.row.baxter, d.row.line, d.rhyme['hanzi'].encode(
+              'utf-8'), d.rhyme['number'], d.field, d.baxter, d.ytenx)
+
+def _linked_record(link):
+  """Convert a Link into a json-serializable dict."""
+  record = link.row._asdict()
+  record['link'] = link.status
+  record['ytenx'] = [r['id'] for r in link.rhymes]
+  return record
+
+def link_records(rows, ytenx_records, output=None):
+  """Link rows to ytenx records, writing JSON Lines to output (if given).
+
+  Returns: A CrossValidation of the links.
+  """
+  validation = CrossValidation()
+  for l in link_rows(rows, YtenxIndex(ytenx_records)):
+    validation.add(l)
+    if output is not None:
+      output.write(json.dumps(_linked_record(l)) + '\n')
+  return validation
+
+def main():
+  """Link Baxter's data to the ytenx records from the command line."""
+  dirname = os.path.dirname(__file__)
+  parser = argparse.ArgumentParser(
+      description=('Links Baxter\'s MC data to ytenx Guangyun records, and '
+                   'cross-validates them.'))
+  parser.add_argument('-i', '--input_file', dest='input_file', type=str,
+                      default=os.path.join(dirname, 'data/mc1.csv'),
+                      help='Baxter\'s CSV to read.')
+  parser.add_argument('--ytenx_file', dest='ytenx_file', type=str,
+                      help=('Records written by ytenx.extract_records (by '
+                            'default, they\'re extracted from the snapshot).'))
+  parser.add_argument('--jsonl', dest='jsonl', action='store_true',
+                      help='The ytenx file is JSON Lines.')
+  parser.add_argument('--gzip', dest='gzip', action='store_true',
+                      help='The ytenx file is gzipped.')
+  parser.add_argument('-o', '--output_file', dest='output_file', type=str,
+                      help='JSON Lines file to write the linked rows to.')
+  parser.add_argument('--disagreements', dest='disagreements', type=int,
+                      default=20, help='Number of disagreements to list.')
+  args = parser.parse_args()
+  if args.ytenx_file:
+    ytenx_records = extract_records.load_records(
+        args.ytenx_file, args.jsonl, args.gzip)
+  else:
+    ytenx_records = extract_records.iter_records(
+        os.path.join(os.path.dirname(dirname), 'ytenx/data_20170503'),
+        workers=multiprocessing.cpu_count())
+  rejects = loader.RejectReport(fuzzy.suggest, out=sys.stderr)
+  rows = loader.load(args.input_file, rejects=rejects)
+  if args.output_file:
+    with open(args.output_file, 'w') as output:
+      validation = link_records(rows, ytenx_records, output)
+  else:
+    validation = link_records(rows, ytenx_records)
+  validation.report(max_disagreements=args.disagreements)
+  if rejects:
+    rejects.write()
+
+if __name__ == '__main__':
+  main()
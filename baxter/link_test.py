@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Tests for link module."""
+
+import json
+import StringIO
+import unittest
+
+from . import link
+from . import loader
+
+_CSV = [
+    'hanzi,pinyin,Baxter,GSR,HYDZD,GY,len\r\n',
+    '東,dong1,tuwng,1175a,21284.030,024.01,6\r\n',
+    '凍,dong4,tuwngH,1175c,10341.020,344.01,6\r\n',
+    '凍,dong1,tuwng,1175c,10341.020,024.01,6\r\n',
+    '江,jiang1,kaewng,1172n,31653.010,047.01,6\r\n',
+    '行,xing2,haeng,0748a,10810.010,182.05,6\r\n']
+
+def _rhyme(rid, hanzi, initial, tone, grade, is_open, chars):
+  """Make a record like those ytenx.extract_records extracts."""
+  return {'id': rid, 'hanzi': hanzi, 'number': rid, 'initial': initial,
+          'tone': tone, 'grade': grade, 'open': is_open, 'chars': chars}
+
+_YTENX = [
+    _rhyme(1, u'東', u'端', u'平聲', u'一等', True, [u'東', u'凍']),
+    # A small rhyme with a different initial, which shouldn't match.
+    _rhyme(2, u'通', u'透', u'平聲', u'一等', True, [u'通', u'凍']),
+    _rhyme(3, u'江', u'見', u'平聲', u'一等', True, [u'江']),
+    # 行 is in two small rhymes with the same initial and tone.
+    _rhyme(4, u'行', u'匣', u'平聲', u'二等', True, [u'行']),
+    _rhyme(5, u'杭', u'匣', u'平聲', u'一等', True, [u'杭', u'行'])]
+
+class LinkTest(unittest.TestCase):
+  """Tests for linking Baxter's rows to ytenx records."""
+
+  def setUp(self):
+    self._rows = list(loader.parse_rows(_CSV))
+
+  def test_link_rows(self):
+    """Rows match on character, tone, and initial."""
+    links = list(link.link_rows(self._rows, link.YtenxIndex(_YTENX)))
+    self.assertEqual(
+        [link.UNIQUE, link.UNMATCHED, link.UNIQUE, link.UNIQUE,
+         link.AMBIGUOUS],
+        [l.status for l in links])
+    self.assertEqual([[1], [], [1], [3], [4, 5]],
+                     [[r['id'] for r in l.rhymes] for l in links])
+
+  def test_cross_validation(self):
+    """Features of uniquely linked rows are compared with the small rhyme."""
+    output = StringIO.StringIO()
+    validation = link.link_records(self._rows, _YTENX, output)
+    self.assertEqual({link.UNIQUE: 3, link.AMBIGUOUS: 1, link.UNMATCHED: 1},
+                     dict(validation.statuses))
+    # 江 is division 2, but the fake record says 一等.
+    self.assertEqual([('江', 'division', 2, 1)],
+                     [(d.row.hanzi, d.field, d.baxter, d.ytenx)
+                      for d in validation.disagreements])
+    self.assertEqual({(1, 1): 2, (2, 1): 1},
+                     dict(validation.divisions))
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    self.assertEqual(
+        {'line': 1, 'hanzi': u'東', 'pinyin': 'dong1', 'baxter': 'tuwng',
+         'gsr': '1175a', 'hydzd': '21284.030', 'guangyun': ['024.01'],
+         'guangyun_len': 6, 'link': 'unique', 'ytenx': [1]},
+        records[0])
+    self.assertEqual([4, 5], records[-1]['ytenx'])
+
+  def test_report(self):
+    """The report gives the counts, agreement rates, and disagreements."""
+    out = StringIO.StringIO()
+    link.link_records(self._rows, _YTENX).report(out)
+    report = out.getvalue()
+    self.assertIn('unique: 3/5', report)
+    self.assertIn('division agrees with grade: 66.67% (2/3)', report)
+    self.assertIn('江 kaewng (line 4) / 江 #3: division 2 vs 1', report)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""Validated loader for all seven columns of Baxter's CSV.
+
+Rows are parsed with the csv module (so quoted fields work) into typed Rows.
+Rows that don't validate are counted in a RejectReport instead of being
+written to stderr, and the syllables are only parsed once per spelling (see
+MiddleChineseSyllable.of).
+"""
+
+import collections
+import csv
+import itertools
+import sys
+
+import numpy as np
+
+from . import mc
+from . import steps
+
+# Column names of Baxter's CSV, in order.
+COLUMNS = ['hanzi', 'pinyin', 'baxter', 'gsr', 'hydzd', 'guangyun',
+           'guangyun_len']
+
+class Row(collections.namedtuple('Row', ['line'] + COLUMNS)):
+  """One row of Baxter's CSV.
+
+  line: The (0-based) line number the row starts on.
+  hanzi: The character.
+  pinyin: Its Mandarin reading, with 'ü' written as 'v'.
+  baxter: Its Middle Chinese reading in Baxter's notation.
+  gsr: The Grammata Serica Recensa number ('' if there is none).
+  hydzd: The 漢語大字典 reference ('' if there is none).
+  guangyun: The list of 廣韻 references (e.g., ['271.35', '274.44']).
+  guangyun_len: The number in the last column (the length of the 廣韻
+    field), or None if it's empty.
+  """
+  __slots__ = ()
+
+  @property
+  def syllable(self):
+    """The (shared) MiddleChineseSyllable for the Baxter reading."""
+    return mc.MiddleChineseSyllable.of(self.baxter)
+
+# The reason (before the ':') for rows whose syllable isn't valid (including
+# syllables that parse, but that the steps can't convert).
+_INVALID_SYLLABLE = 'invalid syllable'
+
+# A row that failed validation, with suggested corrections of its syllable
+# (if it was invalid, and the RejectReport makes suggestions).
+Reject = collections.namedtuple(
+    'Reject', ['line', 'reason', 'fields', 'suggestions'])
+
+class RejectReport(object):
+  """The rows rejected while loading, with counts by reason.
+
+  Every rejected row is counted, but only the first max_kept are kept (in
+  rejects), so that memory doesn't grow with the number of bad rows.
+  """
+
+  def __init__(self, suggest=None, out=None, max_kept=100):
+    """Collect rejected rows.
+
+    suggest (if given) maps an invalid syllable to a list of corrections
+    (e.g., fuzzy.suggest). If out is given, each rejected row is also written
+    to it as soon as it's rejected.
+    """
+    self.rejects = []
+    self.counts = collections.Counter()
+    self._suggest = suggest
+    self._out = out
+    self._max_kept = max_kept
+
+  def add(self, line, reason, fields):
+    """Record a rejected row (fields as split by the csv module)."""
+    suggestions = []
+    if self._suggest is not None and reason.startswith(_INVALID_SYLLABLE):
+      suggestions = self._suggest(fields[2].strip())
+    reject = Reject(line, reason, fields, suggestions)
+    self.counts[reason.split(':')[0]] += 1
+    if len(self.rejects) < self._max_kept:
+      self.rejects.append(reject)
+    if self._out is not None:
+      self._out.write(self._format(reject))
+
+  def __len__(self):
+    return sum(self.counts.values())
+
+  @staticmethod
+  def _format(r):
+    """Format a rejected row as a line."""
+    return 'Line %d: %s: %s%s\n' % (
+        r.line, r.reason, ','.join(r.fields),
+        ' (did you mean %s?)' % ', '.join(r.suggestions)
+        if r.suggestions else '')
+
+  def write(self, out=None):
+    """Write a summary, then each rejected row kept (to stderr by default).
+
+    Rows already written as they were rejected aren't written again.
+    """
+    out = out or sys.stderr
+    for reason, count in sorted(self.counts.items()):
+      print >>out, 'Rejected %d rows: %s' % (count, reason)
+    if self._out is not None:
+      return
+    for r in self.rejects:
+      out.write(self._format(r))
+    if len(self) > len(self.rejects):
+      print >>out, '(and %d more rejected rows)' % (len(self) - len(self.rejects))
+
+def lines(f, start=None, end=None):
+  """Yield the lines of f that start within the byte range [start, end)."""
+  if f is sys.stdin:
+    # Avoid file iteration's read-ahead, so that lines are yielded as soon as
+    # they arrive.
+    for line in iter(f.readline, ''):
+      yield line
+    return
+  if start is None and end is None:
+    for line in f:
+      yield line
+    return
+  f.seek(start or 0)
+  while end is None or f.tell() < end:
+    line = f.readline()
+    if not line:
+      break
+    yield line
+
+def _reject_reason(fields):
+  """Get the reason a row is rejected (or None if it isn't)."""
+  if len(fields) != len(COLUMNS):
+    return 'wrong number of fields: expected %d, got %d' % (
+        len(COLUMNS), len(fields))
+  hanzi, pinyin, baxter, _, _, _, length = fields
+  if not (hanzi.strip() and pinyin.strip() and baxter.strip()):
+    return 'missing required field'
+  try:
+    steps.compiled_msm_syllable(mc.MiddleChineseSyllable.of(baxter))
+  except (ValueError, IndexError) as e:
+    return '%s: %s' % (_INVALID_SYLLABLE, e)
+  try:
+    if length.strip():
+      int(length)
+  except ValueError:
+    return 'invalid number: %r' % length
+  return None
+
+def _converts(baxter):
+  """Whether the steps can convert a (valid) syllable."""
+  try:
+    steps.compiled_msm_syllable(mc.MiddleChineseSyllable.of(baxter))
+  except (ValueError, IndexError):
+    return False
+  return True
+
+def _split_rows(lines_, first_line):
+  """Yield (line number, fields) for each row, skipping the header."""
+  line = first_line
+  reader = csv.reader(lines_)
+  for fields in reader:
+    start, line = line, first_line + reader.line_num
+    if start and fields:
+      yield start, fields
+
+def parse_rows(lines_, first_line=0, rejects=None):
+  """Parse lines of Baxter's CSV into Rows.
+
+  first_line is the number of lines before the first of lines_ (line 0, the
+  header, is skipped). Rejected rows are added to rejects (a RejectReport),
+  if given.
+  """
+  # The syllables are split in bulk, in step with the rows (so that rows are
+  # still yielded as soon as they're read).
+  rows, spellings = itertools.tee(_split_rows(lines_, first_line))
+  splits = mc.split_many(
+      (fields[2] if len(fields) == len(COLUMNS) else ''
+       for _, fields in spellings), strict=False)
+  # Syllables in the steps' precomputed table are known to convert.
+  convertible = steps.compiled_msm_syllables()
+  for (start, fields), split in itertools.izip(rows, splits):
+    # This is the hot loop, so the common case is checked inline, and
+    # _reject_reason only works out what went wrong.
+    if (len(fields) == len(COLUMNS) and not isinstance(split, ValueError) and
+        (split in convertible or _converts(fields[2]))):
+      hanzi, pinyin, baxter, gsr, hydzd, guangyun, length = fields
+      if hanzi.strip() and pinyin.strip():
+        try:
+          length = int(length) if length.strip() else None
+        except ValueError:
+          pass
+        else:
+          # tuple.__new__ skips Row.__new__'s argument handling.
+          yield tuple.__new__(Row, (start, hanzi, pinyin.replace('ü', 'v'),
+                                    baxter, gsr, hydzd, guangyun.split(),
+                                    length))
+          continue
+    if rejects is not None:
+      rejects.add(start, _reject_reason(fields), fields)
+
+def load(fname, start=None, end=None, first_line=0, rejects=None):
+  """Load the Rows of Baxter's CSV ('-' for stdin).
+
+  If start and end are given, only the lines starting within that byte range
+  are read (and first_line should be the number of lines before start).
+  Rejected rows are added to rejects (a RejectReport), if given.
+  """
+  if fname == '-':
+    for row in parse_rows(lines(sys.stdin), first_line, rejects):
+      yield row
+    return
+  with open(fname, 'rb') as f:
+    for row in parse_rows(lines(f, start, end), first_line, rejects):
+      yield row
+
+def load_columns(fname, rejects=None):
+  """Load Baxter's CSV as columns, rather than rows.
+
+  Returns: A dict from column name ('line' and COLUMNS) to a list of values,
+    except for line and guangyun_len, which are numpy arrays (with -1 for an
+    empty guangyun_len).
+  """
+  rows = list(load(fname, rejects=rejects))
+  columns = dict((name, [getattr(row, name) for row in rows])
+                 for name in COLUMNS)
+  columns['line'] = np.array([row.line for row in rows], dtype=np.int64)
+  columns['guangyun_len'] = np.array(
+      [-1 if n is None else n for n in columns['guangyun_len']],
+      dtype=np.int32)
+  return columns
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Tests for loader module."""
+
+import os
+import os.path
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+from . import loader
+from . import mc
+from . import steps
+
+_MC1 = os.path.join(os.path.dirname(__file__), 'data/mc1.csv')
+
+_CSV = '\r\n'.join([
+    'hanzi,pinyin,Baxter,GSR,HYDZD,GY,len',
+    '挨,ai1,\'eajX,0938c,31888.050,271.35 274.44,13',
+    '"綠,",lü4,ljowk,1208a,"53395,010",470.06,6',
+    '',
+    '爆,,p,,32245.110,416.03,6',
+    '鹼,jian3,qqq,,74611.210,,0',
+    '行,xing2,haeng,0748a,10810.010,182.05,x',
+    '多,duo1,ta,0003a,,',
+    '一,yi1,\'jit,0394a,00001.010,,0'])
+
+class LoaderTest(unittest.TestCase):
+  """Tests for loading Baxter's CSV."""
+
+  def setUp(self):
+    self._tmpdir = tempfile.mkdtemp()
+    self._fname = os.path.join(self._tmpdir, 'mc.csv')
+    with open(self._fname, 'wb') as f:
+      f.write(_CSV)
+
+  def tearDown(self):
+    shutil.rmtree(self._tmpdir)
+
+  def test_rows(self):
+    """Every column is parsed, including quoted fields."""
+    rejects = loader.RejectReport()
+    rows = list(loader.load(self._fname, rejects=rejects))
+    self.assertEqual(
+        loader.Row(1, '挨', 'ai1', "'eajX", '0938c', '31888.050',
+                   ['271.35', '274.44'], 13), rows[0])
+    self.assertEqual(
+        loader.Row(2, '綠,', 'lv4', 'ljowk', '1208a', '53395,010',
+                   ['470.06'], 6), rows[1])
+    self.assertEqual([1, 2, 8], [row.line for row in rows])
+    self.assertIs(mc.MiddleChineseSyllable.of('ljowk'), rows[1].syllable)
+
+  def test_rejects(self):
+    """Invalid rows are reported, with their line numbers and reasons."""
+    rejects = loader.RejectReport()
+    list(loader.load(self._fname, rejects=rejects))
+    self.assertEqual([4, 5, 6, 7], [r.line for r in rejects.rejects])
+    self.assertEqual('missing required field', rejects.rejects[0].reason)
+    self.assertTrue(rejects.rejects[1].reason.startswith('invalid syllable'))
+    self.assertEqual("invalid number: 'x'", rejects.rejects[2].reason)
+    self.assertEqual('wrong number of fields: expected 7, got 6',
+                     rejects.rejects[3].reason)
+    self.assertEqual(['多', 'duo1', 'ta', '0003a', '', ''],
+                     rejects.rejects[3].fields)
+    self.assertEqual(1, rejects.counts['invalid syllable'])
+    self.assertEqual([], rejects.rejects[1].suggestions)
+
+  def test_suggestions(self):
+    """Invalid syllables get suggested corrections, if asked for."""
+    with open(self._fname, 'wb') as f:
+      f.write('\r\n'.join([
+          'hanzi,pinyin,Baxter,GSR,HYDZD,GY,len',
+          '東,dong1,quwng,1175a,21284.030,024.01,6',
+          '東,dong1,,1175a,21284.030,024.01,6']))
+    rejects = loader.RejectReport(lambda baxter: [baxter + '?'])
+    self.assertEqual([], list(loader.load(self._fname, rejects=rejects)))
+    self.assertEqual(
+        ['invalid syllable: Syllable quwng does not start with a valid initial',
+         'missing required field'],
+        [r.reason for r in rejects.rejects])
+    self.assertEqual([['quwng?'], []],
+                     [r.suggestions for r in rejects.rejects])
+    out = StringIO.StringIO()
+    rejects.write(out)
+    self.assertIn(
+        'Line 1: invalid syllable: Syllable quwng does not start with a valid '
+        'initial: 東,dong1,quwng,1175a,21284.030,024.01,6 '
+        '(did you mean quwng??)',
+        out.getvalue().splitlines())
+
+  def test_bounded(self):
+    """Every reject is counted, but only some are kept."""
+    out = StringIO.StringIO()
+    rejects = loader.RejectReport(max_kept=2)
+    list(loader.load(self._fname, rejects=rejects))
+    self.assertEqual(4, len(rejects))
+    self.assertEqual([4, 5], [r.line for r in rejects.rejects])
+    rejects.write(out)
+    self.assertEqual('(and 2 more rejected rows)',
+                     out.getvalue().splitlines()[-1])
+
+  def test_written_as_rejected(self):
+    """Rejects can be written as they happen (and aren't written again)."""
+    out = StringIO.StringIO()
+    rejects = loader.RejectReport(out=out)
+    rows = loader.load(self._fname, rejects=rejects)
+    for _ in range(3):
+      next(rows)
+    # The rejects were written before reading finished.
+    self.assertEqual(4, len(out.getvalue().splitlines()))
+    list(rows)
+    rejects.write(out)
+    lines = out.getvalue().splitlines()
+    self.assertEqual(4, len([line for line in lines if line.startswith('Line')]))
+    self.assertIn('Rejected 1 rows: invalid syllable', lines)
+
+  def test_unattested_finals(self):
+    """Finals that aren't attested in mc1.csv still load (and convert)."""
+    with open(self._fname, 'wb') as f:
+      f.write('\r\n'.join([
+          'hanzi,pinyin,Baxter,GSR,HYDZD,GY,len',
+          '京,jing1,kjing,0755a,10296.010,183.03,6']))
+    rejects = loader.RejectReport(lambda baxter: [baxter + '?'])
+    rows = list(loader.load(self._fname, rejects=rejects))
+    self.assertEqual(['kjing'], [row.baxter for row in rows])
+    self.assertEqual(0, len(rejects))
+    self.assertEqual('jing1', steps.expected_pinyin(rows[0].syllable))
+
+  def test_unconvertible(self):
+    """Syllables that parse, but that the steps reject, are invalid too."""
+    with open(self._fname, 'wb') as f:
+      f.write('\r\n'.join([
+          'hanzi,pinyin,Baxter,GSR,HYDZD,GY,len',
+          '東,dong1,tuwnk,,,,']))
+    rejects = loader.RejectReport(lambda baxter: [baxter + '?'])
+    self.assertEqual([], list(loader.load(self._fname, rejects=rejects)))
+    self.assertEqual(
+        ['invalid syllable: Unexpected final: uwnng (from tuwnk)'],
+        [r.reason for r in rejects.rejects])
+    self.assertEqual([['tuwnk?']], [r.suggestions for r in rejects.rejects])
+
+  def test_columns(self):
+    """Rows can be loaded as columns."""
+    columns = loader.load_columns(self._fname)
+    self.assertEqual(['挨', '綠,', '一'], columns['hanzi'])
+    self.assertEqual([['271.35', '274.44'], ['470.06'], []],
+                     columns['guangyun'])
+    self.assertEqual([13, 6, 0], list(columns['guangyun_len']))
+    self.assertEqual([1, 2, 8], list(columns['line']))
+
+  def test_mc1(self):
+    """All of mc1.csv loads, except the rows missing readings."""
+    rejects = loader.RejectReport()
+    rows = list(loader.load(_MC1, rejects=rejects))
+    self.assertEqual(9249, len(rows))
+    self.assertEqual({'missing required field': 12}, dict(rejects.counts))
+    for row in rows:
+      if row.guangyun_len is not None:
+        self.assertEqual(len(' '.join(row.guangyun)), row.guangyun_len)
@@ -2,6 +2,8 @@
 
 import re
 
+from . import memo
+
 _BAXTER_INITIALS = sorted([
     'p', 'ph', 'b', 'm',
     't', 'th', 'd', 'n',
@@ -15,41 +17,196 @@ _BAXTER_INITIALS = sorted([
 _BAXTER_VOICED_OBSTRUENTS = [
     'b', 'd', 'g', 'h', 'dz', 'z', 'dr', 'dzr', 'zr', 'dzy', 'zy']
 _BAXTER_SONORANTS = ['m', 'n', 'ng', 'y', 'nr', 'l', 'ny']
-_BAXTER_FINALS = [] # TODO
+# Finals attested in data/mc1.csv.
+_BAXTER_FINALS = [
+    'a', 'ae', 'aej', 'aek', 'aem', 'aen', 'aeng', 'aep', 'aet', 'aew', 'aewk',
+    'aewng', 'aj', 'ak', 'am', 'an', 'ang', 'ap', 'at', 'aw', 'e', 'ea', 'eaj',
+    'eak', 'eam', 'ean', 'eang', 'eap', 'eat', 'ej', 'ek', 'em', 'en', 'eng',
+    'ep', 'et', 'ew', 'i', 'ij', 'ik', 'im', 'in', 'ing', 'ip', 'it', 'j+j',
+    'j+n', 'j+t', 'ja', 'jae', 'jaek', 'jaem', 'jaeng', 'jaep', 'jak', 'jang',
+    'je', 'jej', 'jek', 'jem', 'jen', 'jeng', 'jep', 'jet', 'jew', 'jie',
+    'jiej', 'jiek', 'jiem', 'jien', 'jieng', 'jiep', 'jiet', 'jiew', 'jij',
+    'jim', 'jin', 'jip', 'jit', 'jiw', 'jo', 'joj', 'jom', 'jon', 'jop', 'jot',
+    'jowk', 'jowng', 'ju', 'jun', 'jut', 'juw', 'juwk', 'juwng', 'jw+j',
+    'jwaeng', 'jwak', 'jwang', 'jwe', 'jwej', 'jwen', 'jwet', 'jwie', 'jwiek',
+    'jwien', 'jwieng', 'jwiet', 'jwij', 'jwin', 'jwit', 'jwoj', 'jwon', 'jwot',
+    'o', 'oj', 'ok', 'om', 'on', 'ong', 'op', 'ot', 'owk', 'owng', 'u', 'uw',
+    'uwk', 'uwng', 'wa', 'wae', 'waej', 'waek', 'waen', 'waeng', 'waet', 'waj',
+    'wak', 'wan', 'wang', 'wat', 'we', 'wea', 'weaj', 'weak', 'wean', 'weang',
+    'weat', 'wej', 'wek', 'wen', 'weng', 'wet', 'wij', 'wik', 'win', 'wit',
+    'wj+j', 'woj', 'wok', 'won', 'wong', 'wot']
+_TONE_SUFFIXES = {'ping': '', 'shang': 'X', 'qu': 'H', 'ru': ''}
+
+# Matches the longest initial (since _BAXTER_INITIALS is sorted by length),
+# then the final, then the tone suffix (if any).
+_SYLLABLE_REGEX = re.compile(r'(%s)(.*?)([XH]?)$' % '|'.join(
+    re.escape(init) for init in _BAXTER_INITIALS))
+_SUFFIX_TONES = {'X': 'shang', 'H': 'qu'}
+_CLOSED_FINAL_REGEX = re.compile(r'j?w|jo[mp]$|ju[nt]$')
 
 def _split_baxter(baxter):
   baxter = baxter.strip()
-  tone = 'ping'
-  if baxter[-1] == 'X':
-    baxter = baxter[:-1]
-    tone = 'shang'
-  elif baxter[-1] == 'H':
-    baxter = baxter[:-1]
-    tone = 'qu'
-  elif baxter[-1] in ['p', 't', 'k']:
+  m = _SYLLABLE_REGEX.match(baxter)
+  if not m:
+    if baxter[-1:] in ('X', 'H'):
+      baxter = baxter[:-1]
+    raise ValueError(
+        'Syllable %s does not start with a valid initial' % baxter)
+  init, final, suffix = m.groups()
+  if suffix:
+    tone = _SUFFIX_TONES[suffix]
+  elif baxter[-1] in ('p', 't', 'k'):
     tone = 'ru'
+  else:
+    tone = 'ping'
+  return init, final, tone
+
+def split_many(baxters, strict=True):
+  """Split each syllable into (initial, final, tone).
+
+  Repeated spellings are only parsed once (they share the syllables of
+  MiddleChineseSyllable.of). An invalid syllable raises ValueError, unless
+  strict is False, in which case the ValueError is yielded in its place.
+  """
+  # pylint: disable=protected-access
+  syllables = _SHARED_SYLLABLES.results
+  for baxter in baxters:
+    # Hits are looked up inline, since most spellings are repeats.
+    syl = syllables.get(baxter)
+    if syl is None:
+      try:
+        syl = _shared_syllable(baxter)
+      except ValueError as e:
+        if strict:
+          raise
+        yield e
+        continue
+    yield syl._bax_init, syl._bax_final, syl._tone
+
+def all_syllables():
+  """Generate every syllable in the inventory, in Baxter's notation.
+
+  This is every combination of initial, final, and tone, except that finals
+  ending in a stop only occur in the ru tone (and others never do).
+  """
   for init in _BAXTER_INITIALS:
-    if baxter.startswith(init):
-      final = baxter[len(init):]
-      #if final not in _BAXTER_FINALS:
-      #  raise ValueError('Invalid final: %s' % final)
-      return init, final, tone
-  raise ValueError('Syllable %s does not start with a valid initial' % baxter)
+    for final in _BAXTER_FINALS:
+      if final[-1] in ('p', 't', 'k'):
+        tones = ['ru']
+      else:
+        tones = ['ping', 'shang', 'qu']
+      for tone in tones:
+        yield spell(init, final, tone)
+
+def spell(initial, final, tone):
+  """Spell a syllable in Baxter's notation from its parts."""
+  return initial + final + _TONE_SUFFIXES[tone]
+
+def initials():
+  """Get all of the initials in Baxter's notation (longest first)."""
+  return list(_BAXTER_INITIALS)
+
+def finals():
+  """Get all of the finals in Baxter's notation."""
+  return list(_BAXTER_FINALS)
+
+def is_sonorant(initial):
+  """Is the initial (in Baxter's notation) a sonorant?"""
+  return initial in _BAXTER_SONORANTS
+
+def is_voiced(initial):
+  """Is the initial (in Baxter's notation) voiced?"""
+  return initial in _BAXTER_SONORANTS or initial in _BAXTER_VOICED_OBSTRUENTS
+
+# The bounded cache behind MiddleChineseSyllable.of, by spelling.
+_SHARED_SYLLABLES = memo.Cache(1 << 16)
+
+def set_cache_size(maxsize):
+  """Bound the number of syllables shared by MiddleChineseSyllable.of.
+
+  Zero turns off sharing. Shrinking the cache evicts syllables as needed.
+  """
+  _SHARED_SYLLABLES.resize(maxsize)
+
+def clear_cache():
+  """Evict all of the syllables shared by MiddleChineseSyllable.of."""
+  _SHARED_SYLLABLES.clear()
+
+def _shared_syllable(baxter):
+  """Get the shared syllable for baxter, creating it if needed.
+
+  (Also used when unpickling.)
+  """
+  try:
+    return _SHARED_SYLLABLES.results[baxter]
+  except KeyError:
+    pass
+  syl = MiddleChineseSyllable(baxter)
+  _SHARED_SYLLABLES.put(baxter, syl)
+  return syl
 
 class MiddleChineseSyllable(object):
-  """A syllable in Middle Chinese."""
+  """A syllable in Middle Chinese.
+
+  Syllables are immutable and compare equal when they have the same initial,
+  final, and tone.
+  """
+
+  # pylint can't see the slots being set in __init__.
+  # pylint: disable=no-member
+
+  __slots__ = ('_bax', '_bax_init', '_bax_final', '_tone', '_open',
+               '_sonorant', '_voiced')
 
   def __init__(self, baxter):
-    """Create a Middle Chinese syllable from Baxter's notation."""
-    self._bax = baxter
-    self._bax_init, self._bax_final, self._tone = _split_baxter(baxter)
-    self._open = True
-    if (self._bax_final.startswith('w') or self._bax_final.startswith('jw') or
-        re.match(r'^(j?w|jo[mp]$|ju[nt]$)', self._bax_final)):
-      self._open = False
-    self._sonorant = self._bax_init in _BAXTER_SONORANTS
-    self._voiced = (self._sonorant or
-                    (self._bax_init in _BAXTER_VOICED_OBSTRUENTS))
+    """Create a Middle Chinese syllable from Baxter's notation.
+
+    MiddleChineseSyllable.of should usually be preferred, since it shares one
+    instance per spelling.
+    """
+    # Set through object.__setattr__, since __setattr__ forbids assignment.
+    init, final, tone = _split_baxter(baxter)
+    sonorant = init in _BAXTER_SONORANTS
+    setattr_ = object.__setattr__
+    setattr_(self, '_bax', baxter)
+    setattr_(self, '_bax_init', init)
+    setattr_(self, '_bax_final', final)
+    setattr_(self, '_tone', tone)
+    setattr_(self, '_open', not _CLOSED_FINAL_REGEX.match(final))
+    setattr_(self, '_sonorant', sonorant)
+    setattr_(self, '_voiced', sonorant or init in _BAXTER_VOICED_OBSTRUENTS)
+
+  @staticmethod
+  def of(baxter):  # pylint: disable=invalid-name
+    """Get the (shared) syllable for a spelling in Baxter's notation."""
+    return _shared_syllable(baxter)
+
+  def __setattr__(self, name, value):
+    raise AttributeError('MiddleChineseSyllable is immutable')
+
+  def __delattr__(self, name):
+    raise AttributeError('MiddleChineseSyllable is immutable')
+
+  def __eq__(self, other):
+    if not isinstance(other, MiddleChineseSyllable):
+      return NotImplemented
+    return (self._bax_init == other.baxter_initial and
+            self._bax_final == other.baxter_final and self._tone == other.tone)
+
+  def __ne__(self, other):
+    eq = self.__eq__(other)
+    if eq is NotImplemented:
+      return eq
+    return not eq
+
+  def __hash__(self):
+    return hash((self._bax_init, self._bax_final, self._tone))
+
+  def __reduce__(self):
+    return (_shared_syllable, (self._bax,))
+
+  def __repr__(self):
+    return 'MiddleChineseSyllable(%r)' % self._bax
 
   @property
   def baxter_initial(self):
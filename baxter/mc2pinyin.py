@@ -2,70 +2,191 @@
 """Converts Baxter's notation to predicted Pinyin.
 
 python -m baxter.mc2pinyin -o /tmp/mismatches.csv
+
+Or, to convert every record of a CSV read from stdin and write it to stdout:
+
+exporter | python -m baxter.mc2pinyin -i - --stream | loader
 """
 
 import argparse
+import collections
+import errno
+import multiprocessing
 import os.path
 import sys
 
+from . import fuzzy
+from . import loader
 from . import mc
 from . import steps
 
-def read_records(fname):
-  """Read records from Baxter's 7-column CSV."""
+def read_records(fname, start=None, end=None, first_line=0, rejects=None):
+  """Read records from Baxter's 7-column CSV ('-' for stdin).
+
+  If start and end are given, only the lines starting within that byte range
+  are read (and first_line should be the number of lines before start).
+  Rejected rows are added to rejects (a loader.RejectReport); if it isn't
+  given, they're written to stderr as they're rejected (with suggested
+  corrections for invalid syllables), and counted once reading is done.
+  """
+  report = (loader.RejectReport(fuzzy.suggest, out=sys.stderr)
+            if rejects is None else rejects)
+  of = mc.MiddleChineseSyllable.of
+  for row in loader.load(fname, start, end, first_line, report):
+    # Unpacking is quicker than the Row's attributes.
+    _, hanzi, pinyin, baxter, gsr, hydzd, guangyun, _ = row
+    yield {'hanzi': hanzi, 'pinyin': pinyin, 'baxter': of(baxter), 'gsr': gsr,
+           'hydzd': hydzd, 'guangyun': ' '.join(guangyun)}
+  if rejects is None and report:
+    report.write(sys.stderr)
+
+def summarize(msg, num, denom, out=None):
+  """Summarize a ratio (to stdout, by default, looked up when called)."""
+  out = out or sys.stdout
+  if not denom:
+    # E.g., every row was rejected.
+    print >>out, '%s: - (%d/%d)' % (msg, num, denom)
+    return
+  print >>out, '%s: %.2f (%d/%d)' % (msg, 100.0*float(num)/denom, num, denom)
+
+def _summarize_counts(counts, out=None):
+  """Summarize the counts gathered by compare."""
+  summarize('Pinyin matches', counts['pinyin'], counts['total'], out)
+  summarize('Tone matches #1', counts['tone1'], counts['total'], out)
+  summarize('Tone matches #2', counts['tone2'], counts['total'], out)
+
+def compare(record, counts):
+  """Compare a record's Pinyin to the expected Pinyin, updating the counts.
+
+  A syllable that the steps reject gets an empty expected_pinyin (as in
+  batch.convert_batch), so it's a mismatch rather than an error.
+
+  Returns: (expected_pinyin, expected_tone)
+  """
+  py, syl = record['pinyin'], record['baxter']
+  try:
+    expected_pinyin = steps.expected_pinyin(syl)
+  except (ValueError, IndexError):
+    # The steps raise IndexError for an empty final.
+    expected_pinyin = ''
+  tone = py[-1]
+  if tone not in '1234':
+    tone = '?'
+  expected_tone1 = expected_pinyin[-1:]
+  expected_tone2 = steps.expected_msm_tone(syl)
+  if py == expected_pinyin:
+    counts['pinyin'] += 1
+  if expected_tone1 == tone:
+    counts['tone1'] += 1
+  if (expected_tone2 == tone or
+      (expected_tone2 == '?' and tone == '4')):
+    counts['tone2'] += 1
+  counts['total'] += 1
+  return expected_pinyin, expected_tone2
+
+def _row(record, expected_pinyin, expected_tone):
+  """Format a record and its expected Pinyin as a CSV row (sans newline)."""
+  return '%s,%s,%s,%s,%s' % (record['hanzi'], record['baxter'].baxter,
+                             record['pinyin'], expected_pinyin, expected_tone)
+
+def _count_lines(f, start, end):
+  """Count the newlines within the byte range [start, end) of f."""
+  f.seek(start)
+  n, remaining = 0, end - start
+  while remaining > 0:
+    block = f.read(min(remaining, 1 << 20))
+    if not block:
+      break
+    n += block.count('\n')
+    remaining -= len(block)
+  return n
+
+def shard(fname, num_shards):
+  """Split a file into byte ranges that start and end on line boundaries.
+
+  Returns: A list of (start, end, first_line) tuples, where first_line is the
+    number of lines before start.
+  """
+  size = os.path.getsize(fname)
+  shards = []
   with open(fname) as f:
-    for i, line in enumerate(f):
-      # Skip header
-      if not i:
-        continue
-      line = line.strip()
-      if not line:
-        continue
-      r = line.split(',')
-      if len(r) != 7:
-        raise ValueError('Expected 7 fields, got %d on line %d: %s' % (
-            len(r), i, line))
-      if not (r[0].strip() and r[1].strip() and r[2].strip()):
-        sys.stderr.write(
-            'Missing required field in line %d; skipping: %s\n' % (i, line))
-        continue
-      try:
-        # TODO: Put the other fields somewhere.
-        yield {'hanzi': r[0], 'pinyin': r[1].replace('ü', 'v'),
-               'baxter': mc.MiddleChineseSyllable(r[2])}
-      except ValueError as e:
-        sys.stderr.write('%s\n' % e)
+    start, first_line = 0, 0
+    for k in range(1, num_shards + 1):
+      end = size * k // num_shards
+      if 0 < end < size:
+        # Move the boundary to the start of the next line.
+        f.seek(end - 1)
+        f.readline()
+        end = f.tell()
+      if end <= start:
         continue
+      shards.append((start, end, first_line))
+      first_line += _count_lines(f, start, end)
+      start = end
+  return shards
 
-def summarize(msg, num, denom):
-  """Summarize a ratio."""
-  print '%s: %.2f (%d/%d)' % (msg, 100.0*float(num)/denom, num, denom)
+def _compare_shard(args):
+  """Compare all of the records in one shard (run in a worker process)."""
+  input_file, start, end, first_line = args
+  counts = collections.Counter()
+  mismatches = []
+  for r in read_records(input_file, start, end, first_line):
+    expected_pinyin, expected_tone = compare(r, counts)
+    if r['pinyin'] != expected_pinyin:
+      mismatches.append(_row(r, expected_pinyin, expected_tone) + '\n')
+  return counts, mismatches
 
-def pipeline(input_file, output_file):
-  """Read the MC database and try to reconstruct MSM pronunciations."""
-  tone_matches1, tone_matches2, py_matches, total = 0, 0, 0, 0
+# Each worker gets several shards, so that uneven shards balance out.
+_SHARDS_PER_WORKER = 4
+
+def pipeline(input_file, output_file, workers=1):
+  """Read the MC database and try to reconstruct MSM pronunciations.
+
+  With more than one worker, the input is sharded by byte range and the shards
+  are compared in a process pool. The output is the same either way.
+  """
+  counts = collections.Counter()
   with open(output_file, 'w') as mismatches:
-    for r in read_records(input_file):
-      hz, py, syl = r['hanzi'], r['pinyin'], r['baxter']
-      expected_pinyin = steps.expected_pinyin(syl)
-      tone = py[-1]
-      if tone not in '1234':
-        tone = '?'
-      expected_tone1 = expected_pinyin[-1]
-      expected_tone2 = steps.expected_msm_tone(syl)
-      if py == expected_pinyin:
-        py_matches += 1
-      else:
-        mismatches.write('%s,%s,%s,%s,%s\n' % (hz, syl.baxter, py, expected_pinyin, expected_tone2))
-      if expected_tone1 == tone:
-        tone_matches1 += 1
-      if (expected_tone2 == tone or
-          (expected_tone2 == '?' and tone == '4')):
-        tone_matches2 += 1
-      total += 1
-  summarize('Pinyin matches', py_matches, total)
-  summarize('Tone matches #1', tone_matches1, total)
-  summarize('Tone matches #2', tone_matches2, total)
+    if workers > 1:
+      args = [(input_file,) + s
+              for s in shard(input_file, workers * _SHARDS_PER_WORKER)]
+      pool = multiprocessing.Pool(workers)
+      try:
+        # imap yields in shard order, so mismatches come out in input order.
+        for shard_counts, shard_mismatches in pool.imap(_compare_shard, args):
+          counts.update(shard_counts)
+          mismatches.writelines(shard_mismatches)
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      for r in read_records(input_file):
+        expected_pinyin, expected_tone = compare(r, counts)
+        if r['pinyin'] != expected_pinyin:
+          mismatches.write(_row(r, expected_pinyin, expected_tone) + '\n')
+  _summarize_counts(counts)
+
+def stream(input_file, output, batch_size=1000):
+  """Convert every record, writing the results to output as they're read.
+
+  Rows are written (and output is flushed) in batches of batch_size, so that
+  memory use doesn't grow with the input. The summary goes to stderr.
+  """
+  counts = collections.Counter()
+  output.write('hanzi,baxter,pinyin,expected_pinyin,expected_tone,match\n')
+  batch = []
+  for r in read_records(input_file):
+    expected_pinyin, expected_tone = compare(r, counts)
+    batch.append('%s,%d\n' % (_row(r, expected_pinyin, expected_tone),
+                              r['pinyin'] == expected_pinyin))
+    if len(batch) >= batch_size:
+      output.writelines(batch)
+      output.flush()
+      batch = []
+  output.writelines(batch)
+  output.flush()
+  if counts['total']:
+    _summarize_counts(counts, sys.stderr)
 
 def main():
   """Run full pipeline."""
@@ -73,10 +194,39 @@ def main():
   parser = argparse.ArgumentParser(
       description=('Attempts to reconstruct MSM pronunciation from Baxter\'s '
                    'MC data.'))
+  parser.add_argument('-i', '--input_file', dest='input_file', type=str,
+                      default=os.path.join(dirname, 'data/mc1.csv'),
+                      help='Baxter\'s CSV to read (\'-\' for stdin).')
   parser.add_argument('-o', '--output_file', dest='output_file', type=str,
-                      required=True, help='File to dump mismatches to.')
+                      help=('File to dump mismatches to (or, with --stream, '
+                            'all records; defaults to stdout).'))
+  parser.add_argument('--workers', dest='workers', type=int, default=1,
+                      help='Number of processes to convert with.')
+  parser.add_argument('--stream', dest='stream', action='store_true',
+                      help=('Write every converted record as it\'s read, '
+                            'rather than just the mismatches.'))
+  parser.add_argument('--batch_size', dest='batch_size', type=int,
+                      default=1000, help='Records per flush with --stream.')
   args = parser.parse_args()
-  pipeline(os.path.join(dirname, 'data/mc1.csv'), args.output_file)
+  if args.stream:
+    if args.workers > 1:
+      parser.error('--workers is not supported with --stream')
+    if args.output_file and args.output_file != '-':
+      with open(args.output_file, 'w') as output:
+        stream(args.input_file, output, args.batch_size)
+      return
+    try:
+      stream(args.input_file, sys.stdout, args.batch_size)
+    except IOError as e:
+      # Whatever we're piped into stopped reading; that's fine.
+      if e.errno != errno.EPIPE:
+        raise
+    return
+  if not args.output_file:
+    parser.error('-o/--output_file is required without --stream')
+  if args.workers > 1 and args.input_file == '-':
+    parser.error('--workers needs a file to shard, not stdin')
+  pipeline(args.input_file, args.output_file, workers=args.workers)
 
 if __name__ == '__main__':
   main()
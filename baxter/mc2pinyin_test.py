@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Tests for mc2pinyin module."""
+
+import collections
+import os
+import os.path
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+
+from . import mc
+from . import mc2pinyin
+
+_MC1 = os.path.join(os.path.dirname(__file__), 'data/mc1.csv')
+
+class PipelineTest(unittest.TestCase):
+  """Tests for running the pipeline serially and sharded."""
+
+  def setUp(self):
+    self._tmpdir = tempfile.mkdtemp()
+    self._stdout, self._stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = StringIO.StringIO(), StringIO.StringIO()
+
+  def tearDown(self):
+    sys.stdout, sys.stderr = self._stdout, self._stderr
+    shutil.rmtree(self._tmpdir)
+
+  def run_pipeline(self, workers):
+    """Run the pipeline on mc1.csv, returning the mismatches and summary."""
+    output_file = os.path.join(self._tmpdir, 'mismatches%d.csv' % workers)
+    sys.stdout.truncate(0)
+    mc2pinyin.pipeline(_MC1, output_file, workers=workers)
+    with open(output_file) as f:
+      return f.read(), sys.stdout.getvalue()
+
+  def test_shards_cover_file(self):
+    """Shards are contiguous, line-aligned, and count lines correctly."""
+    with open(_MC1) as f:
+      contents = f.read()
+    shards = mc2pinyin.shard(_MC1, 7)
+    self.assertEqual(0, shards[0][0])
+    self.assertEqual(len(contents), shards[-1][1])
+    for (_, end, _), (start, _, first_line) in zip(shards, shards[1:]):
+      self.assertEqual(end, start)
+      self.assertEqual('\n', contents[start - 1])
+      self.assertEqual(contents[:start].count('\n'), first_line)
+
+  def test_workers_match_serial(self):
+    """Sharded runs produce the same mismatches, in the same order."""
+    serial = self.run_pipeline(1)
+    # Both the mismatches and the summary are captured.
+    self.assertTrue(serial[0])
+    self.assertIn('Pinyin matches: ', serial[1])
+    self.assertEqual(serial, self.run_pipeline(3))
+
+  def test_stream(self):
+    """Streaming writes every record, with matches marked."""
+    output = StringIO.StringIO()
+    mc2pinyin.stream(_MC1, output, batch_size=100)
+    rows = output.getvalue().splitlines()
+    self.assertEqual(
+        'hanzi,baxter,pinyin,expected_pinyin,expected_tone,match', rows[0])
+    self.assertEqual(9249, len(rows) - 1)
+    mismatches, _ = self.run_pipeline(1)
+    self.assertEqual(mismatches.splitlines(),
+                     [row[:-2] for row in rows[1:] if row.endswith(',0')])
+
+  def test_unconvertible(self):
+    """A syllable the steps reject is a mismatch, not an error."""
+    counts = collections.Counter()
+    record = {'hanzi': '東', 'pinyin': 'dong1',
+              'baxter': mc.MiddleChineseSyllable('tuwnk')}
+    self.assertEqual(('', '?'), mc2pinyin.compare(record, counts))
+    self.assertEqual({'total': 1}, dict(counts))
+
+  def test_all_rejected(self):
+    """The summary of an empty run doesn't divide by zero."""
+    input_file = os.path.join(self._tmpdir, 'mc.csv')
+    with open(input_file, 'wb') as f:
+      f.write('hanzi,pinyin,Baxter,GSR,HYDZD,GY,len\r\n東,dong1,tuwnk,,,,\r\n')
+    output_file = os.path.join(self._tmpdir, 'mismatches.csv')
+    mc2pinyin.pipeline(input_file, output_file)
+    self.assertIn('Pinyin matches: - (0/0)', sys.stdout.getvalue())
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Tests for mc module."""
+
+import pickle
+import unittest
+
+from . import mc
+
+class MiddleChineseSyllableTest(unittest.TestCase):
+  """Tests for parsing and sharing syllables."""
+
+  def tearDown(self):
+    mc.set_cache_size(1 << 16)
+    mc.clear_cache()
+
+  def test_parse(self):
+    """Initial, final, and tone are split apart."""
+    syl = mc.MiddleChineseSyllable('tsyhowngX')
+    self.assertEqual('tsyh', syl.baxter_initial)
+    self.assertEqual('owng', syl.baxter_final)
+    self.assertEqual('shang', syl.tone)
+    self.assertFalse(syl.voiced)
+
+  def test_of_shares_instances(self):
+    """Each spelling gets one shared instance."""
+    self.assertIs(mc.MiddleChineseSyllable.of('trhik'),
+                  mc.MiddleChineseSyllable.of('trhik'))
+
+  def test_value_equality(self):
+    """Separately constructed syllables are equal and hash the same."""
+    a, b = mc.MiddleChineseSyllable('khjuX'), mc.MiddleChineseSyllable('khjuX')
+    self.assertEqual(a, b)
+    self.assertEqual(hash(a), hash(b))
+    self.assertNotEqual(a, mc.MiddleChineseSyllable('khjuH'))
+
+  def test_immutable(self):
+    """Attributes can't be changed."""
+    syl = mc.MiddleChineseSyllable.of('nyo')
+    with self.assertRaises(AttributeError):
+      syl._tone = 'qu'  # pylint: disable=protected-access
+    with self.assertRaises(AttributeError):
+      syl.extra = 1  # pylint: disable=attribute-defined-outside-init
+
+  def test_pickle_reuses_shared_instance(self):
+    """Unpickling goes through the shared cache."""
+    syl = mc.MiddleChineseSyllable.of('baeH')
+    self.assertIs(syl, pickle.loads(pickle.dumps(syl, 2)))
+
+  def test_cache_bound(self):
+    """The cache evicts to stay within its bound."""
+    mc.set_cache_size(2)
+    for bax in ('pa', 'pak', 'paX', 'paH'):
+      mc.MiddleChineseSyllable.of(bax)
+    self.assertEqual(
+        2, len(mc._SHARED_SYLLABLES))  # pylint: disable=protected-access
+    mc.set_cache_size(0)
+    self.assertIsNot(mc.MiddleChineseSyllable.of('pa'),
+                     mc.MiddleChineseSyllable.of('pa'))
+
+class SplitTest(unittest.TestCase):
+  """Tests for splitting syllables into initial, final, and tone."""
+
+  def test_longest_initial(self):
+    """The longest matching initial wins."""
+    self.assertEqual([('tsrh', 'jo', 'qu'), ('ts', 'a', 'ping'),
+                      ('tsyh', 'ek', 'ru'), ("'", 'ae', 'shang')],
+                     list(mc.split_many(['tsrhjoH', 'tsa', 'tsyhek', "'aeX"])))
+
+  def test_invalid_initial(self):
+    """Syllables without a valid initial are rejected."""
+    for bax in ('qaX', '', 'X'):
+      with self.assertRaises(ValueError):
+        list(mc.split_many([bax]))
+
+  def test_not_strict(self):
+    """Invalid syllables can be yielded as errors instead."""
+    splits = list(mc.split_many(['tsa', 'qaX', 'tsa'], strict=False))
+    self.assertEqual(('ts', 'a', 'ping'), splits[0])
+    self.assertIsInstance(splits[1], ValueError)
+    self.assertEqual(splits[0], splits[2])
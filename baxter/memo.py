@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Bounded memoization of the (pure) step functions, with statistics.
+
+All memoized functions share one switch and one size bound, so that every
+converter built on them benefits (and a reference run can turn them all off).
+
+  @memo.memoized()
+  def _division(final_r1):
+    ...
+
+Calls bypass the caches while a syllable selected by a trace.Tracer is being
+converted, so that the rules that fire for it are always recorded.
+"""
+
+import collections
+import functools
+
+from . import trace
+
+_DEFAULT_SIZE = 4096
+
+# Hit/miss statistics for one memoized function.
+CacheStats = collections.namedtuple(
+    'CacheStats', ['hits', 'misses', 'size', 'maxsize'])
+
+class Cache(object):
+  """A bounded cache of results, with hit/miss statistics.
+
+  Used for the memoized functions, and for the other caches of the converters
+  (e.g., the syllables shared by MiddleChineseSyllable.of). Hot loops can look
+  results up in the results dict directly, and count the hits and misses
+  themselves. A maxsize of zero keeps nothing.
+  """
+
+  def __init__(self, maxsize):
+    self.maxsize = maxsize
+    self.results = {}
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self):
+    return len(self.results)
+
+  def put(self, key, result):
+    """Store a result, evicting an arbitrary one if the cache is full."""
+    if self.maxsize:
+      if len(self.results) >= self.maxsize:
+        self.results.popitem()
+      self.results[key] = result
+
+  def resize(self, maxsize):
+    """Change the bound, evicting results as needed."""
+    if maxsize < 0:
+      raise ValueError('Cache size must be non-negative; got %d' % maxsize)
+    self.maxsize = maxsize
+    while len(self.results) > maxsize:
+      self.results.popitem()
+
+  def clear(self):
+    """Drop all of the results, and reset the statistics."""
+    self.results.clear()
+    self.hits = self.misses = 0
+
+# Caches of the memoized functions, by name.
+_CACHES = collections.OrderedDict()
+_ENABLED = True
+
+def memoized(key=None):
+  """Decorator that memoizes a pure function of hashable arguments.
+
+  key (if given) maps the arguments to the cache key, for arguments that
+  don't affect the result (e.g., ones only used in error messages).
+  Exceptions aren't cached.
+  """
+  def decorate(func):
+    """Memoize func."""
+    name = '%s.%s' % (func.__module__, func.__name__)
+    cache = _CACHES[name] = Cache(_DEFAULT_SIZE)
+    results = cache.results
+    @functools.wraps(func)
+    def memoized_func(*args):
+      """Look up the result of func, computing it if needed."""
+      if not _ENABLED or (trace.ACTIVE is not None and
+                          trace.ACTIVE.current is not None):
+        return func(*args)
+      k = key(*args) if key else args
+      try:
+        result = results[k]
+      except KeyError:
+        cache.misses += 1
+        result = func(*args)
+        cache.put(k, result)
+        return result
+      cache.hits += 1
+      return result
+    return memoized_func
+  return decorate
+
+def set_enabled(enabled):
+  """Turn memoization on or off (e.g., for reference runs)."""
+  global _ENABLED  # pylint: disable=global-statement
+  _ENABLED = enabled
+
+def is_enabled():
+  """Whether memoization is on."""
+  return _ENABLED
+
+def set_cache_size(maxsize):
+  """Bound the number of results kept per memoized function.
+
+  Zero keeps nothing. Shrinking the caches evicts results as needed.
+  """
+  global _DEFAULT_SIZE  # pylint: disable=global-statement
+  if maxsize < 0:
+    raise ValueError('Cache size must be non-negative; got %d' % maxsize)
+  _DEFAULT_SIZE = maxsize
+  for cache in _CACHES.values():
+    cache.resize(maxsize)
+
+def clear_cache():
+  """Drop all of the memoized results, and reset the statistics."""
+  for cache in _CACHES.values():
+    cache.clear()
+
+def stats():
+  """Get the CacheStats of each memoized function, by qualified name."""
+  return collections.OrderedDict(
+      (name, CacheStats(c.hits, c.misses, len(c), c.maxsize))
+      for name, c in _CACHES.items())
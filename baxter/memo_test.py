@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Tests for memo module."""
+
+import unittest
+
+from . import mc
+from . import memo
+from . import steps
+from . import trace
+
+_CALLS = []
+
+@memo.memoized(key=lambda x, note: x)
+def _double(x, note):
+  """Double x, remembering the call."""
+  _CALLS.append((x, note))
+  return 2 * x
+
+def _double_stats():
+  """Get the statistics of _double."""
+  return memo.stats()[__name__ + '._double']
+
+class MemoTest(unittest.TestCase):
+  """Tests for memoizing pure functions."""
+
+  def setUp(self):
+    memo.clear_cache()
+    del _CALLS[:]
+
+  def tearDown(self):
+    memo.set_enabled(True)
+    memo.set_cache_size(4096)
+    memo.clear_cache()
+
+  def test_hits_and_misses(self):
+    """Results are computed once per key, and calls are counted."""
+    self.assertEqual(4, _double(2, 'a'))
+    self.assertEqual(4, _double(2, 'b'))
+    self.assertEqual(6, _double(3, 'a'))
+    self.assertEqual([(2, 'a'), (3, 'a')], _CALLS)
+    self.assertEqual(memo.CacheStats(1, 2, 2, 4096), _double_stats())
+
+  def test_disabled(self):
+    """With memoization off, every call is computed."""
+    memo.set_enabled(False)
+    _double(2, 'a')
+    _double(2, 'a')
+    self.assertEqual(2, len(_CALLS))
+    self.assertEqual(memo.CacheStats(0, 0, 0, 4096), _double_stats())
+
+  def test_size_bound(self):
+    """The caches never hold more than their bound."""
+    memo.set_cache_size(2)
+    for x in range(5):
+      _double(x, '')
+    self.assertEqual(2, _double_stats().size)
+    memo.set_cache_size(1)
+    self.assertEqual(1, _double_stats().size)
+    self.assertRaises(ValueError, memo.set_cache_size, -1)
+
+  def test_cache(self):
+    """A Cache can be used on its own, and stays within its bound."""
+    cache = memo.Cache(2)
+    for x in range(5):
+      cache.put(x, 2 * x)
+    self.assertEqual(2, len(cache))
+    self.assertEqual(set([2 * x for x in cache.results]),
+                     set(cache.results.values()))
+    cache.resize(0)
+    cache.put(5, 10)
+    self.assertEqual(0, len(cache))
+    self.assertRaises(ValueError, cache.resize, -1)
+
+  def test_bypassed_while_tracing(self):
+    """Traced syllables go through the steps, so their rules are recorded."""
+    syl = mc.MiddleChineseSyllable('syip')
+    steps.expected_msm_syllable(syl)
+    with trace.Tracer() as tracer:
+      steps.expected_msm_syllable(syl)
+    self.assertIn('final_r1: -p to -m', tracer.traces[0].hits)
+
+  def test_used_for_unselected_syllables(self):
+    """Tracing some syllables doesn't bypass the caches for the rest."""
+    with trace.Tracer(['syip']):
+      steps.expected_msm_syllable(mc.MiddleChineseSyllable('kop'))
+      steps.expected_msm_syllable(mc.MiddleChineseSyllable('kop'))
+    self.assertGreater(memo.stats()['baxter.steps._final_r1'].hits, 0)
+
+  def test_same_results(self):
+    """The steps give the same results with and without memoization."""
+    syllables = [mc.MiddleChineseSyllable(bax) for bax in mc.all_syllables()]
+    def convert_all():
+      """Convert every syllable, or note the error."""
+      results = []
+      for syl in syllables:
+        try:
+          results.append(steps.expected_msm_syllable(syl))
+        except (ValueError, IndexError) as e:
+          results.append(type(e))
+      return results
+    memoized = convert_all()
+    memo.set_enabled(False)
+    self.assertEqual(memoized, convert_all())
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Counts how often each rule of the steps fires, and which rules mismatch.
+
+python -m baxter.rule_stats --top 20
+
+Every record is converted through the (traced) steps. Each rule branch that
+fires is counted, and each mismatch (or rejected syllable) is attributed to
+every rule on its path, so the report shows which rules the mismatches go
+through most, and how much more often than average they mismatch.
+"""
+
+import argparse
+import collections
+import csv
+import os.path
+import sys
+
+from . import mc2pinyin
+from . import steps
+from . import trace
+
+class RuleStats(object):
+  """Per-rule hit and mismatch counts over a run."""
+
+  def __init__(self):
+    self.hits = collections.Counter()
+    self.mismatch_hits = collections.Counter()
+    self.total = 0
+    self.mismatches = 0
+
+  def add(self, rules, matched):
+    """Count one converted syllable, given the rules on its path."""
+    self.total += 1
+    if not matched:
+      self.mismatches += 1
+    # A rule counts once per syllable, however often it fired.
+    for rule in set(rules):
+      self.hits[rule] += 1
+      if not matched:
+        self.mismatch_hits[rule] += 1
+
+  def rows(self):
+    """Get (rule, hits, mismatches, mismatch rate, share of all mismatches).
+
+    Rows are sorted by mismatches, most first.
+    """
+    rows = []
+    for rule, hits in self.hits.items():
+      mismatches = self.mismatch_hits[rule]
+      rows.append((rule, hits, mismatches, float(mismatches) / hits,
+                   float(mismatches) / self.mismatches if self.mismatches
+                   else 0.0))
+    rows.sort(key=lambda row: (-row[2], -row[1], row[0]))
+    return rows
+
+  def report(self, out=None, top=None):
+    """Write a table of the rules with the most mismatches."""
+    out = out or sys.stdout
+    rate = float(self.mismatches) / self.total if self.total else 0.0
+    print >>out, 'Mismatches: %d/%d (%.2f%%)' % (
+        self.mismatches, self.total, 100.0 * rate)
+    print >>out, '%-50s %7s %10s %7s %7s' % (
+        'rule', 'hits', 'mismatches', 'rate', 'share')
+    for rule, hits, mismatches, mismatch_rate, share in self.rows()[:top]:
+      print >>out, '%-50s %7d %10d %6.1f%% %6.1f%%' % (
+          rule, hits, mismatches, 100.0 * mismatch_rate, 100.0 * share)
+
+def profile(records, mismatch_writer=None):
+  """Convert records (as read by read_records) through the traced steps.
+
+  If mismatch_writer (a csv.writer) is given, each mismatch is written to it
+  as hanzi,baxter,pinyin,expected_pinyin,rules.
+
+  Returns: A RuleStats.
+  """
+  stats = RuleStats()
+  with trace.Tracer() as tracer:
+    for r in records:
+      syl = r['baxter']
+      try:
+        expected = steps.expected_pinyin(syl)
+      except (ValueError, IndexError):
+        # The steps rejected the syllable (the final is unexpected or empty).
+        expected = None
+      hits = tracer.traces[-1].hits if tracer.traces else []
+      # Only the counts are needed, not the traces themselves.
+      del tracer.traces[:]
+      matched = r['pinyin'] == expected
+      stats.add(hits, matched)
+      if not matched and mismatch_writer is not None:
+        mismatch_writer.writerow([r['hanzi'], syl.baxter, r['pinyin'],
+                                  expected or '', ' | '.join(hits)])
+  return stats
+
+def main():
+  """Profile the rules over Baxter's data from the command line."""
+  dirname = os.path.dirname(__file__)
+  parser = argparse.ArgumentParser(
+      description=('Counts how often each rule fires converting Baxter\'s MC '
+                   'data, and attributes mismatches to rules.'))
+  parser.add_argument('-i', '--input_file', dest='input_file', type=str,
+                      default=os.path.join(dirname, 'data/mc1.csv'),
+                      help='Baxter\'s CSV to read (\'-\' for stdin).')
+  parser.add_argument('--mismatches_file', dest='mismatches_file', type=str,
+                      help='File to write each mismatch and its rules to.')
+  parser.add_argument('--top', dest='top', type=int,
+                      help='Only report this many rules.')
+  args = parser.parse_args()
+  records = mc2pinyin.read_records(args.input_file)
+  if args.mismatches_file:
+    with open(args.mismatches_file, 'wb') as f:
+      stats = profile(records, csv.writer(f))
+  else:
+    stats = profile(records)
+  stats.report(top=args.top)
+
+if __name__ == '__main__':
+  main()
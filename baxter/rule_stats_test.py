@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Tests for rule_stats module."""
+
+import csv
+import StringIO
+import unittest
+
+from . import rule_stats
+from . import test_util
+from . import trace
+
+class RuleStatsTest(unittest.TestCase):
+  """Tests for counting rules and attributing mismatches."""
+
+  def test_profile(self):
+    """Mismatches are attributed to the rules on their paths."""
+    out = StringIO.StringIO()
+    stats = rule_stats.profile(
+        [test_util.record('知', 'trje', 'zhi1'),
+         test_util.record('蚩', 'tsyhe', 'chi1'),
+         test_util.record('樂', 'lak', 'le4'),
+         test_util.record('十', 'syip', 'shi2')],
+        csv.writer(out))
+    self.assertEqual(4, stats.total)
+    self.assertEqual(2, stats.mismatches)
+    self.assertEqual(2, stats.hits['final_r1: palatal initial adds j'])
+    self.assertEqual(1, stats.mismatch_hits['final_r1: palatal initial adds j'])
+    self.assertEqual(1, stats.hits['final_r1: -k to -ng'])
+    self.assertEqual(1, stats.mismatch_hits['final_r1: -k to -ng'])
+    self.assertEqual(2, stats.hits['simplify_final_r1: to i'])
+    self.assertEqual(0, stats.mismatch_hits['simplify_final_r1: to i'])
+    rows = list(csv.reader(StringIO.StringIO(out.getvalue())))
+    self.assertEqual([['樂', 'lak', 'le4', 'luo4'], ['十', 'syip', 'shi2', 'shi4']],
+                     [row[:4] for row in rows])
+    self.assertIn('final_r1: -k to -ng', rows[0][4].split(' | '))
+    # Tracing stops once profiling is done.
+    self.assertIsNone(trace.ACTIVE)
+
+  def test_rejected(self):
+    """Syllables that the steps reject count as mismatches."""
+    stats = rule_stats.profile([test_util.record('x', 'trhiwk', 'chi4')])
+    self.assertEqual(1, stats.mismatches)
+
+  def test_rows(self):
+    """Rows are sorted by mismatches, with rates and shares."""
+    stats = rule_stats.RuleStats()
+    stats.add(['a', 'b', 'a'], True)
+    stats.add(['b'], False)
+    stats.add(['b', 'c'], False)
+    self.assertEqual([('b', 3, 2, 2.0 / 3, 1.0), ('c', 1, 1, 1.0, 0.5),
+                      ('a', 1, 0, 0.0, 0.0)], stats.rows())
+    out = StringIO.StringIO()
+    stats.report(out, top=1)
+    self.assertEqual(3, len(out.getvalue().splitlines()))
@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+"""HTTP/JSON lookup service over the converters and Baxter's records.
+
+python -m baxter.server --port 8000
+
+The records and converters are loaded once, at startup. Endpoints:
+
+  GET /convert?baxter=tha&baxter=haeng[&targets=pinyin,msm_tone]
+  POST /convert with {"baxter": [...], "targets": [...]}
+    Convert syllables in Baxter's notation (to every target by default).
+  GET /hanzi?q=行
+    Look up the readings of characters, with their predicted Pinyin.
+  GET /tone?baxter=tha
+    Predict Mandarin tones.
+  GET /metrics
+    Request counts, latency histograms, and cache and batching statistics.
+
+Conversions requested concurrently are coalesced into one batch, and
+responses are cached by request. Bad requests (including query values that
+aren't UTF-8) get status 400, unknown endpoints 404, and unexpected errors
+500, with {"error": ...}.
+"""
+
+import argparse
+import BaseHTTPServer
+import collections
+import json
+import os.path
+import Queue
+import SocketServer
+import threading
+import timeit
+import urlparse
+
+from . import converters
+from . import index
+from . import mc
+from . import mc2pinyin
+from . import memo
+
+# Upper bounds (in milliseconds) of the latency histogram buckets.
+_LATENCY_BUCKETS_MS = [0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+class Metrics(object):
+  """Thread-safe request counts and latency histograms, by endpoint."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._requests = collections.defaultdict(collections.Counter)
+    self._histograms = collections.defaultdict(
+        lambda: [0] * (len(_LATENCY_BUCKETS_MS) + 1))
+    self._latency_sums = collections.Counter()
+
+  def observe(self, endpoint, status, seconds):
+    """Record a request and how long it took."""
+    ms = 1000.0 * seconds
+    bucket = len(_LATENCY_BUCKETS_MS)
+    for i, bound in enumerate(_LATENCY_BUCKETS_MS):
+      if ms <= bound:
+        bucket = i
+        break
+    with self._lock:
+      self._requests[endpoint][status] += 1
+      self._histograms[endpoint][bucket] += 1
+      self._latency_sums[endpoint] += ms
+
+  def snapshot(self):
+    """Get the metrics as a json-serializable dict.
+
+    Histogram counts are cumulative, keyed by bucket upper bound in ms.
+    """
+    with self._lock:
+      endpoints = {}
+      for endpoint, statuses in self._requests.items():
+        counts = self._histograms[endpoint]
+        cumulative, total = collections.OrderedDict(), 0
+        for bound, count in zip(_LATENCY_BUCKETS_MS + ['+Inf'], counts):
+          total += count
+          cumulative[str(bound)] = total
+        endpoints[endpoint] = {
+            'requests': dict((str(s), n) for s, n in statuses.items()),
+            'latency_ms': {'sum': self._latency_sums[endpoint],
+                           'count': total, 'buckets': cumulative}}
+      return endpoints
+
+class _ResponseCache(object):
+  """Thread-safe memo.Cache of encoded responses."""
+
+  def __init__(self, maxsize):
+    self._cache = memo.Cache(maxsize)
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    """Get a cached response, or None."""
+    with self._lock:
+      response = self._cache.results.get(key)
+      if response is None:
+        self._cache.misses += 1
+      else:
+        self._cache.hits += 1
+      return response
+
+  def put(self, key, response):
+    """Cache a response, evicting an arbitrary one if the cache is full."""
+    with self._lock:
+      self._cache.put(key, response)
+
+  def stats(self):
+    """Get the hit/miss statistics."""
+    with self._lock:
+      c = self._cache
+      return {'hits': c.hits, 'misses': c.misses, 'size': len(c),
+              'maxsize': c.maxsize}
+
+class _Pending(object):
+  """Spellings waiting to be converted in a batch."""
+
+  def __init__(self, baxters):
+    self.baxters = baxters
+    self.results = None
+    self.error = None
+    self.done = threading.Event()
+
+class _Batcher(object):
+  """Coalesces conversions requested concurrently into one convert_all call.
+
+  Requests that arrive while a batch is being converted (or within max_delay
+  of the first request of a batch) are converted together in the next one.
+  """
+
+  def __init__(self, max_delay=0.0, max_size=1000):
+    self._max_delay = max_delay
+    self._max_size = max_size
+    self._queue = Queue.Queue()
+    self._lock = threading.Lock()
+    self.batches = 0
+    self.requests = 0
+    self.syllables = 0
+    worker = threading.Thread(target=self._run, name='batcher')
+    worker.daemon = True
+    worker.start()
+
+  def convert(self, baxters):
+    """Convert valid spellings to every target.
+
+    Returns: A list with a dict from target to conversion per spelling.
+    """
+    pending = _Pending(baxters)
+    self._queue.put(pending)
+    pending.done.wait()
+    if pending.error is not None:
+      raise pending.error  # pylint: disable=raising-bad-type
+    return pending.results
+
+  def _next_batch(self):
+    """Wait for a request, then gather the others that are ready."""
+    batch = [self._queue.get()]
+    size = len(batch[0].baxters)
+    deadline = timeit.default_timer() + self._max_delay
+    while size < self._max_size:
+      timeout = deadline - timeit.default_timer()
+      try:
+        if timeout > 0:
+          pending = self._queue.get(timeout=timeout)
+        else:
+          pending = self._queue.get_nowait()
+      except Queue.Empty:
+        break
+      batch.append(pending)
+      size += len(pending.baxters)
+    return batch, size
+
+  def _run(self):
+    """Convert batches until the process exits."""
+    while True:
+      batch, size = self._next_batch()
+      with self._lock:
+        self.batches += 1
+        self.requests += len(batch)
+        self.syllables += size
+      try:
+        results = converters.convert_all(
+            [bax for pending in batch for bax in pending.baxters])
+        start = 0
+        for pending in batch:
+          pending.results = [
+              dict((t, conversions[i]) for t, conversions in results.items())
+              for i in range(start, start + len(pending.baxters))]
+          start += len(pending.baxters)
+      except Exception as e:  # pylint: disable=broad-except
+        # Don't let one bad batch take down the worker.
+        for pending in batch:
+          pending.error = e
+      for pending in batch:
+        pending.done.set()
+
+  def stats(self):
+    """Get the batching statistics."""
+    with self._lock:
+      return {'batches': self.batches, 'requests': self.requests,
+              'syllables': self.syllables}
+
+class BadRequest(Exception):
+  """A request that can't be answered (reported with status 400)."""
+  status = 400
+
+class NotFound(BadRequest):
+  """A request for an unknown endpoint (reported with status 404)."""
+  status = 404
+
+def _check_utf8(query):
+  """Raise BadRequest unless every query value decodes as UTF-8.
+
+  The values are still passed on as utf-8 bytes, as the index and converters
+  expect.
+  """
+  for name, values in query.items():
+    for value in values:
+      try:
+        value.decode('utf-8')
+      except UnicodeDecodeError:
+        raise BadRequest('Query parameter %s is not valid UTF-8: %r' % (
+            name, value))
+
+class LookupService(object):
+  """Answers lookups over records (as read by read_records).
+
+  This holds everything the HTTP handler needs; it can also be used directly.
+  """
+
+  def __init__(self, records, cache_size=4096, max_delay=0.0, max_batch=1000):
+    self._index = index.BaxterIndex(records)
+    self._cache = _ResponseCache(cache_size)
+    self._batcher = _Batcher(max_delay, max_batch)
+    self.metrics = Metrics()
+
+  @classmethod
+  def load(cls, fname=None, **kwargs):
+    """Load the service from Baxter's CSV (by default, data/mc1.csv)."""
+    if fname is None:
+      fname = os.path.join(os.path.dirname(__file__), 'data/mc1.csv')
+    return cls(mc2pinyin.read_records(fname), **kwargs)
+
+  def _convert(self, baxters):
+    """Convert spellings, with an error in place of any invalid one."""
+    valid, results = [], []
+    for bax in baxters:
+      try:
+        mc.MiddleChineseSyllable.of(bax)
+      except ValueError as e:
+        results.append({'error': str(e)})
+      else:
+        valid.append(bax)
+        results.append(None)
+    converted = iter(self._batcher.convert(valid) if valid else [])
+    return [r if r is not None else next(converted) for r in results]
+
+  def convert(self, baxters, targets=None):
+    """Convert spellings in Baxter's notation to the targets (default: all)."""
+    targets = targets or converters.names()
+    for t in targets:
+      if t not in converters.names():
+        raise BadRequest('Unknown target %r; expected one of %s' % (
+            t, ', '.join(converters.names())))
+    results = []
+    for bax, converted in zip(baxters, self._convert(baxters)):
+      result = {'baxter': bax}
+      if 'error' in converted:
+        result['error'] = converted['error']
+      else:
+        result.update((t, converted[t]) for t in targets)
+      results.append(result)
+    return results
+
+  def hanzi(self, chars):
+    """Look up the readings of characters."""
+    readings = [(hz, r) for hz in chars for r in self._index.by_hanzi(hz)]
+    converted = self._convert([r['baxter'].baxter for _, r in readings])
+    return [{'hanzi': hz, 'baxter': r['baxter'].baxter, 'pinyin': r['pinyin'],
+             'expected_pinyin': c['pinyin'], 'expected_tone': c['msm_tone']}
+            for (hz, r), c in zip(readings, converted)]
+
+  def tones(self, baxters):
+    """Predict the Mandarin tones of spellings in Baxter's notation."""
+    return self.convert(baxters, ['msm_tone'])
+
+  def metrics_snapshot(self):
+    """Get the metrics, including cache and batching statistics."""
+    return {'endpoints': self.metrics.snapshot(),
+            'response_cache': self._cache.stats(),
+            'batching': self._batcher.stats()}
+
+  def handle(self, method, path, query, body=None):
+    """Answer a request.
+
+    query is a dict of lists (as parsed by urlparse.parse_qs); body is the
+    json request body of a POST.
+
+    Returns: (status, encoded json response)
+    """
+    if path == '/metrics':
+      return 200, json.dumps(self.metrics_snapshot())
+    key = (method, path,
+           tuple(sorted((k, tuple(v)) for k, v in query.items())), body)
+    cached = self._cache.get(key)
+    if cached is not None:
+      return cached
+    try:
+      _check_utf8(query)
+      response = 200, json.dumps({'results': self._answer(
+          method, path, query, body)})
+    except BadRequest as e:
+      # Bad requests are cheap to answer again; don't let them fill the cache.
+      return e.status, json.dumps({'error': str(e)})
+    self._cache.put(key, response)
+    return response
+
+  def _answer(self, method, path, query, body):
+    """Get the results for a request."""
+    if method == 'POST':
+      if path != '/convert':
+        if path in ('/hanzi', '/tone'):
+          raise BadRequest('Only /convert accepts POST')
+        raise NotFound('Unknown endpoint: %s' % path)
+      try:
+        request = json.loads(body)
+        baxters = [bax.encode('utf-8') for bax in request['baxter']]
+        targets = request.get('targets')
+      except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise BadRequest('Expected {"baxter": [...], "targets": [...]}: %s' %
+                         e)
+      return self.convert(baxters, targets)
+    targets = query.get('targets', [''])[0]
+    if path == '/convert':
+      return self.convert(query.get('baxter', []),
+                          targets.split(',') if targets else None)
+    if path == '/hanzi':
+      return self.hanzi(query.get('q', []))
+    if path == '/tone':
+      return self.tones(query.get('baxter', []))
+    raise NotFound('Unknown endpoint: %s' % path)
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Passes requests on to the server's LookupService."""
+
+  def _respond(self, method, body=None):
+    """Answer a request, recording its latency."""
+    start = timeit.default_timer()
+    url = urlparse.urlparse(self.path)
+    service = self.server.service
+    try:
+      status, response = service.handle(
+          method, url.path, urlparse.parse_qs(url.query), body)
+    except Exception as e:  # pylint: disable=broad-except
+      # Answer (and measure) anything unexpected, rather than dropping the
+      # connection.
+      status, response = 500, json.dumps({'error': 'Internal error: %r' % e})
+    # Unknown paths share one endpoint, so they can't grow the metrics.
+    endpoint = url.path if status != 404 else '(unknown)'
+    try:
+      self.send_response(status)
+      self.send_header('Content-Type', 'application/json')
+      self.send_header('Content-Length', str(len(response)))
+      self.end_headers()
+      self.wfile.write(response)
+    finally:
+      service.metrics.observe(endpoint, status, timeit.default_timer() - start)
+
+  def do_GET(self):  # pylint: disable=invalid-name
+    """Answer a GET request."""
+    self._respond('GET')
+
+  def do_POST(self):  # pylint: disable=invalid-name
+    """Answer a POST request."""
+    length = int(self.headers.getheader('Content-Length') or 0)
+    self._respond('POST', self.rfile.read(length))
+
+  def log_message(self, *args):  # pylint: disable=arguments-differ
+    """Don't log every request to stderr."""
+    pass
+
+class LookupServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  """HTTP server answering each request in its own thread."""
+
+  daemon_threads = True
+
+  def __init__(self, address, service):
+    BaseHTTPServer.HTTPServer.__init__(self, address, _Handler)
+    self.service = service
+
+def main():
+  """Serve lookups over Baxter's data."""
+  dirname = os.path.dirname(__file__)
+  parser = argparse.ArgumentParser(
+      description='Serves conversions and lookups of Baxter\'s MC data.')
+  parser.add_argument('-i', '--input_file', dest='input_file', type=str,
+                      default=os.path.join(dirname, 'data/mc1.csv'),
+                      help='Baxter\'s CSV to load.')
+  parser.add_argument('--host', dest='host', type=str, default='localhost',
+                      help='Host to listen on.')
+  parser.add_argument('--port', dest='port', type=int, default=8000,
+                      help='Port to listen on.')
+  parser.add_argument('--cache_size', dest='cache_size', type=int,
+                      default=4096, help='Number of responses to cache.')
+  parser.add_argument('--max_delay', dest='max_delay', type=float, default=0.0,
+                      help=('Seconds to wait for more requests to batch with '
+                            'the first.'))
+  args = parser.parse_args()
+  service = LookupService.load(args.input_file, cache_size=args.cache_size,
+                               max_delay=args.max_delay)
+  server = LookupServer((args.host, args.port), service)
+  print 'Serving on http://%s:%d' % server.server_address
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+
+if __name__ == '__main__':
+  main()
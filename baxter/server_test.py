@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Tests for server module."""
+
+import httplib
+import json
+import threading
+import unittest
+import urllib
+
+from . import server
+from . import test_util
+
+_RECORDS = [test_util.record('行', 'haeng', 'xing2'),
+            test_util.record('行', 'hang', 'hang2'),
+            test_util.record('多', 'ta', 'duo1')]
+
+class ServerTest(unittest.TestCase):
+  """Tests for the lookup service, over HTTP."""
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = server.LookupService(_RECORDS)
+    cls.server = server.LookupServer(('localhost', 0), cls.service)
+    cls.thread = threading.Thread(target=cls.server.serve_forever)
+    cls.thread.daemon = True
+    cls.thread.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.shutdown()
+    cls.server.server_close()
+
+  def request(self, path, body=None):
+    """Make a request, returning the status and decoded json response."""
+    conn = httplib.HTTPConnection(*self.server.server_address)
+    try:
+      conn.request('POST' if body is not None else 'GET', path, body)
+      response = conn.getresponse()
+      return response.status, json.loads(response.read())
+    finally:
+      conn.close()
+
+  def test_convert(self):
+    """Syllables are converted to every target, or the requested ones."""
+    status, response = self.request('/convert?baxter=tha&baxter=haeng')
+    self.assertEqual(200, status)
+    self.assertEqual(
+        [{'baxter': 'tha', 'pinyin': 'tuo1', 'msm_tone': '1'},
+         {'baxter': 'haeng', 'pinyin': 'xing2', 'msm_tone': '2'}],
+        response['results'])
+    _, response = self.request('/convert?baxter=tha&targets=pinyin')
+    self.assertEqual([{'baxter': 'tha', 'pinyin': 'tuo1'}],
+                     response['results'])
+
+  def test_convert_batch(self):
+    """Batches can be POSTed, and invalid spellings get errors."""
+    status, response = self.request(
+        '/convert', json.dumps({'baxter': ['ta', 'qqq'],
+                                'targets': ['pinyin']}))
+    self.assertEqual(200, status)
+    self.assertEqual({'baxter': 'ta', 'pinyin': 'duo1'},
+                     response['results'][0])
+    self.assertIn('error', response['results'][1])
+
+  def test_hanzi(self):
+    """Characters are looked up with their predicted Pinyin."""
+    _, response = self.request('/hanzi?' + urllib.urlencode({'q': '行'}))
+    self.assertEqual(['haeng', 'hang'],
+                     [r['baxter'] for r in response['results']])
+    self.assertEqual(u'行', response['results'][0]['hanzi'])
+    self.assertEqual('xing2', response['results'][0]['expected_pinyin'])
+
+  def test_tone(self):
+    """Tones are predicted."""
+    _, response = self.request('/tone?baxter=haeng')
+    self.assertEqual([{'baxter': 'haeng', 'msm_tone': '2'}],
+                     response['results'])
+
+  def test_bad_requests(self):
+    """Unknown targets and invalid requests are reported as bad requests."""
+    self.assertEqual(400, self.request('/convert?baxter=ta&targets=x')[0])
+    self.assertEqual(400, self.request('/convert', 'not json')[0])
+    status, response = self.request('/convert?baxter=%FF')
+    self.assertEqual(400, status)
+    self.assertIn('UTF-8', response['error'])
+
+  def test_not_found(self):
+    """Unknown endpoints aren't found."""
+    self.assertEqual(404, self.request('/nonexistent')[0])
+    self.assertEqual(404, self.request('/nonexistent', '{}')[0])
+
+  def test_internal_error(self):
+    """Unexpected errors are answered (and measured) as internal errors."""
+    def fail(*_):
+      """Fail the way a bug would."""
+      raise RuntimeError('oops')
+    self.service.handle = fail
+    try:
+      status, response = self.request('/tone?baxter=kae')
+    finally:
+      del self.service.handle
+    self.assertEqual(500, status)
+    self.assertIn('oops', response['error'])
+    _, metrics = self.request('/metrics')
+    self.assertEqual(1, metrics['endpoints']['/tone']['requests']['500'])
+
+  def test_cache_and_metrics(self):
+    """Repeated requests are cached, and every request is measured."""
+    self.request('/tone?baxter=ta')
+    self.request('/tone?baxter=ta')
+    _, metrics = self.request('/metrics')
+    self.assertGreaterEqual(metrics['response_cache']['hits'], 1)
+    tone = metrics['endpoints']['/tone']
+    self.assertGreaterEqual(tone['latency_ms']['count'], 2)
+    self.assertEqual(tone['latency_ms']['count'],
+                     tone['latency_ms']['buckets']['+Inf'])
+    self.assertGreaterEqual(metrics['batching']['batches'], 1)
+
+  def test_concurrent(self):
+    """Concurrent requests all get their own answers."""
+    results = {}
+    def convert(bax):
+      """Convert one syllable over HTTP."""
+      results[bax] = self.request('/convert?targets=pinyin&baxter=' + bax)
+    threads = [threading.Thread(target=convert, args=(bax,))
+               for bax in ['ta', 'tha', 'haeng', 'hang', 'kae', 'kaeH']]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    for bax, (status, response) in results.items():
+      self.assertEqual(200, status)
+      self.assertEqual(bax, response['results'][0]['baxter'])
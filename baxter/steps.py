@@ -4,7 +4,11 @@
 This will serve as a reference implementation when making other converters.
 """
 
-import logging
+import collections
+
+from . import mc
+from . import memo
+from . import trace
 
 def expected_msm_tone(syl):
   """Get the expected tone in MSM."""
@@ -25,6 +29,7 @@ def expected_msm_tone(syl):
       tone = '4'
   return tone
 
+@memo.memoized()
 def _init_r1(bax_init):
   """Round 1 initial from the baxter initial."""
   return {
@@ -42,15 +47,22 @@ def _tone_r1(bax_tone):
   """Round 1 tone from the baxter tone."""
   return {'ping': '1', 'shang': '2', 'qu': '3', 'ru': '4'}[bax_tone]
 
+@memo.memoized()
 def _final_r1(bax_init, bax_final):
   """Round 1 final from the baxter final."""
   final_r1 = bax_final
-  final_r1 = final_r1[:-1] + {'p': 'm', 't': 'n', 'k': 'ng'}.get(
-      final_r1[-1], final_r1[-1])
+  nasal = {'p': 'm', 't': 'n', 'k': 'ng'}.get(final_r1[-1])
+  if nasal:
+    if trace.ACTIVE:
+      trace.hit('final_r1: -%s to -%s', final_r1[-1], nasal)
+    final_r1 = final_r1[:-1] + nasal
   if 'y' in bax_init and not final_r1.startswith('j'):
+    if trace.ACTIVE:
+      trace.hit('final_r1: palatal initial adds j')
     final_r1 = 'j' + final_r1
   return final_r1
 
+@memo.memoized()
 def _division(final_r1):
   division = 1
   if 'ae' in final_r1 or 'ea' in final_r1:
@@ -61,19 +73,30 @@ def _division(final_r1):
     division = 4
   return division
 
+def syllable_division(syl):
+  """Get the division (1 through 4) of a syllable, as found in step 7."""
+  return _division(_final_r1(syl.baxter_initial, syl.baxter_final))
+
+@memo.memoized()
 def _remove_f(init_r1, final_r1):
   """Remove f's."""
   if final_r1 in ['jowng', 'juwng', 'j+j', 'joj', 'ju',
                   'jon', 'jun', 'jang', 'juw']:
     if init_r1 in ['b', 'p']:
+      if trace.ACTIVE:
+        trace.hit('remove_f: %s to f', init_r1)
       init_r1 = 'f'
     elif init_r1 == 'Vp':
+      if trace.ACTIVE:
+        trace.hit('remove_f: Vp to Vf')
       init_r1 = 'Vf'
     elif init_r1 == 'vm' and final_r1 not in ['jowng', 'juwng']:
+      if trace.ACTIVE:
+        trace.hit('remove_f: vm to vw')
       init_r1 = 'vw'
   return init_r1
 
-_ROUND_1_SIMPLIFICATIONS = (
+ROUND_1_SIMPLIFICATIONS = (
     (('owng', 'uwng', 'jowng', 'juwng'), 'ong'),
     (('aewng', 'ang', 'jang'), 'ang'),
     (('aeng', 'eang', 'jaeng', 'jieng', 'jeng', 'eng', 'ong', 'ing', 'jing'), 'eng'),
@@ -87,13 +110,18 @@ _ROUND_1_SIMPLIFICATIONS = (
     (('aw', 'aew', 'jew', 'jiew', 'ew'), 'ao'),
     (('uw', 'juw', 'jiw'), 'ou'))
 
+# bax is only used in the error message.
+@memo.memoized(key=lambda final_r1, bax: final_r1)
 def _simplify_final_r1(final_r1, bax):
   """Simplify the round 1 finals."""
-  for possibilities, output in _ROUND_1_SIMPLIFICATIONS:
+  for possibilities, output in ROUND_1_SIMPLIFICATIONS:
     if final_r1 in possibilities:
+      if trace.ACTIVE:
+        trace.hit('simplify_final_r1: to %s', output)
       return output
   raise ValueError('Unexpected final: %s (from %s)' % (final_r1, bax))
 
+@memo.memoized()
 def _tone_r2(tone_r1, init_r1):
   """Get second round tone."""
   tone_r2 = tone_r1
@@ -108,147 +136,297 @@ def _tone_r2(tone_r1, init_r1):
     tone_r2 = '4'
   elif tone_r1 == '4' and init_r1[0] == 'V':
     tone_r2 = '2'
+  if trace.ACTIVE:
+    trace.hit('tone_r2: %s to %s', tone_r1, tone_r2)
   return tone_r2
 
+@memo.memoized()
 def _init_r2(init_r1, tone_r2):
   """Get second round initial."""
   init_r2 = init_r1
   if init_r1[0] == 'V':
     if tone_r2 in ['2', '3', '4']:
+      if trace.ACTIVE:
+        trace.hit('init_r2: V devoiced unaspirated')
       init_r2 = {'p': 'b', 't': 'd', 'k': 'g', 'h': 'h', 'f': 'f',
                  'c': 'z', 's': 's', 'ch': 'zh', 'sh': 'sh'}[init_r1[1:]]
     else:
       assert tone_r2 == '1'
+      if trace.ACTIVE:
+        trace.hit('init_r2: V devoiced aspirated')
       init_r2 = init_r1[1:]
   elif init_r1[0] == 'v':
+    if trace.ACTIVE:
+      trace.hit('init_r2: v dropped')
     init_r2 = init_r1[1:]
   if init_r2 in ['w', '0']:
+    if trace.ACTIVE:
+      trace.hit('init_r2: %s to zero', init_r2)
     init_r2 = ''
   return init_r2
 
-def _medial(division, open_, init_r2):
+@memo.memoized()
+def _medial(division, open_, init_r2):  # pylint: disable=too-many-branches
   """Find the medial."""
   if division == 1:
     med_1 = ''
   elif division == 2:
     if init_r2 in ('g', 'k', 'h'):
+      if trace.ACTIVE:
+        trace.hit('medial: division 2 velar gets i')
       med_1 = 'i'
     else:
       med_1 = ''
   else:
     med_1 = 'i'
   if init_r2 in ('f', 'Vf', 'vw'):
+    if trace.ACTIVE:
+      trace.hit('medial: labiodental drops i')
     med_1 = ''
   if open_:
     med_2 = ''
   else:
     med_2 = 'u'
   if init_r2 == 'vw':
+    if trace.ACTIVE:
+      trace.hit('medial: vw gets u')
     med_2 = 'u'
   med = med_1 + med_2
   if med == 'iu':
+    if trace.ACTIVE:
+      trace.hit('medial: iu to v')
     med = 'v'
   return med
 
+@memo.memoized()
 def _final_r2(medial, final_r1, division, tone_r1):
   """Find the round-2 final."""
   final_r2 = medial + final_r1
-  final_r2 = {'vang': 'wang', 'ieng': 'ing', 'ueng': 'ong', 'veng': 'iong',
-              'ien': 'in', 'uen': 'un', 'ven': 'vn', 'ii': 'i', 'vi': 'ui',
-              'iu': 'v', 'io': 'ia', 'ia': 'ie', 'iou': 'iu'}.get(final_r2, final_r2)
+  subst = {'vang': 'wang', 'ieng': 'ing', 'ueng': 'ong', 'veng': 'iong',
+           'ien': 'in', 'uen': 'un', 'ven': 'vn', 'ii': 'i', 'vi': 'ui',
+           'iu': 'v', 'io': 'ia', 'ia': 'ie', 'iou': 'iu'}.get(final_r2)
+  if subst:
+    if trace.ACTIVE:
+      trace.hit('final_r2: %s to %s', final_r2, subst)
+    final_r2 = subst
   if final_r2 == 'iai':
     if division == 2:
       final_r2 = 'ie'
     else:
       final_r2 = 'i'
+    if trace.ACTIVE:
+      trace.hit('final_r2: iai to %s', final_r2)
   if tone_r1 == '4':
-    final_r2 = {'an': 'a', 'ian': 'ie', 'uan': 'o', 'van': 've', 'en': 'e',
-                'in': 'i', 'un': 'u', 'vn': 've', 'ang': 'o', 'iang': 've',
-                'uang': 'uo', 'eng': 'e', 'ing': 'i', 'ong': 'u',
-                'iong': 'v'}.get(final_r2, final_r2)
+    subst = {'an': 'a', 'ian': 'ie', 'uan': 'o', 'van': 've', 'en': 'e',
+             'in': 'i', 'un': 'u', 'vn': 've', 'ang': 'o', 'iang': 've',
+             'uang': 'uo', 'eng': 'e', 'ing': 'i', 'ong': 'u',
+             'iong': 'v'}.get(final_r2)
+    if subst:
+      if trace.ACTIVE:
+        trace.hit('final_r2: entering tone %s to %s', final_r2, subst)
+      final_r2 = subst
   return final_r2
 
-def _substituted_final_r2(init_r2, final_r2):
+@memo.memoized()
+def _substituted_final_r2(init_r2, final_r2):  # pylint: disable=too-many-branches
   """Cleanups of the final."""
   if (init_r2 in ('zh', 'ch', 'sh', 'r') and final_r2.startswith('i') and
       final_r2 not in ('i', 'in', 'ing')):
+    if trace.ACTIVE:
+      trace.hit('substituted_final_r2: retroflex drops i')
     final_r2 = final_r2[1:]
   if init_r2 == '':
-    final_r2 = {'ong': 'weng', 'un': 'wen', 'ui': 'wei', 'iu': 'you'}.get(final_r2, final_r2)
+    subst = {'ong': 'weng', 'un': 'wen', 'ui': 'wei', 'iu': 'you'}.get(final_r2)
+    if subst:
+      if trace.ACTIVE:
+        trace.hit('substituted_final_r2: %s to %s', final_r2, subst)
+      final_r2 = subst
     if final_r2[:2] in ('ia', 'ie', 'io', 'iu'):
+      if trace.ACTIVE:
+        trace.hit('substituted_final_r2: i- to y-')
       final_r2 = 'y' + final_r2[1:]
     elif final_r2.startswith('i'):
+      if trace.ACTIVE:
+        trace.hit('substituted_final_r2: y- added before i')
       final_r2 = 'y' + final_r2
     elif final_r2 == 'u':
+      if trace.ACTIVE:
+        trace.hit('substituted_final_r2: u to wu')
       final_r2 = 'wu'
     elif final_r2.startswith('u'):
+      if trace.ACTIVE:
+        trace.hit('substituted_final_r2: u- to w-')
       final_r2 = 'w' + final_r2[1:]
     elif final_r2.startswith('v'):
+      if trace.ACTIVE:
+        trace.hit('substituted_final_r2: v- to yu-')
       final_r2 = 'yu' + final_r2[1:]
   if init_r2 in ('j', 'q', 'x', 'r') and final_r2.startswith('v'):
+    if trace.ACTIVE:
+      trace.hit('substituted_final_r2: v spelled u')
     final_r2 = 'u' + final_r2[1:]
   if init_r2 not in ('b', 'p', 'm', 'f', 'w') and final_r2 == 'o':
+    if trace.ACTIVE:
+      trace.hit('substituted_final_r2: o to uo')
     final_r2 = 'uo'
   return final_r2
 
-def expected_msm_syllable(syl):
-  """Directly implementing steps in MC_to_mand.pdf."""
-  logging.debug('baxter = %s', syl.baxter)
+# The step functions that expected_msm_syllable can be given alternatives to
+# (see baxter.experiment). The steps it does inline are fixed.
+Rules = collections.namedtuple('Rules', [
+    'init_r1', 'tone_r1', 'final_r1', 'division', 'remove_f',
+    'simplify_final_r1', 'tone_r2', 'init_r2', 'medial', 'final_r2',
+    'substituted_final_r2'])
+
+# The rules as they're defined above.
+RULES = Rules(_init_r1, _tone_r1, _final_r1, _division, _remove_f,
+              _simplify_final_r1, _tone_r2, _init_r2, _medial, _final_r2,
+              _substituted_final_r2)
+
+def expected_msm_syllable(syl, rules=RULES):
+  """Directly implementing steps in MC_to_mand.pdf.
+
+  rules (a Rules) gives the step functions to use, for trying out variants.
+  """
+  tracer = trace.ACTIVE
+  if tracer is None:
+    return _expected_msm_syllable(syl, rules, None)
+  # Only trace if the Tracer selects this syllable, and stop attributing rule
+  # hits to it once it's converted.
+  t = tracer.start(syl.baxter)
+  try:
+    return _expected_msm_syllable(syl, rules, t)
+  finally:
+    tracer.finish()
+
+def _expected_msm_syllable(syl, rules, t):  # pylint: disable=too-many-branches
+  """Implements expected_msm_syllable, recording to the Trace t (if any)."""
   # steps 1, 4, and 6 occur in the constructor of MiddleChineseSyllable.
   # step 2 maps initials to round-1 initials.
-  init_r1 = _init_r1(syl.baxter_initial)
-  logging.debug('init_r1 = %s', init_r1)
+  init_r1 = rules.init_r1(syl.baxter_initial)
+  if t:
+    t.record(2, 'init_r1', init_r1)
   # step 3 maps tones to round-1 tones (and changes ru final stops).
-  tone_r1 = _tone_r1(syl.tone)
-  logging.debug('tone_r1 = %s', tone_r1)
+  tone_r1 = rules.tone_r1(syl.tone)
+  if t:
+    t.record(3, 'tone_r1', tone_r1)
   # step 5 moves palatal information to final.
-  final_r1 = _final_r1(syl.baxter_initial, syl.baxter_final)
-  logging.debug('final_r1 = %s', final_r1)
+  final_r1 = rules.final_r1(syl.baxter_initial, syl.baxter_final)
+  if t:
+    t.record(5, 'final_r1', final_r1)
   # step 7 determines division
   # TODO Move division into the MiddleChineseSyllable class.
-  division = _division(final_r1)
-  logging.debug('division = %s', division)
+  division = rules.division(final_r1)
+  if t:
+    t.record(7, 'division', division)
   # step 8 removes w's in closed syllables.
-  if not syl.open:
+  if not syl.open and 'w' in final_r1:
+    if t:
+      t.hit('step 8: closed syllable drops w')
     final_r1 = final_r1.replace('w', '')
   # step 9 changes -m to -n.
   if final_r1[-1] == 'm':
+    if t:
+      t.hit('step 9: -m to -n')
     final_r1 = final_r1[:-1] + 'n'
-  logging.debug('final_r1 (after 8&9) = %s', final_r1)
+  if t:
+    t.record(9, 'final_r1', final_r1)
   # step 10 makes f appear.
-  init_r1 = _remove_f(init_r1, final_r1)
-  logging.debug('init_r1 (after 10) = %s', init_r1)
+  init_r1 = rules.remove_f(init_r1, final_r1)
+  if t:
+    t.record(10, 'init_r1', init_r1)
   # step 11 simplifies the round-1 finals.
-  final_r1 = _simplify_final_r1(final_r1, syl.baxter)
-  logging.debug('final_r1 (after 11) = %s', final_r1)
+  final_r1 = rules.simplify_final_r1(final_r1, syl.baxter)
+  if t:
+    t.record(11, 'final_r1', final_r1)
   # step 12 changes Vh to v0 in division 3.
   if init_r1 == 'Vh' and division == 3:
+    if t:
+      t.hit('step 12: Vh to v0')
     init_r1 = 'v0'
-  logging.debug('init_r1 (after 12) = %s', init_r1)
+  if t:
+    t.record(12, 'init_r1', init_r1)
   # step 13 calculates round-2 tones.
-  tone_r2 = _tone_r2(tone_r1, init_r1)
-  logging.debug('tone_r2 = %s', tone_r2)
+  tone_r2 = rules.tone_r2(tone_r1, init_r1)
+  if t:
+    t.record(13, 'tone_r2', tone_r2)
   # step 14 calculates round-2 initials.
-  init_r2 = _init_r2(init_r1, tone_r2)
-  logging.debug('init_r2 = %s', init_r2)
+  init_r2 = rules.init_r2(init_r1, tone_r2)
+  if t:
+    t.record(14, 'init_r2', init_r2)
   # step 15 finds medials.
-  medial = _medial(division, syl.open, init_r2)
-  logging.debug('medial = %s', medial)
+  medial = rules.medial(division, syl.open, init_r2)
+  if t:
+    t.record(15, 'medial', medial)
   # step 16-17 creates the round-2 final.
-  final_r2 = _final_r2(medial, final_r1, division, tone_r1)
-  logging.debug('final_r2 = %s', final_r2)
+  final_r2 = rules.final_r2(medial, final_r1, division, tone_r1)
+  if t:
+    t.record(17, 'final_r2', final_r2)
   # step 18 palatalizes initials.
-  if medial in ('i', 'v'):
+  if medial in ('i', 'v') and init_r2 in ('g', 'z', 'k', 'c', 'h', 's'):
+    if t:
+      t.hit('step 18: %s palatalized' % init_r2)
     init_r2 = {'g': 'j', 'z': 'j', 'k': 'q', 'c': 'q', 'h': 'x', 's': 'x'}.get(init_r2, init_r2)
-  logging.debug('init_r2 (after 18) = %s', init_r2)
+  if t:
+    t.record(18, 'init_r2', init_r2)
   # step 19 does various cleanups of the final.
-  final_r2 = _substituted_final_r2(init_r2, final_r2)
-  logging.debug('final_r2 (after 19) = %s', final_r2)
+  final_r2 = rules.substituted_final_r2(init_r2, final_r2)
+  if t:
+    t.record(19, 'final_r2', final_r2)
   # step 20 puts it all together.
-  return init_r2 + final_r2 + tone_r2
+  msm = init_r2 + final_r2 + tone_r2
+  if t:
+    t.record(20, 'msm', msm)
+  return msm
+
+def _compile_msm_syllables():
+  """Run expected_msm_syllable over the whole inventory.
+
+  Returns: A dict from (initial, final, tone) to the MSM syllable. Syllables
+  that the steps reject are left out.
+  """
+  table = {}
+  # Each syllable is only converted once, so memoizing would just fill the
+  # caches with syllables that real data may never use.
+  enabled = memo.is_enabled()
+  memo.set_enabled(False)
+  try:
+    for bax in mc.all_syllables():
+      syl = mc.MiddleChineseSyllable(bax)
+      try:
+        msm = expected_msm_syllable(syl)
+      except ValueError:
+        continue
+      table[syl.baxter_initial, syl.baxter_final, syl.tone] = msm
+  finally:
+    memo.set_enabled(enabled)
+  return table
+
+_MSM_SYLLABLES = _compile_msm_syllables()
+
+def compiled_msm_syllables():
+  """Get a copy of the precomputed table used by compiled_msm_syllable.
+
+  Returns: A dict from (initial, final, tone) to the MSM syllable.
+  """
+  return dict(_MSM_SYLLABLES)
+
+def compiled_msm_syllable(syl):
+  """Same as expected_msm_syllable, but looked up in a precomputed table.
+
+  Syllables outside of the table fall back to expected_msm_syllable (which
+  either handles them or raises the usual error), as do syllables selected by
+  an active trace.Tracer.
+  """
+  if trace.ACTIVE is not None and trace.ACTIVE.wants(syl.baxter):
+    return expected_msm_syllable(syl)
+  try:
+    return _MSM_SYLLABLES[syl.baxter_initial, syl.baxter_final, syl.tone]
+  except KeyError:
+    return expected_msm_syllable(syl)
 
 def expected_pinyin(syl):
   """Get the expected reflex in MSM, as represented in Pinyin."""
-  tmp = expected_msm_syllable(syl)
+  tmp = compiled_msm_syllable(syl)
   #assert tmp[-1] == expected_msm_tone(syl)
   return tmp
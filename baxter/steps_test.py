@@ -10,6 +10,7 @@ class FailingTest(...):
     ...
 """
 
+import os.path
 import unittest
 
 from . import mc
@@ -55,3 +56,31 @@ class StepsTest(unittest.TestCase):
     self.expect_pinyin('dak', 'duo2')
     self.expect_pinyin('hwat', 'huo2')
 
+def _convert_or_error(func, syl):
+  """Call func on syl, returning the type of exception if one is raised."""
+  try:
+    return func(syl)
+  except Exception as e:  # pylint: disable=broad-except
+    return type(e)
+
+class CompiledTest(unittest.TestCase):
+  """Tests that the compiled table agrees with the step-by-step version."""
+
+  def test_mc1_syllables(self):
+    """Every syllable in mc1.csv is converted identically."""
+    fname = os.path.join(os.path.dirname(__file__), 'data/mc1.csv')
+    with open(fname) as f:
+      baxters = set(line.split(',')[2].strip() for line in f.readlines()[1:])
+    for bax in sorted(baxters - set([''])):
+      syl = mc.MiddleChineseSyllable(bax)
+      expected = _convert_or_error(steps.expected_msm_syllable, syl)
+      actual = _convert_or_error(steps.compiled_msm_syllable, syl)
+      if expected != actual:
+        self.fail('Expected %r to convert to %r; got %r' % (
+            bax, expected, actual))
+
+  def test_fallback(self):
+    """Syllables outside the table still go through the steps."""
+    syl = mc.MiddleChineseSyllable('trhiwk')
+    with self.assertRaises(ValueError):
+      steps.compiled_msm_syllable(syl)
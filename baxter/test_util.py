@@ -2,6 +2,17 @@
 
 import functools
 import logging
+import StringIO
+import sys
+
+from . import mc
+from . import trace
+
+def record(hanzi, baxter, pinyin, gsr='', hydzd='', guangyun=''):
+  """Make a record like the ones mc2pinyin.read_records yields."""
+  return {'hanzi': hanzi, 'pinyin': pinyin,
+          'baxter': mc.MiddleChineseSyllable.of(baxter), 'gsr': gsr,
+          'hydzd': hydzd, 'guangyun': guangyun}
 
 def debug(f):
   """Decorator that turns on debug logging for the duration of the function."""
@@ -13,14 +24,40 @@ def debug(f):
   return decorated_function
 
 class DebugOn(object):
-  """Context handler to temporarily turn on debug logging."""
+  """Context handler to temporarily turn on debug logging.
+
+  Every syllable converted meanwhile is traced, with each step logged.
+  """
 
   def __init__(self):
     self._old_level = None
+    self._tracer = trace.Tracer(log=True)
 
   def __enter__(self):
     self._old_level = logging.getLogger().level
     logging.getLogger().setLevel(logging.DEBUG)
+    self._tracer.__enter__()
 
   def __exit__(self, et, ev, tb):
+    self._tracer.__exit__(et, ev, tb)
     logging.getLogger().setLevel(self._old_level)
+
+class Quiet(object):
+  """Context handler to temporarily discard what's written to stderr.
+
+  E.g., to load the data without printing a report of its rejected rows. With
+  stdout, what's written to stdout (e.g., summaries) is discarded too.
+  """
+
+  def __init__(self, stdout=False):
+    self._stdout = stdout
+    self._old = None
+
+  def __enter__(self):
+    self._old = sys.stdout, sys.stderr
+    sys.stderr = StringIO.StringIO()
+    if self._stdout:
+      sys.stdout = StringIO.StringIO()
+
+  def __exit__(self, et, ev, tb):
+    sys.stdout, sys.stderr = self._old
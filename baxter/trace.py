@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Structured traces of the conversion steps.
+
+The steps record their intermediate values only while a Tracer is active, and
+only for the syllables it selects. When no Tracer is active, all they pay is a
+check of ACTIVE.
+
+  with trace.Tracer(['trhik']) as tracer:
+    steps.expected_pinyin(mc.MiddleChineseSyllable('trhik'))
+  print tracer.traces[0]['final_r2']
+"""
+
+import logging
+
+# The Tracer currently collecting traces (if any).
+ACTIVE = None
+
+class Trace(object):
+  """The intermediate values of converting one syllable, in step order."""
+
+  def __init__(self, baxter, log=False):
+    self.baxter = baxter
+    # (step, name, value) tuples.
+    self.values = []
+    # The rule branches that fired, in order (see hit).
+    self.hits = []
+    self._log = log
+    if log:
+      logging.debug('baxter = %s', baxter)
+
+  def record(self, step, name, value):
+    """Record the value of a variable (e.g., 'init_r1') after a step."""
+    self.values.append((step, name, value))
+    if self._log:
+      logging.debug('%s (step %d) = %s', name, step, value)
+
+  def hit(self, rule):
+    """Record that a rule branch fired."""
+    self.hits.append(rule)
+    if self._log:
+      logging.debug('rule: %s', rule)
+
+  def __getitem__(self, name):
+    """Get the last recorded value of a variable."""
+    for _, n, value in reversed(self.values):
+      if n == name:
+        return value
+    raise KeyError(name)
+
+  def step_values(self, step):
+    """Get the values recorded by a step, as a dict."""
+    return dict((n, value) for s, n, value in self.values if s == step)
+
+  def __repr__(self):
+    return 'Trace(%r, %r, %r)' % (self.baxter, self.values, self.hits)
+
+  def __str__(self):
+    lines = ['baxter = %s' % self.baxter]
+    lines.extend('%d. %s = %s' % v for v in self.values)
+    lines.extend('rule: %s' % rule for rule in self.hits)
+    return '\n'.join(lines)
+
+class Tracer(object):
+  """Context manager that collects a Trace per converted syllable.
+
+  baxters selects the syllables (in Baxter's notation) to trace; by default,
+  every syllable is traced. With log, each value is also logged at debug
+  level as it's recorded. Traced syllables always go through the steps, even
+  when their result could be looked up.
+  """
+
+  def __init__(self, baxters=None, log=False):
+    self._baxters = None if baxters is None else frozenset(baxters)
+    self._log = log
+    self._previous = None
+    self.traces = []
+    # The Trace of the syllable being converted (None if it isn't selected).
+    self.current = None
+
+  def wants(self, baxter):
+    """Whether the syllable should be traced."""
+    return self._baxters is None or baxter in self._baxters
+
+  def start(self, baxter):
+    """Start a Trace for the syllable, or return None if it isn't selected."""
+    if not self.wants(baxter):
+      self.current = None
+      return None
+    self.current = Trace(baxter, self._log)
+    self.traces.append(self.current)
+    return self.current
+
+  def finish(self):
+    """End the syllable being converted (whether or not it was traced)."""
+    self.current = None
+
+  def __enter__(self):
+    global ACTIVE  # pylint: disable=global-statement
+    self._previous, ACTIVE = ACTIVE, self
+    return self
+
+  def __exit__(self, et, ev, tb):
+    global ACTIVE  # pylint: disable=global-statement
+    ACTIVE = self._previous
+
+def traced(baxter):
+  """Whether the active Tracer (if any) selects the syllable."""
+  return ACTIVE is not None and ACTIVE.wants(baxter)
+
+def hit(rule, *args):
+  """Record that a rule branch fired for the syllable being traced (if any).
+
+  The rule is formatted with args (as by the % operator) only if it's recorded.
+  The steps only call this if ACTIVE is set, so that with tracing off, a rule
+  branch costs a check rather than a call.
+  """
+  if ACTIVE is not None and ACTIVE.current is not None:
+    ACTIVE.current.hit(rule % args if args else rule)
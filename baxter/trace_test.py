@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Tests for trace module."""
+
+import unittest
+
+from . import batch
+from . import mc
+from . import steps
+from . import trace
+
+class TracerTest(unittest.TestCase):
+  """Tests for tracing the conversion steps."""
+
+  def test_off_by_default(self):
+    """Nothing is traced without an active Tracer."""
+    self.assertIsNone(trace.ACTIVE)
+    self.assertFalse(trace.traced('trhik'))
+
+  def test_trace_values(self):
+    """The intermediate values of each step are recorded."""
+    with trace.Tracer() as tracer:
+      self.assertEqual('chi4', steps.expected_pinyin(
+          mc.MiddleChineseSyllable('trhik')))
+    self.assertIsNone(trace.ACTIVE)
+    self.assertEqual(1, len(tracer.traces))
+    t = tracer.traces[0]
+    self.assertEqual('trhik', t.baxter)
+    self.assertEqual('ch', t.step_values(2)['init_r1'])
+    self.assertEqual('ing', t.step_values(5)['final_r1'])
+    self.assertEqual(3, t['division'])
+    self.assertEqual('eng', t['final_r1'])
+    self.assertEqual('i', t['final_r2'])
+    self.assertEqual('chi4', t['msm'])
+    self.assertRaises(KeyError, lambda: t['nonexistent'])
+
+  def test_selected_syllables(self):
+    """Only the selected syllables are traced, through every entry point."""
+    with trace.Tracer(['tha', 'dak']) as tracer:
+      for bax in ['tha', 'tsha', 'dak']:
+        steps.expected_pinyin(mc.MiddleChineseSyllable(bax))
+      pinyin, _ = batch.convert_batch(['tsha', 'dak', 'tha', 'dak'])
+    self.assertEqual(['tha', 'dak', 'dak', 'tha'],
+                     [t.baxter for t in tracer.traces])
+    self.assertEqual(['cuo1', 'duo2', 'tuo1', 'duo2'], list(pinyin))
+
+  def test_finished(self):
+    """Rule hits after a conversion aren't attributed to its trace."""
+    with trace.Tracer() as tracer:
+      steps.expected_pinyin(mc.MiddleChineseSyllable('trhik'))
+      self.assertIsNone(tracer.current)
+      hits = list(tracer.traces[0].hits)
+      trace.hit('final_r1: -%s to -%s', 'k', 'ng')
+    self.assertEqual(hits, tracer.traces[0].hits)
+
+  def test_nested(self):
+    """An inner Tracer takes over until it exits."""
+    with trace.Tracer() as outer:
+      with trace.Tracer(['tha']) as inner:
+        steps.expected_pinyin(mc.MiddleChineseSyllable('tha'))
+      steps.expected_pinyin(mc.MiddleChineseSyllable('dak'))
+    self.assertEqual(['tha'], [t.baxter for t in inner.traces])
+    self.assertEqual(['dak'], [t.baxter for t in outer.traces])
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for the parse -> convert -> compare hot paths.
+
+python -m bench.run -o /tmp/bench.json
+python -m bench.run --baseline /tmp/bench.json
+
+Each benchmark is a stage run on a workload, in a fresh process (so that peak
+memory is the stage's own). Results are written as json, keyed by
+'stage/workload'. With --baseline, throughput is compared against an earlier
+run, and the exit status is 1 if any benchmark regressed by more than the
+tolerance.
+
+Workloads:
+  synthetic: Every syllable in the inventory (mc.all_syllables).
+  mc1: The syllables of Baxter's records, in order (with repeats).
+  scaled: mc1, repeated --scale times.
+  ytenx: The html snapshot that extract_records reads.
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import os.path
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import timeit
+
+from baxter import batch
+from baxter import mc
+from baxter import mc2pinyin
+from baxter import steps
+from baxter import test_util
+from ytenx import extract_records
+
+_DIRNAME = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_MC1 = os.path.join(_DIRNAME, 'baxter/data/mc1.csv')
+_YTENX = os.path.join(_DIRNAME, 'ytenx/data_20170503')
+_PERCENTILES = [50, 90, 99]
+
+def _mc1_spellings():
+  """Get the Baxter column of mc1.csv, skipping unparseable rows."""
+  with test_util.Quiet(stdout=True):
+    return [r['baxter'].baxter for r in mc2pinyin.read_records(_MC1)]
+
+def _spellings(workload, scale):
+  """Get the syllables (in Baxter's notation) of a syllable workload."""
+  if workload == 'synthetic':
+    return list(mc.all_syllables())
+  if workload == 'mc1':
+    return _mc1_spellings()
+  if workload == 'scaled':
+    return _mc1_spellings() * scale
+  raise ValueError('Not a syllable workload: %s' % workload)
+
+def _convertible(spellings):
+  """Get the syllables that the steps convert (rather than reject)."""
+  syllables = []
+  for bax in spellings:
+    syl = mc.MiddleChineseSyllable(bax)
+    try:
+      steps.expected_msm_syllable(syl)
+    except (ValueError, IndexError):
+      continue
+    syllables.append(syl)
+  return syllables
+
+def _time_each(func, items):
+  """Time func on every item: once straight through, then call by call.
+
+  Returns: (total seconds for the straight-through pass, per-call latencies)
+  """
+  timer = timeit.default_timer
+  start = timer()
+  for item in items:
+    func(item)
+  total = timer() - start
+  latencies = []
+  for item in items:
+    start = timer()
+    func(item)
+    latencies.append(timer() - start)
+  return total, latencies
+
+def _time_runs(func, repeat):
+  """Time repeated calls of func. Returns (median seconds, latencies)."""
+  timer = timeit.default_timer
+  latencies = []
+  for _ in range(repeat):
+    start = timer()
+    func()
+    latencies.append(timer() - start)
+  return sorted(latencies)[len(latencies) // 2], latencies
+
+# pylint: disable=protected-access
+def _bench_split(spellings, _):
+  return len(spellings), _time_each(mc._split_baxter, spellings)
+# pylint: enable=protected-access
+
+def _bench_syllable_init(spellings, _):
+  return len(spellings), _time_each(mc.MiddleChineseSyllable, spellings)
+
+def _bench_reference_msm(spellings, _):
+  syllables = _convertible(spellings)
+  return len(syllables), _time_each(steps.expected_msm_syllable, syllables)
+
+def _bench_compiled_msm(spellings, _):
+  syllables = _convertible(spellings)
+  return len(syllables), _time_each(steps.compiled_msm_syllable, syllables)
+
+def _bench_convert_batch(spellings, repeat):
+  return len(spellings), _time_runs(
+      lambda: batch.convert_batch(spellings), repeat)
+
+def _bench_pipeline(spellings, repeat):
+  """Run mc2pinyin.pipeline on a CSV with the given syllables."""
+  tmpdir = tempfile.mkdtemp()
+  try:
+    input_file = os.path.join(tmpdir, 'input.csv')
+    output_file = os.path.join(tmpdir, 'output.csv')
+    with open(_MC1) as f:
+      header = f.readline()
+      body = [line.rstrip('\r\n') + '\n' for line in f]
+    copies = max(1, int(round(len(spellings) / float(len(body)))))
+    with open(input_file, 'w') as f:
+      f.write(header)
+      for _ in range(copies):
+        f.writelines(body)
+    with test_util.Quiet(stdout=True):
+      num = sum(1 for _ in mc2pinyin.read_records(input_file))
+    def run():
+      """Run the pipeline once."""
+      with test_util.Quiet(stdout=True):
+        mc2pinyin.pipeline(input_file, output_file)
+    return num, _time_runs(run, repeat)
+  finally:
+    shutil.rmtree(tmpdir)
+
+def _bench_extract_records(_, repeat):
+  num = len(os.listdir(_YTENX))
+  return num, _time_runs(
+      lambda: collections.deque(extract_records.iter_records(_YTENX), 0),
+      repeat)
+
+# Stages, with the function that runs them and the workloads they run on.
+_STAGES = collections.OrderedDict([
+    ('split_baxter', (_bench_split, ['synthetic', 'mc1', 'scaled'])),
+    ('syllable_init',
+     (_bench_syllable_init, ['synthetic', 'mc1', 'scaled'])),
+    ('reference_msm',
+     (_bench_reference_msm, ['synthetic', 'mc1', 'scaled'])),
+    ('compiled_msm', (_bench_compiled_msm, ['synthetic', 'mc1', 'scaled'])),
+    ('convert_batch', (_bench_convert_batch, ['mc1', 'scaled'])),
+    ('pipeline', (_bench_pipeline, ['mc1', 'scaled'])),
+    ('extract_records', (_bench_extract_records, ['ytenx']))])
+
+def _percentile(sorted_values, p):
+  """Get the p-th percentile (nearest rank) of sorted values."""
+  rank = max(0, min(len(sorted_values) - 1,
+                    int(round(p / 100.0 * len(sorted_values))) - 1))
+  return sorted_values[rank]
+
+def _run_benchmark(args):
+  """Run one stage on one workload (in a fresh worker process)."""
+  stage, workload, scale, repeat = args
+  func, _ = _STAGES[stage]
+  items = None if workload == 'ytenx' else _spellings(workload, scale)
+  start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  num, (seconds, latencies) = func(items, repeat)
+  peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  latencies.sort()
+  return {'items': num, 'seconds': seconds,
+          'items_per_sec': num / seconds if seconds else None,
+          'latency_us': dict(('p%d' % p, 1e6 * _percentile(latencies, p))
+                             for p in _PERCENTILES),
+          'peak_rss_kb': peak_rss, 'rss_growth_kb': peak_rss - start_rss}
+
+def run_benchmarks(stages=None, workloads=None, scale=20, repeat=3):
+  """Run the benchmarks, each in its own process.
+
+  stages and workloads restrict which benchmarks run (by default, all of
+  them). For stages that run a whole batch at once (rather than one syllable
+  at a time), latencies are per run, and the median of repeat runs is used.
+
+  Returns: A dict of results, keyed by 'stage/workload'.
+  """
+  results = collections.OrderedDict()
+  # A fresh process per task, so that ru_maxrss doesn't carry over.
+  pool = multiprocessing.Pool(1, maxtasksperchild=1)
+  try:
+    for stage, (_, stage_workloads) in _STAGES.items():
+      if stages and stage not in stages:
+        continue
+      for workload in stage_workloads:
+        if workloads and workload not in workloads:
+          continue
+        key = '%s/%s' % (stage, workload)
+        sys.stderr.write('Running %s...\n' % key)
+        results[key] = pool.apply(_run_benchmark,
+                                  ((stage, workload, scale, repeat),))
+  finally:
+    pool.close()
+    pool.join()
+  return results
+
+def compare(results, baseline, tolerance=0.1):
+  """Compare throughput against a baseline.
+
+  Returns: A list of (key, baseline items/sec, items/sec) for the benchmarks
+    whose throughput dropped by more than tolerance (a fraction).
+  """
+  regressions = []
+  for key, result in results.items():
+    if key not in baseline:
+      continue
+    old, new = baseline[key]['items_per_sec'], result['items_per_sec']
+    if old and new is not None and new < old * (1 - tolerance):
+      regressions.append((key, old, new))
+  return regressions
+
+def main():
+  """Run the benchmarks from the command line."""
+  parser = argparse.ArgumentParser(
+      description='Benchmarks the parse -> convert -> compare hot paths.')
+  parser.add_argument('-o', '--output_file', dest='output_file', type=str,
+                      help='File to write the results to (default: stdout).')
+  parser.add_argument('--baseline', dest='baseline', type=str,
+                      help='Results of an earlier run to compare against.')
+  parser.add_argument('--tolerance', dest='tolerance', type=float, default=0.1,
+                      help=('Fraction of throughput that may be lost before '
+                            'a benchmark counts as a regression.'))
+  parser.add_argument('--stages', dest='stages', type=str,
+                      help='Comma-separated stages to run (default: all).')
+  parser.add_argument('--workloads', dest='workloads', type=str,
+                      help='Comma-separated workloads to run (default: all).')
+  parser.add_argument('--scale', dest='scale', type=int, default=20,
+                      help='Number of copies of mc1 in the scaled workload.')
+  parser.add_argument('--repeat', dest='repeat', type=int, default=3,
+                      help='Runs of each whole-batch stage.')
+  args = parser.parse_args()
+  stages = args.stages.split(',') if args.stages else None
+  for stage in stages or []:
+    if stage not in _STAGES:
+      parser.error('Unknown stage %r; expected one of %s' % (
+          stage, ', '.join(_STAGES)))
+  workloads = args.workloads.split(',') if args.workloads else None
+  results = run_benchmarks(stages, workloads, args.scale, args.repeat)
+  report = {'python': platform.python_version(), 'scale': args.scale,
+            'results': results}
+  encoded = json.dumps(report, indent=2, separators=(',', ': '),
+                       sort_keys=True)
+  if args.output_file:
+    with open(args.output_file, 'w') as f:
+      f.write(encoded + '\n')
+  else:
+    print encoded
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.tolerance)
+    for key, old, new in regressions:
+      sys.stderr.write('REGRESSION %s: %.0f -> %.0f items/sec (%+.1f%%)\n' % (
+          key, old, new, 100.0 * (new - old) / old))
+    if regressions:
+      sys.exit(1)
+    sys.stderr.write('No regressions against %s\n' % args.baseline)
+
+if __name__ == '__main__':
+  main()
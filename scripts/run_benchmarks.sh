@@ -0,0 +1,4 @@
+#!/bin/bash
+set -e
+cd "$(git rev-parse --show-toplevel)"
+python -m bench.run $@
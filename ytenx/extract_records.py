@@ -2,10 +2,16 @@
 """Extracts numbered ytenx guangyun records from html pages."""
 
 import argparse
+import collections
+import gzip
+import hashlib
+import itertools
 import json
+import multiprocessing
 import os
 import os.path
 import re
+import zlib
 from lxml import html
 
 FILE_REGEX = r'(\d+).html$'
@@ -20,7 +26,7 @@ def get_record_id(fname):
 
 def text(elem):
   """Extract all text from an element (and strip leading and trailing space)."""
-  return ''.join(txt for txt in elem.xpath('.//text()')).strip()
+  return elem.text_content().strip()
 
 class FieldSpec(object):
   """FieldSpec declaratively specified how to process a td into a field."""
@@ -31,9 +37,9 @@ class FieldSpec(object):
     self._store = store
     self._func = func
 
-  def _matches(self, td_header):
+  def _matches(self, td_header, header_text):
     if isinstance(self._header, basestring):
-      return self._header == text(td_header)
+      return self._header == header_text
     else:
       return self._header(td_header)
 
@@ -48,20 +54,25 @@ class FieldSpec(object):
   def __repr__(self):
     return 'FieldSpec(%r, %r, %r)' % (self._header, self._store, self._func)
 
-  def extract(self, td_header, td_value, record):
+  def extract(self, td_header, td_value, record, header_text=None):
     """Extract the value for the field from the td element.
 
+    header_text is text(td_header), if it's already been computed.
+
     Returns: True if the row was matched; False otherwise.
     """
-    if self._matches(td_header):
+    if header_text is None:
+      header_text = text(td_header)
+    if self._matches(td_header, header_text):
       self._process_and_store(td_value, record)
       return True
     return False
 
 def _apply_field_specs(specs, td_header, td_value, record):
   """Apply FieldSpecs until one matches, returning its index."""
+  header_text = text(td_header)
   for i, s in enumerate(specs):
-    if s.extract(td_header, td_value, record):
+    if s.extract(td_header, td_value, record, header_text):
       return i
   return None
 
@@ -77,8 +88,8 @@ class TableSpec(object):
   def extract(self, t, record):
     """Process a table into a record according to the specification."""
     unmatched, matched = list(self._field_specs), []
-    for tr in t.xpath('./tr'):
-      tds = tr.xpath('./td')
+    for tr in t.iterchildren('tr'):
+      tds = tr.findall('td')
       if len(tds) != 2:
         raise ValueError(
             'Expected a two column table; got row with %d: %s' % (
@@ -115,40 +126,308 @@ GY_TABLE = TableSpec(
      FieldSpec(u'韻系', 'row'),  # TODO Is this what it means?
      FieldSpec(u'韻攝', 'she'),
      FieldSpec(u'廣韻目次', 'section')])
+# Bump this whenever GY_TABLE (or anything else affecting the records that
+# extract_record returns) changes, so that cached records are re-extracted.
+GY_TABLE_VERSION = 2
 
-def extract_records(input_dir, output_file):
-  """Extracts guangyun records from a directory of ytenx html files."""
-  print 'input_dir: %s, output_file: %s' % (input_dir, output_file)
-  records = {}
-  for fname in os.listdir(input_dir):
-    print 'Processing file %s' % fname
-    record = {'id': get_record_id(fname)}
-    with open(os.path.join(input_dir, fname)) as f:
-      tree = html.parse(f)
-    tables = tree.xpath('//table')
-    if len(tables) != 4:
+def contained_chars(t):
+  """Extract the characters of a small rhyme from its table of definitions."""
+  chars = []
+  for tr in t.iterchildren('tr'):
+    tds = tr.findall('td')
+    if len(tds) != 2:
       raise ValueError(
-          'Expected 4 table elements in the html of %s, got %d' % (fname,
-                                                                   len(tables)))
-    gy_entry, romanization1, romanization2, containing_chars = tables
-    GY_TABLE.extract(gy_entry, record)
-    # TODO Other tables
-    _, _, _ = romanization1, romanization2, containing_chars
-    # TODO Post-processing/validation (id == number, section is consistent)
-    records[record['id']] = record
-  with open(output_file, 'w') as f:
-    json.dump(records, f)
+          'Expected a two column table; got row with %d: %s' % (
+              len(tds), text(tr)))
+    chars.append(text(tds[0]))
+  return chars
+
+def parse_tables(contents, fname):
+  """Parse just the table elements out of the html of a page.
+
+  Only the span from the first table to the end of the last one is parsed,
+  which skips the (sizable) header and navigation.
+  """
+  start, end = contents.find('<table'), contents.rfind('</table>')
+  tables = []
+  if start >= 0 and end >= 0:
+    fragment = html.fragment_fromstring(
+        contents[start:end + len('</table>')].decode('utf-8'),
+        create_parent='div')
+    tables = fragment.findall('.//table')
+  if len(tables) != 4:
+    raise ValueError(
+        'Expected 4 table elements in the html of %s, got %d' % (fname,
+                                                                 len(tables)))
+  return tables
+
+def extract_record(path):
+  """Extract the guangyun record from one ytenx html file."""
+  fname = os.path.basename(path)
+  record = {'id': get_record_id(fname)}
+  with open(path, 'rb') as f:
+    contents = f.read()
+  gy_entry, romanization1, romanization2, containing_chars = parse_tables(
+      contents, fname)
+  GY_TABLE.extract(gy_entry, record)
+  record['chars'] = contained_chars(containing_chars)
+  # TODO Other tables
+  _, _ = romanization1, romanization2
+  # TODO Post-processing/validation (id == number, section is consistent)
+  return record
+
+class ExtractionCache(object):
+  """On-disk cache of extracted records, keyed by file contents.
+
+  The cache is a json file holding GY_TABLE_VERSION and, for each html file,
+  the sha1 of its contents and the record extracted from it. A cache written
+  with a different GY_TABLE_VERSION is ignored.
+  """
+
+  def __init__(self, path):
+    """Load the cache from path (if it exists)."""
+    self._path = path
+    self._entries = {}
+    if os.path.exists(path):
+      with open(path) as f:
+        cache = json.load(f)
+      if cache.get('version') == GY_TABLE_VERSION:
+        self._entries = cache['entries']
+    self.hits, self.misses = 0, 0
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, fname, digest):
+    """Get the cached record for a file, or None if it changed (or is new)."""
+    entry = self._entries.get(fname)
+    if entry and entry['sha1'] == digest:
+      self.hits += 1
+      return entry['record']
+    self.misses += 1
+    return None
+
+  def put(self, fname, digest, record):
+    """Cache the record extracted from a file."""
+    self._entries[fname] = {'sha1': digest, 'record': record}
+
+  def prune(self, fnames):
+    """Drop entries for files other than fnames, returning how many."""
+    keep = set(fnames)
+    stale = [fname for fname in self._entries if fname not in keep]
+    for fname in stale:
+      del self._entries[fname]
+    return len(stale)
+
+  def save(self):
+    """Write the cache back to disk (atomically)."""
+    tmp_path = self._path + '.tmp'
+    with open(tmp_path, 'w') as f:
+      json.dump({'version': GY_TABLE_VERSION, 'entries': self._entries}, f)
+    os.rename(tmp_path, self._path)
+
+def _digest(path):
+  """Get the sha1 of a file's contents."""
+  with open(path, 'rb') as f:
+    return hashlib.sha1(f.read()).hexdigest()
+
+def iter_records(input_dir, workers=1, verbose=False, cache=None,
+                 after=None):
+  """Extract guangyun records from a directory of ytenx html files.
+
+  With more than one worker, the files are parsed in a process pool. Either
+  way, the records are yielded in id order. If an ExtractionCache is given,
+  only new or changed files are parsed (and the cache is updated, but not
+  saved). If after is given, only records with greater ids are extracted.
+  """
+  # Skip anything that isn't a page (e.g., the manifest that fetch writes).
+  fnames = sorted((fname for fname in os.listdir(input_dir)
+                   if re.match(FILE_REGEX, fname)), key=get_record_id)
+  if after is not None:
+    fnames = [fname for fname in fnames if get_record_id(fname) > after]
+  paths = [os.path.join(input_dir, fname) for fname in fnames]
+  digests = [None] * len(paths)
+  cached = [None] * len(paths)
+  if cache is not None:
+    digests = [_digest(path) for path in paths]
+    cached = [cache.get(fname, digest)
+              for fname, digest in zip(fnames, digests)]
+  to_parse = [path for path, record in zip(paths, cached) if record is None]
+  if workers > 1 and to_parse:
+    pool = multiprocessing.Pool(workers)
+    parsed = pool.imap(extract_record, to_parse, chunksize=64)
+  else:
+    pool, parsed = None, (extract_record(path) for path in to_parse)
+  try:
+    for i, record in enumerate(cached):
+      if record is None:
+        record = next(parsed)
+        if cache is not None:
+          cache.put(fnames[i], digests[i], record)
+      if verbose:
+        print 'Processed record %d' % record['id']
+      yield record
+  finally:
+    if pool:
+      pool.terminate()
+      pool.join()
+
+def _open_output(path, mode, gzipped):
+  """Open an output file, gzipped or not."""
+  if gzipped:
+    return gzip.open(path, mode)
+  return open(path, mode)
+
+def _read_jsonl(path, gzipped):
+  """Read the lines of a JSON Lines file.
+
+  Yields: (line, complete) pairs. Reading stops after the first incomplete
+    line (or damaged gzip data, yielded as a None line), as left behind by an
+    interrupted run.
+  """
+  f = _open_output(path, 'rb', gzipped)
+  try:
+    for line in f:
+      if not line.endswith('\n'):
+        yield line, False
+        return
+      yield line, True
+  except (IOError, EOFError, zlib.error):
+    yield None, False
+  finally:
+    f.close()
+
+def resume_jsonl(path, gzipped=False):
+  """Prepare a partially written JSON Lines file for appending.
+
+  Any incomplete trailing record is dropped from the file.
+
+  Returns: The id of the last complete record, or None if there are none.
+  """
+  if not os.path.exists(path):
+    return None
+  last, good = None, 0
+  for line, complete in _read_jsonl(path, gzipped):
+    if not complete:
+      break
+    last = line
+    good += 1
+  else:
+    return json.loads(last)['id'] if last else None
+  # Rewrite just the complete records.
+  tmp_path = path + '.tmp'
+  with _open_output(tmp_path, 'wb', gzipped) as out:
+    for line, _ in itertools.islice(_read_jsonl(path, gzipped), good):
+      out.write(line)
+  os.rename(tmp_path, path)
+  return json.loads(last)['id'] if last else None
+
+def write_jsonl(records, output_file, gzipped=False, append=False):
+  """Write records to a JSON Lines file as they arrive, one per line."""
+  with _open_output(output_file, 'ab' if append else 'wb', gzipped) as f:
+    for record in records:
+      f.write(json.dumps(record) + '\n')
+      # Let readers see each record as soon as it's written.
+      f.flush()
+
+def load_records(path, jsonl=False, gzipped=False):
+  """Load the records written by extract_records, in id order."""
+  if jsonl:
+    records = []
+    for line, complete in _read_jsonl(path, gzipped):
+      if not complete:
+        break
+      records.append(json.loads(line))
+    return records
+  with _open_output(path, 'rb', gzipped) as f:
+    return sorted(json.load(f).values(), key=lambda r: r['id'])
+
+def extract_records(input_dir, output_file, workers=1, verbose=False,
+                    cache_file=None, jsonl=False, gzipped=False, resume=False):
+  """Extracts guangyun records from a directory of ytenx html files.
+
+  By default, the records are written as one json object keyed by id. With
+  jsonl, each record is instead written on its own line as soon as it's
+  extracted, and resume picks up after the last record already written.
+  """
+  print 'input_dir: %s, output_file: %s' % (input_dir, output_file)
+  cache = ExtractionCache(cache_file) if cache_file else None
+  if jsonl:
+    last_id = resume_jsonl(output_file, gzipped) if resume else None
+    if last_id is not None:
+      print 'Resuming after record %d' % last_id
+    records = iter_records(input_dir, workers, verbose, cache, after=last_id)
+    write_jsonl(records, output_file, gzipped, append=resume)
+  else:
+    records = collections.OrderedDict(
+        (r['id'], r) for r in iter_records(input_dir, workers, verbose, cache))
+    with _open_output(output_file, 'wb', gzipped) as f:
+      json.dump(records, f)
+  if cache is not None:
+    cache.save()
+    print 'Reused %d cached records; parsed %d.' % (cache.hits, cache.misses)
   print 'Done.'
 
+def manage_cache(input_dir, cache_file, clear=False, prune=False):
+  """Clear the cache, or prune entries for files no longer in input_dir."""
+  if clear:
+    if os.path.exists(cache_file):
+      os.remove(cache_file)
+    print 'Cleared %s' % cache_file
+  elif prune:
+    cache = ExtractionCache(cache_file)
+    pruned = cache.prune(os.listdir(input_dir))
+    cache.save()
+    print 'Pruned %d entries from %s; %d remain.' % (
+        pruned, cache_file, len(cache))
+
 def main():
   """Runs the pipeline with the given command line arguments."""
   dirname = os.path.dirname(__file__)
   parser = argparse.ArgumentParser(
       description='Extracts numbered ytenx guangyun records from html pages.')
+  parser.add_argument('-i', '--input_dir', dest='input_dir', type=str,
+                      default=os.path.join(dirname, 'data_20170503'),
+                      help=('Directory of html pages to read (e.g., one '
+                            'written by ytenx.fetch).'))
   parser.add_argument('-o', '--output_file', dest='output_file', type=str,
-                      required=True, help='File to dump json output to.')
+                      help='File to dump json output to.')
+  parser.add_argument('--workers', dest='workers', type=int,
+                      default=multiprocessing.cpu_count(),
+                      help='Number of processes to parse html with.')
+  parser.add_argument('-v', '--verbose', dest='verbose', action='store_true',
+                      help='Print each record as it is processed.')
+  parser.add_argument('--jsonl', dest='jsonl', action='store_true',
+                      help=('Write one record per line, as each is extracted, '
+                            'instead of a single json object.'))
+  parser.add_argument('--gzip', dest='gzip', action='store_true',
+                      help='Gzip the output file.')
+  parser.add_argument('--resume', dest='resume', action='store_true',
+                      help=('With --jsonl, append to the output file after '
+                            'the last record already written.'))
+  parser.add_argument('--cache_file', dest='cache_file', type=str,
+                      help=('Cache of extracted records; only new or changed '
+                            'html files are parsed.'))
+  parser.add_argument('--clear_cache', dest='clear_cache', action='store_true',
+                      help='Delete the cache file instead of extracting.')
+  parser.add_argument('--prune_cache', dest='prune_cache', action='store_true',
+                      help=('Drop cache entries for files no longer in the '
+                            'input directory instead of extracting.'))
   args = parser.parse_args()
-  extract_records(os.path.join(dirname, 'data_20170503'), args.output_file)
+  input_dir = args.input_dir
+  if args.clear_cache or args.prune_cache:
+    if not args.cache_file:
+      parser.error('--clear_cache and --prune_cache need --cache_file')
+    manage_cache(input_dir, args.cache_file, clear=args.clear_cache,
+                 prune=args.prune_cache)
+    return
+  if not args.output_file:
+    parser.error('-o/--output_file is required')
+  if args.resume and not args.jsonl:
+    parser.error('--resume needs --jsonl')
+  extract_records(input_dir, args.output_file, workers=args.workers,
+                  verbose=args.verbose, cache_file=args.cache_file,
+                  jsonl=args.jsonl, gzipped=args.gzip, resume=args.resume)
 
 if __name__ == '__main__':
   main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Tests for extract_records module."""
+
+import json
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from . import extract_records
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data_20170503')
+
+class ExtractRecordTest(unittest.TestCase):
+  """Tests extracting records from the snapshot."""
+
+  def test_first_record(self):
+    """The first small rhyme is 東."""
+    record = extract_records.extract_record(os.path.join(_DATA_DIR, '1.html'))
+    self.assertEqual(
+        {'id': 1, 'hanzi': u'東', 'number': 1, 'fanqie': u'德紅',
+         'initial': u'端', 'final_full': u'東一', 'final': u'東',
+         'tone': u'平聲', 'grade': u'一等', 'open': True, 'row': u'東',
+         'she': u'通', 'section': u'上平一東',
+         'chars': [u'東', u'菄', u'鶇', u'䍶', u'𠍀', u'倲', u'𩜍', u'𢘐', u'涷',
+                   u'蝀', u'凍', u'鯟', u'𢔅', u'崠', u'埬', u'𧓕', u'䰤']},
+        record)
+
+  def test_missing_tables(self):
+    """Pages without the four tables are rejected."""
+    with self.assertRaises(ValueError):
+      extract_records.parse_tables('<html><table></table></html>', 'x.html')
+
+class ExtractionCacheTest(unittest.TestCase):
+  """Tests re-extracting with a cache."""
+
+  def setUp(self):
+    self._tmpdir = tempfile.mkdtemp()
+    self._input_dir = os.path.join(self._tmpdir, 'data')
+    os.mkdir(self._input_dir)
+    for fname in ('1.html', '2.html'):
+      shutil.copy(os.path.join(_DATA_DIR, fname), self._input_dir)
+    self._cache_file = os.path.join(self._tmpdir, 'cache.json')
+
+  def tearDown(self):
+    shutil.rmtree(self._tmpdir)
+
+  def extract(self):
+    """Extract the records, returning them and the cache used."""
+    cache = extract_records.ExtractionCache(self._cache_file)
+    records = list(extract_records.iter_records(self._input_dir, cache=cache))
+    cache.save()
+    return records, cache
+
+  def test_only_changed_files_are_parsed(self):
+    """Unchanged files are served from the cache."""
+    records, cache = self.extract()
+    self.assertEqual((0, 2), (cache.hits, cache.misses))
+    shutil.copy(os.path.join(_DATA_DIR, '3.html'),
+                os.path.join(self._input_dir, '2.html'))
+    changed, cache = self.extract()
+    self.assertEqual((1, 1), (cache.hits, cache.misses))
+    self.assertEqual(records[0], changed[0])
+    self.assertEqual(3, changed[1]['number'])
+
+  def test_prune(self):
+    """Pruning drops entries for deleted files."""
+    self.extract()
+    os.remove(os.path.join(self._input_dir, '2.html'))
+    cache = extract_records.ExtractionCache(self._cache_file)
+    self.assertEqual(1, cache.prune(os.listdir(self._input_dir)))
+    self.assertEqual(1, len(cache))
+
+class JsonlTest(unittest.TestCase):
+  """Tests writing and resuming JSON Lines output."""
+
+  def setUp(self):
+    self._tmpdir = tempfile.mkdtemp()
+    self._input_dir = os.path.join(self._tmpdir, 'data')
+    os.mkdir(self._input_dir)
+    for fname in ('1.html', '2.html', '3.html'):
+      shutil.copy(os.path.join(_DATA_DIR, fname), self._input_dir)
+
+  def tearDown(self):
+    shutil.rmtree(self._tmpdir)
+
+  def check_resume(self, gzipped):
+    """Interrupt a run partway through a record, then resume it."""
+    output_file = os.path.join(self._tmpdir, 'out.jsonl')
+    records = list(extract_records.iter_records(self._input_dir))
+    extract_records.write_jsonl(records, output_file, gzipped)
+    with extract_records._open_output(  # pylint: disable=protected-access
+        output_file, 'rb', gzipped) as f:
+      full = f.read()
+    with extract_records._open_output(  # pylint: disable=protected-access
+        output_file, 'wb', gzipped) as f:
+      f.write(full[:full.index('\n') + 10])
+    self.assertEqual(1, extract_records.resume_jsonl(output_file, gzipped))
+    extract_records.write_jsonl(
+        extract_records.iter_records(self._input_dir, after=1),
+        output_file, gzipped, append=True)
+    with extract_records._open_output(  # pylint: disable=protected-access
+        output_file, 'rb', gzipped) as f:
+      self.assertEqual(full, f.read())
+
+  def test_resume(self):
+    """Resuming drops the partial record and writes the rest."""
+    self.check_resume(False)
+
+  def test_resume_gzipped(self):
+    """Resuming works for gzipped output too."""
+    self.check_resume(True)
+
+  def test_load_records(self):
+    """Records load back from either output format, in id order."""
+    records = list(extract_records.iter_records(self._input_dir))
+    jsonl_file = os.path.join(self._tmpdir, 'out.jsonl')
+    extract_records.write_jsonl(records, jsonl_file)
+    self.assertEqual(records,
+                     extract_records.load_records(jsonl_file, jsonl=True))
+    json_file = os.path.join(self._tmpdir, 'out.json')
+    with open(json_file, 'wb') as f:
+      # Keyed by id, as extract_records writes it (but out of order).
+      json.dump(dict((r['id'], r) for r in reversed(records)), f)
+    self.assertEqual(records, extract_records.load_records(json_file))
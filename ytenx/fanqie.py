@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Resolves the fanqie (反切) of the guangyun records to the records they cite.
+
+python -m ytenx.fanqie --records_file /tmp/records.json
+
+A fanqie spells a small rhyme with two characters: the first shares its
+initial, and the second its final (and tone). Each speller is resolved to the
+small rhyme it heads (or failing that, the only one listing it), and the
+records are grouped into equivalence classes by union-find, one for initials
+and one for finals, as in 陳澧's 系聯 method. The classes (and each link) are
+then checked against the initials and finals ytenx labels the records with.
+"""
+
+import argparse
+import collections
+import multiprocessing
+import os.path
+import sys
+
+from . import extract_records
+
+class UnionFind(object):
+  """Disjoint sets of hashable items, with union by size and path halving."""
+
+  def __init__(self, items=()):
+    self._parent = {}
+    self._size = {}
+    for item in items:
+      self.add(item)
+
+  def add(self, item):
+    """Add an item in its own set (if it isn't already in one)."""
+    if item not in self._parent:
+      self._parent[item] = item
+      self._size[item] = 1
+
+  def find(self, item):
+    """Get the representative of an item's set."""
+    parent = self._parent
+    while parent[item] != item:
+      parent[item] = parent[parent[item]]
+      item = parent[item]
+    return item
+
+  def union(self, a, b):
+    """Merge the sets of two items.
+
+    Returns: The representative of the merged set.
+    """
+    a, b = self.find(a), self.find(b)
+    if a == b:
+      return a
+    if self._size[a] < self._size[b]:
+      a, b = b, a
+    self._parent[b] = a
+    self._size[a] += self._size[b]
+    return a
+
+  def groups(self):
+    """Get the sets, as a dict from representative to sorted members."""
+    groups = collections.defaultdict(list)
+    for item in self._parent:
+      groups[self.find(item)].append(item)
+    for members in groups.values():
+      members.sort()
+    return dict(groups)
+
+# How a speller character was resolved.
+RESOLVED, AMBIGUOUS, MISSING = 'resolved', 'ambiguous', 'missing'
+
+# A speller of one record's fanqie, and the record (id) it resolved to, if any.
+Speller = collections.namedtuple(
+    'Speller', ['record_id', 'char', 'status', 'speller_id'])
+
+class SpellerIndex(object):
+  """Hash index of the records by the characters they head and contain."""
+
+  def __init__(self, records):
+    self._heads = collections.defaultdict(list)
+    self._contains = collections.defaultdict(list)
+    for r in records:
+      self._heads[r['hanzi']].append(r)
+      for char in r.get('chars', ()):
+        self._contains[char].append(r)
+
+  def resolve(self, char, tone=None):
+    """Find the record a speller character stands for.
+
+    Records headed by char are preferred to those merely listing it. If tone
+    is given (for final spellers), records in that tone are preferred.
+
+    Returns: (status, record), where record is None unless status is
+      RESOLVED.
+    """
+    for candidates in (self._heads.get(char), self._contains.get(char)):
+      if not candidates:
+        continue
+      if tone is not None:
+        candidates = [r for r in candidates if r['tone'] == tone] or candidates
+      if len(candidates) == 1:
+        return RESOLVED, candidates[0]
+      return AMBIGUOUS, None
+    return MISSING, None
+
+# A link between a record and its speller's record whose labels differ.
+Conflict = collections.namedtuple(
+    'Conflict', ['kind', 'record_id', 'char', 'speller_id', 'label',
+                 'speller_label'])
+
+# The ytenx label that each kind of speller should share.
+_LABELS = collections.OrderedDict([('initial', 'initial'), ('final', 'final')])
+
+class FanqieResolution(object):
+  """The fanqie of a set of records, resolved and grouped into classes.
+
+  spellers: A dict from kind ('initial' or 'final') to the Spellers of that
+    kind (one per record with a fanqie).
+  classes: A dict from kind to the UnionFind of record ids.
+  """
+
+  def __init__(self, records):
+    """Resolve the fanqie of records (as extracted by extract_records)."""
+    self.records = collections.OrderedDict((r['id'], r) for r in records)
+    index = SpellerIndex(self.records.values())
+    self.spellers = dict((kind, []) for kind in _LABELS)
+    self.classes = dict((kind, UnionFind(self.records)) for kind in _LABELS)
+    for rid, r in self.records.iteritems():
+      fanqie = r.get('fanqie') or ''
+      if len(fanqie) != 2:
+        # e.g., 無 for the small rhymes without one.
+        continue
+      for kind, char, tone in (('initial', fanqie[0], None),
+                               ('final', fanqie[1], r['tone'])):
+        status, speller = index.resolve(char, tone)
+        speller_id = speller['id'] if speller is not None else None
+        self.spellers[kind].append(Speller(rid, char, status, speller_id))
+        if speller_id is not None:
+          self.classes[kind].union(rid, speller_id)
+
+  def statuses(self, kind):
+    """Count how the spellers of a kind were resolved."""
+    return collections.Counter(s.status for s in self.spellers[kind])
+
+  def conflicts(self, kind):
+    """Get the Conflicts between records and their resolved spellers."""
+    field = _LABELS[kind]
+    conflicts = []
+    for s in self.spellers[kind]:
+      if s.speller_id is None:
+        continue
+      label = self.records[s.record_id][field]
+      speller_label = self.records[s.speller_id][field]
+      if label != speller_label:
+        conflicts.append(Conflict(kind, s.record_id, s.char, s.speller_id,
+                                  label, speller_label))
+    return conflicts
+
+  def mixed_classes(self, kind):
+    """Get the classes whose records have more than one label.
+
+    Returns: A list of (Counter of labels, sorted record ids) pairs, largest
+      first.
+    """
+    field = _LABELS[kind]
+    mixed = []
+    for members in self.classes[kind].groups().values():
+      labels = collections.Counter(self.records[rid][field] for rid in members)
+      if len(labels) > 1:
+        mixed.append((labels, members))
+    mixed.sort(key=lambda (labels, members): (-len(members), members[0]))
+    return mixed
+
+  def report(self, out=None, max_conflicts=20):
+    """Write the resolution counts, classes, and conflicts of each kind."""
+    out = out or sys.stdout
+    for kind in _LABELS:
+      statuses = self.statuses(kind)
+      print >>out, '%s spellers: %s' % (kind, ', '.join(
+          '%s %d' % (status, statuses[status])
+          for status in (RESOLVED, AMBIGUOUS, MISSING)))
+      groups = self.classes[kind].groups()
+      labels = set(r[_LABELS[kind]] for r in self.records.values())
+      mixed = self.mixed_classes(kind)
+      print >>out, '%s classes: %d (for %d labels); %d mixed' % (
+          kind, len(groups), len(labels), len(mixed))
+      conflicts = self.conflicts(kind)
+      print >>out, '%s conflicts: %d' % (kind, len(conflicts))
+      for c in conflicts[:max_conflicts]:
+        r, speller = self.records[c.record_id], self.records[c.speller_id]
+        print >>out, (u'  #%d %s %s (%s): %s is #%d %s %s' % (
+            c.record_id, r['hanzi'], c.label, r['fanqie'], c.char,
+            c.speller_id, speller['hanzi'], c.speller_label)).encode('utf-8')
+
+def main():
+  """Resolve the fanqie of the ytenx records from the command line."""
+  dirname = os.path.dirname(__file__)
+  parser = argparse.ArgumentParser(
+      description=('Resolves the fanqie of the ytenx guangyun records and '
+                   'checks them against the labelled initials and finals.'))
+  parser.add_argument('--records_file', dest='records_file', type=str,
+                      help=('Records written by extract_records (by default, '
+                            'they\'re extracted from the snapshot).'))
+  parser.add_argument('--jsonl', dest='jsonl', action='store_true',
+                      help='The records file is JSON Lines.')
+  parser.add_argument('--gzip', dest='gzip', action='store_true',
+                      help='The records file is gzipped.')
+  parser.add_argument('--conflicts', dest='conflicts', type=int, default=20,
+                      help='Number of conflicts of each kind to list.')
+  args = parser.parse_args()
+  if args.records_file:
+    records = extract_records.load_records(
+        args.records_file, args.jsonl, args.gzip)
+  else:
+    records = extract_records.iter_records(
+        os.path.join(dirname, 'data_20170503'),
+        workers=multiprocessing.cpu_count())
+  FanqieResolution(records).report(max_conflicts=args.conflicts)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Tests for fanqie module."""
+
+import StringIO
+import unittest
+
+from . import fanqie
+
+def _record(rid, hanzi, fq, initial, final, tone=u'平聲', chars=None):
+  """Make a record like the ones extract_records extracts."""
+  return {'id': rid, 'hanzi': hanzi, 'fanqie': fq, 'initial': initial,
+          'final': final, 'tone': tone, 'chars': chars or [hanzi]}
+
+_RECORDS = [
+    _record(1, u'東', u'德紅', u'端', u'東'),
+    # 得 only appears in 多's small rhyme.
+    _record(2, u'德', u'得則', u'端', u'德', u'入聲'),
+    _record(3, u'紅', u'戶公', u'匣', u'東', chars=[u'紅', u'公']),
+    _record(4, u'多', u'德河', u'端', u'歌', chars=[u'多', u'得']),
+    # 類隔: spelled with a 端 initial, but labelled 知.
+    _record(5, u'樁', u'都江', u'知', u'江'),
+    _record(6, u'都', u'當孤', u'端', u'模'),
+    # 戶 is listed by two small rhymes, in different tones.
+    _record(7, u'胡', u'戶吳', u'匣', u'模', chars=[u'胡', u'戶']),
+    _record(8, u'扈', u'戶古', u'匣', u'姥', u'上聲', chars=[u'扈', u'戶']),
+    _record(9, u'拯', u'無', u'章', u'拯', u'上聲'),
+    _record(10, u'杜', u'徒戶', u'定', u'姥', u'上聲')]
+
+class UnionFindTest(unittest.TestCase):
+  """Tests for the disjoint sets."""
+
+  def test_union(self):
+    """Unions merge sets, and groups lists them."""
+    sets = fanqie.UnionFind(range(6))
+    sets.union(0, 1)
+    sets.union(2, 3)
+    self.assertEqual(sets.find(0), sets.union(1, 3))
+    self.assertEqual(sets.find(2), sets.find(0))
+    self.assertNotEqual(sets.find(4), sets.find(0))
+    self.assertEqual([[0, 1, 2, 3], [4], [5]],
+                     sorted(sets.groups().values()))
+
+class FanqieResolutionTest(unittest.TestCase):
+  """Tests for resolving fanqie."""
+
+  def setUp(self):
+    self._resolution = fanqie.FanqieResolution(_RECORDS)
+
+  def test_spellers(self):
+    """Spellers resolve to the record they head, or else the one listing it."""
+    initials = dict((s.record_id, s) for s in
+                    self._resolution.spellers['initial'])
+    finals = dict((s.record_id, s) for s in self._resolution.spellers['final'])
+    self.assertNotIn(9, initials)
+    self.assertEqual((u'德', fanqie.RESOLVED, 2),
+                     (initials[1].char, initials[1].status,
+                      initials[1].speller_id))
+    self.assertEqual(4, initials[2].speller_id)
+    self.assertEqual(fanqie.AMBIGUOUS, initials[3].status)
+    self.assertEqual(fanqie.MISSING, initials[6].status)
+    self.assertEqual({fanqie.RESOLVED: 4, fanqie.AMBIGUOUS: 3,
+                      fanqie.MISSING: 2},
+                     dict(self._resolution.statuses('initial')))
+    # Final spellers prefer small rhymes in the same tone.
+    self.assertEqual((fanqie.RESOLVED, 8), (finals[10].status,
+                                            finals[10].speller_id))
+    self.assertEqual(3, finals[1].speller_id)
+
+  def test_classes(self):
+    """Records are grouped with their spellers' records."""
+    initials = self._resolution.classes['initial']
+    self.assertEqual(initials.find(1), initials.find(4))
+    self.assertEqual(initials.find(5), initials.find(6))
+    self.assertNotEqual(initials.find(1), initials.find(5))
+    self.assertEqual(
+        [({u'端': 1, u'知': 1}, [5, 6])],
+        [(dict(labels), members) for labels, members in
+         self._resolution.mixed_classes('initial')])
+    finals = self._resolution.classes['final']
+    self.assertEqual(finals.find(1), finals.find(3))
+    self.assertEqual([], self._resolution.mixed_classes('final'))
+
+  def test_conflicts(self):
+    """Spellers whose labels differ from the record's are conflicts."""
+    self.assertEqual(
+        [fanqie.Conflict('initial', 5, u'都', 6, u'知', u'端')],
+        self._resolution.conflicts('initial'))
+    self.assertEqual([], self._resolution.conflicts('final'))
+
+  def test_report(self):
+    """The report lists the counts and conflicts."""
+    out = StringIO.StringIO()
+    self._resolution.report(out)
+    lines = out.getvalue().splitlines()
+    self.assertIn('initial spellers: resolved 4, ambiguous 3, missing 2',
+                  lines)
+    self.assertIn('initial conflicts: 1', lines)
+    self.assertIn('  #5 樁 知 (都江): 都 is #6 都 端', lines)
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""Fetches a new snapshot of the ytenx guangyun pages.
+
+python -m ytenx.fetch --last 3874
+
+Pages are written as <id>.html into a dated directory (data_YYYYMMDD, next
+to data_20170503), which extract_records can read as is. Each worker thread
+keeps one persistent HTTP connection open, requests are spaced out to a
+maximum rate across all of the workers, and failed requests are retried with
+exponential backoff. Every page is recorded in manifest.jsonl as soon as it's
+written, so an interrupted fetch picks up where it left off.
+"""
+
+import argparse
+import datetime
+import hashlib
+import httplib
+import json
+import os
+import os.path
+import Queue
+import random
+import socket
+import sys
+import threading
+import time
+import urlparse
+
+DEFAULT_URL_TEMPLATE = 'http://ytenx.org/kyonh/sieux/%d/'
+MANIFEST = 'manifest.jsonl'
+
+# Statuses worth retrying (the server is overloaded or briefly unavailable).
+_RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+class FetchError(Exception):
+  """A page couldn't be fetched (after any retries)."""
+
+class RateLimiter(object):
+  """Spaces out events to at most rate per second, across threads."""
+
+  def __init__(self, rate):
+    """rate of None (or 0) means no limit."""
+    self._interval = 1.0 / rate if rate else 0.0
+    self._lock = threading.Lock()
+    self._next = 0.0
+
+  def wait(self):
+    """Block until the next event is allowed."""
+    if not self._interval:
+      return
+    with self._lock:
+      now = time.time()
+      start = max(now, self._next)
+      self._next = start + self._interval
+    if start > now:
+      time.sleep(start - now)
+
+class _Client(object):
+  """One persistent HTTP(S) connection, reopened as needed."""
+
+  def __init__(self, timeout):
+    self._timeout = timeout
+    self._conn = None
+    self._netloc = None
+
+  def get(self, url):
+    """GET a url.
+
+    Returns: (status, body).
+    """
+    parsed = urlparse.urlsplit(url)
+    if self._conn is None or self._netloc != (parsed.scheme, parsed.netloc):
+      self.close()
+      cls = (httplib.HTTPSConnection if parsed.scheme == 'https'
+             else httplib.HTTPConnection)
+      self._conn = cls(parsed.netloc, timeout=self._timeout)
+      self._netloc = parsed.scheme, parsed.netloc
+    path = parsed.path or '/'
+    if parsed.query:
+      path += '?' + parsed.query
+    try:
+      self._conn.request('GET', path)
+      response = self._conn.getresponse()
+      body = response.read()
+    except (httplib.HTTPException, socket.error):
+      # The connection is in an unknown state; start over next time.
+      self.close()
+      raise
+    if response.getheader('connection', '').lower() == 'close':
+      self.close()
+    return response.status, body
+
+  def close(self):
+    """Close the connection (if it's open)."""
+    if self._conn is not None:
+      self._conn.close()
+      self._conn = None
+
+def fetch_page(client, url, limiter=None, retries=4, backoff=0.5):
+  """Fetch one page, retrying transient failures with exponential backoff.
+
+  Raises FetchError if the page is missing (or the retries run out).
+
+  Returns: The body of the page.
+  """
+  for attempt in xrange(retries + 1):
+    if limiter is not None:
+      limiter.wait()
+    try:
+      status, body = client.get(url)
+    except (httplib.HTTPException, socket.error) as e:
+      error = '%s: %s' % (type(e).__name__, e)
+    else:
+      if status == 200:
+        return body
+      error = 'HTTP %d' % status
+      if status not in _RETRY_STATUSES:
+        break
+    if attempt < retries:
+      # Jitter keeps the workers from retrying in lockstep.
+      time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+  raise FetchError('%s: %s' % (url, error))
+
+def read_manifest(output_dir):
+  """Read the ids of the pages already fetched into output_dir.
+
+  Entries whose page is missing (or partially written lines, from an
+  interrupted fetch) are ignored.
+
+  Returns: A dict from id to its manifest entry.
+  """
+  path = os.path.join(output_dir, MANIFEST)
+  entries = {}
+  if not os.path.exists(path):
+    return entries
+  with open(path, 'rb') as f:
+    for line in f:
+      if not line.endswith('\n'):
+        break
+      entry = json.loads(line)
+      if os.path.exists(os.path.join(output_dir, '%d.html' % entry['id'])):
+        entries[entry['id']] = entry
+  return entries
+
+class _Manifest(object):
+  """Appends entries to the manifest, one line per page, from any thread."""
+
+  def __init__(self, output_dir):
+    path = os.path.join(output_dir, MANIFEST)
+    self._truncate_partial_line(path)
+    self._file = open(path, 'ab')
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def _truncate_partial_line(path):
+    """Drop a partially written last line (from an interrupted fetch)."""
+    if not os.path.exists(path):
+      return
+    with open(path, 'rb+') as f:
+      contents = f.read()
+      if contents and not contents.endswith('\n'):
+        f.truncate(contents.rfind('\n') + 1)
+
+  def add(self, entry):
+    """Append an entry (and flush it)."""
+    line = json.dumps(entry, sort_keys=True) + '\n'
+    with self._lock:
+      self._file.write(line)
+      self._file.flush()
+
+  def close(self):
+    """Close the manifest file."""
+    self._file.close()
+
+def _write_page(output_dir, rid, body):
+  """Write a page atomically, so a partial page is never left behind."""
+  path = os.path.join(output_dir, '%d.html' % rid)
+  tmp_path = path + '.tmp'
+  with open(tmp_path, 'wb') as f:
+    f.write(body)
+  os.rename(tmp_path, path)
+
+class FetchSummary(object):
+  """What a fetch did.
+
+  fetched: The ids of the pages fetched.
+  skipped: The ids already in the manifest.
+  failed: A dict from id to the error fetching it.
+  """
+
+  def __init__(self):
+    self.fetched = []
+    self.skipped = []
+    self.failed = {}
+
+  def __str__(self):
+    return 'Fetched %d pages; skipped %d already fetched; %d failed.' % (
+        len(self.fetched), len(self.skipped), len(self.failed))
+
+def fetch_snapshot(ids, output_dir, url_template=DEFAULT_URL_TEMPLATE,
+                   workers=8, rate=10.0, retries=4, backoff=0.5, timeout=30.0,
+                   verbose=False):
+  """Fetch the pages with the given ids into output_dir.
+
+  Pages already in output_dir's manifest are skipped. url_template is
+  formatted with each id. workers threads fetch at once (each over its own
+  persistent connection), starting at most rate requests per second between
+  them.
+
+  Returns: A FetchSummary.
+  """
+  if not os.path.isdir(output_dir):
+    os.makedirs(output_dir)
+  summary = FetchSummary()
+  done = read_manifest(output_dir)
+  todo = Queue.Queue()
+  for rid in ids:
+    if rid in done:
+      summary.skipped.append(rid)
+    else:
+      todo.put(rid)
+  manifest = _Manifest(output_dir)
+  limiter = RateLimiter(rate)
+  lock = threading.Lock()
+
+  def work():
+    """Fetch pages until there are none left."""
+    client = _Client(timeout)
+    try:
+      while True:
+        try:
+          rid = todo.get_nowait()
+        except Queue.Empty:
+          return
+        url = url_template % rid
+        try:
+          body = fetch_page(client, url, limiter, retries, backoff)
+        except FetchError as e:
+          with lock:
+            summary.failed[rid] = str(e)
+            # (Under the lock, so lines from the workers don't interleave.)
+            if verbose:
+              print >>sys.stderr, 'Failed %s' % e
+          continue
+        _write_page(output_dir, rid, body)
+        manifest.add({'id': rid, 'url': url, 'bytes': len(body),
+                      'sha1': hashlib.sha1(body).hexdigest(),
+                      'fetched': datetime.datetime.utcnow().isoformat()})
+        with lock:
+          summary.fetched.append(rid)
+          if verbose:
+            print 'Fetched page %d' % rid
+    finally:
+      client.close()
+
+  threads = [threading.Thread(target=work, name='fetch-%d' % i)
+             for i in xrange(min(workers, todo.qsize()))]
+  try:
+    for t in threads:
+      t.daemon = True
+      t.start()
+    for t in threads:
+      # Wait in short slices, so Ctrl-C still interrupts (and the manifest
+      # keeps what's been fetched so far).
+      while t.is_alive():
+        t.join(0.1)
+  finally:
+    manifest.close()
+  summary.fetched.sort()
+  return summary
+
+def main():
+  """Fetch a snapshot from the command line."""
+  dirname = os.path.dirname(__file__)
+  parser = argparse.ArgumentParser(
+      description='Fetches a new snapshot of the ytenx guangyun pages.')
+  parser.add_argument('-o', '--output_dir', dest='output_dir', type=str,
+                      help=('Directory to write the pages to (by default, '
+                            'data_YYYYMMDD for today).'))
+  parser.add_argument('--first', dest='first', type=int, default=1,
+                      help='First page id to fetch.')
+  parser.add_argument('--last', dest='last', type=int, default=3874,
+                      help='Last page id to fetch.')
+  parser.add_argument('--url_template', dest='url_template', type=str,
+                      default=DEFAULT_URL_TEMPLATE,
+                      help='URL of each page, with %%d for its id.')
+  parser.add_argument('--workers', dest='workers', type=int, default=8,
+                      help='Number of pages to fetch at once.')
+  parser.add_argument('--rate', dest='rate', type=float, default=10.0,
+                      help='Maximum requests per second (0 for no limit).')
+  parser.add_argument('--retries', dest='retries', type=int, default=4,
+                      help='Times to retry a failed request.')
+  parser.add_argument('--timeout', dest='timeout', type=float, default=30.0,
+                      help='Seconds to wait on a request.')
+  parser.add_argument('-v', '--verbose', dest='verbose', action='store_true',
+                      help='Print each page as it is fetched.')
+  args = parser.parse_args()
+  output_dir = args.output_dir or os.path.join(
+      dirname, 'data_%s' % datetime.date.today().strftime('%Y%m%d'))
+  print 'output_dir: %s' % output_dir
+  summary = fetch_snapshot(
+      range(args.first, args.last + 1), output_dir, args.url_template,
+      workers=args.workers, rate=args.rate, retries=args.retries,
+      timeout=args.timeout, verbose=args.verbose)
+  print summary
+  for rid, error in sorted(summary.failed.items()):
+    print 'Failed %d: %s' % (rid, error)
+  if summary.failed:
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Tests for fetch module."""
+
+import BaseHTTPServer
+import collections
+import json
+import os
+import os.path
+import re
+import shutil
+import SocketServer
+import tempfile
+import threading
+import time
+import unittest
+
+from . import extract_records
+from . import fetch
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data_20170503')
+
+class _SnapshotHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Serves the snapshot's pages at /kyonh/sieux/<id>/, like ytenx."""
+
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):  # pylint: disable=invalid-name
+    """Serve a page (or fail, as the server's been told to)."""
+    server = self.server
+    with server.lock:
+      server.requests[self.path] += 1
+      failures = server.failures.get(self.path, 0)
+      if failures:
+        server.failures[self.path] = failures - 1
+      server.connections.add(self.client_address)
+    m = re.match(r'/kyonh/sieux/(\d+)/$', self.path)
+    path = m and os.path.join(_DATA_DIR, '%s.html' % m.group(1))
+    if failures:
+      self._send(503, 'Try again later')
+    elif not path or not os.path.exists(path):
+      self._send(404, 'Not found')
+    else:
+      with open(path, 'rb') as f:
+        self._send(200, f.read())
+
+  def _send(self, status, body):
+    """Send a response, keeping the connection open."""
+    self.send_response(status)
+    self.send_header('Content-Type', 'text/html; charset=utf-8')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):  # pylint: disable=arguments-differ
+    pass
+
+class _SnapshotServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  """A stand-in for ytenx.org, counting requests and connections."""
+
+  daemon_threads = True
+
+  def __init__(self):
+    BaseHTTPServer.HTTPServer.__init__(self, ('localhost', 0), _SnapshotHandler)
+    self.lock = threading.Lock()
+    self.requests = collections.Counter()
+    # Path to the number of times to fail it with a 503.
+    self.failures = {}
+    self.connections = set()
+
+class FetchTest(unittest.TestCase):
+  """Tests fetching pages from a local server."""
+
+  def setUp(self):
+    self._server = _SnapshotServer()
+    thread = threading.Thread(target=self._server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    self._url = 'http://localhost:%d/kyonh/sieux/%%d/' % (
+        self._server.server_address[1])
+    self._tmpdir = tempfile.mkdtemp()
+    self._output_dir = os.path.join(self._tmpdir, 'data_20990101')
+
+  def tearDown(self):
+    self._server.shutdown()
+    self._server.server_close()
+    shutil.rmtree(self._tmpdir)
+
+  def fetch(self, ids, **kwargs):
+    """Fetch pages from the local server, with quick retries."""
+    kwargs.setdefault('rate', None)
+    kwargs.setdefault('backoff', 0.01)
+    return fetch.fetch_snapshot(ids, self._output_dir, self._url, **kwargs)
+
+  def test_fetch(self):
+    """Fetched pages are extracted just like the snapshot's."""
+    summary = self.fetch(range(1, 21), workers=4)
+    self.assertEqual(range(1, 21), summary.fetched)
+    self.assertEqual({}, summary.failed)
+    self.assertEqual(
+        [extract_records.extract_record(os.path.join(_DATA_DIR, '%d.html' % i))
+         for i in range(1, 21)],
+        list(extract_records.iter_records(self._output_dir)))
+    # Each worker reuses its connection.
+    self.assertLessEqual(len(self._server.connections), 4)
+    manifest = fetch.read_manifest(self._output_dir)
+    self.assertEqual(range(1, 21), sorted(manifest))
+    with open(os.path.join(_DATA_DIR, '7.html'), 'rb') as f:
+      self.assertEqual(len(f.read()), manifest[7]['bytes'])
+
+  def test_retries(self):
+    """Transient failures are retried; missing pages aren't."""
+    self._server.failures['/kyonh/sieux/2/'] = 2
+    self._server.failures['/kyonh/sieux/3/'] = 5
+    summary = self.fetch([1, 2, 3, 99999], retries=3)
+    self.assertEqual([1, 2], summary.fetched)
+    self.assertEqual([3, 99999], sorted(summary.failed))
+    self.assertIn('HTTP 503', summary.failed[3])
+    self.assertIn('HTTP 404', summary.failed[99999])
+    self.assertEqual(3, self._server.requests['/kyonh/sieux/2/'])
+    self.assertEqual(4, self._server.requests['/kyonh/sieux/3/'])
+    self.assertEqual(1, self._server.requests['/kyonh/sieux/99999/'])
+    self.assertFalse(os.path.exists(os.path.join(self._output_dir, '3.html')))
+
+  def test_resume(self):
+    """Pages already in the manifest aren't fetched again."""
+    self.fetch([1, 2, 3])
+    # Interrupt a manifest line, and lose a page.
+    manifest_file = os.path.join(self._output_dir, fetch.MANIFEST)
+    with open(manifest_file, 'ab') as f:
+      f.write('{"id": 4, "by')
+    os.remove(os.path.join(self._output_dir, '3.html'))
+    summary = self.fetch(range(1, 6))
+    self.assertEqual([1, 2], summary.skipped)
+    self.assertEqual([3, 4, 5], summary.fetched)
+    self.assertEqual(1, self._server.requests['/kyonh/sieux/1/'])
+    self.assertEqual(2, self._server.requests['/kyonh/sieux/3/'])
+    with open(manifest_file, 'rb') as f:
+      ids = [json.loads(line)['id'] for line in f]
+    self.assertEqual([1, 2, 3], sorted(ids[:3]))
+    self.assertEqual([3, 4, 5], sorted(ids[3:]))
+
+  def test_rate_limit(self):
+    """Requests are spaced out to the rate."""
+    start = time.time()
+    self.fetch(range(1, 6), workers=5, rate=50.0)
+    # The first request goes right away; the other 4 wait 1/50s each.
+    self.assertGreaterEqual(time.time() - start, 0.075)